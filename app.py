@@ -3,19 +3,290 @@ Windows 95 Portfolio - Flask Backend
 Interactive terminal interface for portfolio website
 """
 
-from flask import Flask, request, jsonify, render_template, send_from_directory
+from flask import Flask, g, has_request_context, redirect, request, jsonify, render_template, send_file, send_from_directory
 from flask_cors import CORS
+from markupsafe import escape
+from assets import AVAILABLE_ENCODINGS, ENCODINGS, compress, load_assets, negotiate
+from vfs import CONTENT_DIR, Interner, Snapshot, content_signature, file_signature, load_content_tree
+from metrics import Registry
+from profiler import SamplingProfiler
+from tracing import TraceWriter
+from importlib.util import find_spec
 import os
 import json
 from datetime import datetime
 import uuid
 import base64
-import requests
+import socket
+import sys
+import tempfile
+import sqlite3
+import hashlib
+import hmac
+import math
+import zlib
+import secrets
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from functools import lru_cache, wraps
+from itertools import chain, islice
+from types import MappingProxyType
+from urllib.parse import urlencode, urlparse
 
 
 app = Flask(__name__, static_folder='static', template_folder='templates')
 CORS(app)
 
+# ============================================================================
+# METRICS - Request latency, upstream calls and shell commands (see metrics.py)
+# ============================================================================
+
+# Scrapers authenticate with METRICS_TOKEN (Authorization: Bearer ...), or
+# with the admin key when no separate token is set
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+METRICS_DIR = os.environ.get('METRICS_DIR', '')  # shared by workers; gunicorn.conf.py sets one
+
+metrics = Registry(METRICS_DIR)
+HTTP_REQUESTS = metrics.counter('portfolio_http_requests_total', 'Requests by route, method and status',
+                                ('route', 'method', 'status'))
+HTTP_LATENCY = metrics.histogram('portfolio_http_request_duration_seconds', 'Request latency by route',
+                                 ('route', 'method'))
+HTTP_IN_FLIGHT = metrics.gauge('portfolio_http_requests_in_flight', 'Requests being handled', ('route',))
+UPSTREAM_LATENCY = metrics.histogram('portfolio_upstream_request_duration_seconds',
+                                     'Upstream (Supabase) call latency', ('service', 'op'))
+UPSTREAM_ERRORS = metrics.counter('portfolio_upstream_errors_total',
+                                  'Upstream calls that failed or returned an error status', ('service', 'op'))
+SHELL_LATENCY = metrics.histogram('portfolio_shell_command_duration_seconds',
+                                  'Shell command run time by command name', ('command', 'pure'))
+
+# thread ident -> "METHOD route" of the request it is serving, for the profiler
+ACTIVE_REQUESTS = {}
+
+def _route_label():
+    rule = request.url_rule
+    return rule.rule if rule is not None else 'unmatched'
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    route = _route_label()
+    ACTIVE_REQUESTS[threading.get_ident()] = f'{request.method} {route}'
+    HTTP_IN_FLIGHT.inc(route=route)
+
+@app.after_request
+def record_status(response):
+    g.response_status = response.status_code
+    return response
+
+@app.teardown_request
+def record_request(exc):
+    start = g.pop('request_start', None)
+    if start is None:
+        return
+    route = _route_label()
+    ACTIVE_REQUESTS.pop(threading.get_ident(), None)
+    HTTP_IN_FLIGHT.dec(route=route)
+    HTTP_LATENCY.observe(time.perf_counter() - start, route=route, method=request.method)
+    HTTP_REQUESTS.inc(route=route, method=request.method,
+                      status=g.pop('response_status', 500 if exc else 200))
+    metrics.flush()
+
+def check_admin_key(key):
+    """True if key matches ADMIN_KEY (the key the /admin pages ask for)"""
+    expected = os.environ.get('ADMIN_KEY', 'your-secret-admin-key')
+    return isinstance(key, str) and hmac.compare_digest(key.encode(), expected.encode())
+
+# ============================================================================
+# RATE LIMITING - Per-client token buckets, shared by every worker on a host
+# ============================================================================
+
+# route class -> (tokens refilled per second, bucket size); each request
+# spends one token from the client's bucket and one from its IP's, whose
+# budget is RATE_LIMIT_IP_FACTOR times larger (an IP may be a whole office)
+RATE_LIMITS = {
+    'execute': (10.0, 40),
+    'message': (1 / 30, 3),
+    'upload': (1 / 10, 4),
+}
+RATE_LIMIT_IP_FACTOR = 5
+RATE_LIMIT_BACKEND = os.environ.get('RATE_LIMIT_BACKEND', 'sqlite').lower()
+RATE_LIMIT_DB = os.environ.get(
+    'RATE_LIMIT_DB',
+    '/dev/shm/portfolio_ratelimit.db' if os.path.isdir('/dev/shm') else 'portfolio_ratelimit.db'
+)
+# Reverse proxies in front of the app (1 on Heroku); their X-Forwarded-For
+# entries are trusted for the client IP. Without one, every visitor would
+# share the router's IP buckets, so set 0 only when clients connect directly
+FORWARDED_PROXIES = int(os.environ.get('FORWARDED_PROXIES', 1))
+
+for _name, _spec in os.environ.items():
+    # RATE_LIMIT_EXECUTE=20/60 -> 20 requests per 60 seconds, bursting to 20
+    if _name.startswith('RATE_LIMIT_') and _name[11:].lower() in RATE_LIMITS:
+        _count, _, _seconds = _spec.partition('/')
+        RATE_LIMITS[_name[11:].lower()] = (float(_count) / float(_seconds or 1), float(_count))
+
+if FORWARDED_PROXIES:
+    from werkzeug.middleware.proxy_fix import ProxyFix
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=FORWARDED_PROXIES)
+
+RATE_LIMITED = metrics.counter('portfolio_rate_limited_total', 'Requests refused with 429', ('route_class',))
+
+class RateLimiter:
+    """Interface: spend tokens from buckets that refill continuously"""
+
+    def take(self, buckets, cost=1):
+        """Spend `cost` from every (key, rate, burst) bucket, or from none
+
+        Returns 0 if admitted, else the seconds until all of them could pay.
+        """
+        raise NotImplementedError
+
+    @staticmethod
+    def settle(states, buckets, now, cost):
+        """New (tokens, updated) per bucket given their current states"""
+        refilled = [min(burst, tokens + (now - updated) * rate)
+                    for (tokens, updated), (_, rate, burst) in zip(states, buckets)]
+        wait = max((max(0.0, cost - tokens) / rate
+                    for tokens, (_, rate, burst) in zip(refilled, buckets)), default=0.0)
+        if wait:
+            return [(tokens, now) for tokens in refilled], wait
+        return [(tokens - cost, now) for tokens in refilled], 0.0
+
+
+class MemoryRateLimiter(RateLimiter):
+    """Buckets in this process only; the least recently used are dropped"""
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()  # key -> (tokens, updated)
+        self._lock = threading.Lock()
+
+    def take(self, buckets, cost=1):
+        now = time.time()
+        with self._lock:
+            states = [self._buckets.get(key, (burst, now)) for key, _, burst in buckets]
+            states, wait = self.settle(states, buckets, now, cost)
+            for (key, _, _), state in zip(buckets, states):
+                self._buckets[key] = state
+                self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return wait
+
+
+class SQLiteRateLimiter(RateLimiter):
+    """Buckets in a SQLite file shared by the workers (in /dev/shm by default)
+
+    A worker's threads queue on an in-process lock and share one connection,
+    so only whole workers ever wait on SQLite's write lock (whose busy
+    handler sleeps in steps of up to 100 ms).
+    """
+
+    def __init__(self, path=RATE_LIMIT_DB, sweep_interval=60):
+        self.path = path
+        self.sweep_interval = sweep_interval
+        self._lock = threading.Lock()
+        self._conn_pid = None
+        self._next_sweep = 0.0
+
+    def _conn(self):
+        if self._conn_pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=OFF')
+            conn.execute('CREATE TABLE IF NOT EXISTS buckets '
+                         '(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)')
+            self._connection, self._conn_pid = conn, os.getpid()
+        return self._connection
+
+    def take(self, buckets, cost=1):
+        with self._lock:
+            conn = self._conn()
+            now = time.time()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                states = []
+                for key, _, burst in buckets:
+                    row = conn.execute('SELECT tokens, updated FROM buckets WHERE key = ?', (key,)).fetchone()
+                    states.append(row or (burst, now))
+                states, wait = self.settle(states, buckets, now, cost)
+                conn.executemany('INSERT OR REPLACE INTO buckets VALUES (?, ?, ?)',
+                                 [(key, *state) for (key, _, _), state in zip(buckets, states)])
+                if now >= self._next_sweep:
+                    # A bucket idle for an hour has refilled; forgetting it is equivalent
+                    self._next_sweep = now + self.sweep_interval
+                    conn.execute('DELETE FROM buckets WHERE updated < ?', (now - 3600,))
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+        return wait
+
+
+def make_rate_limiter(name=RATE_LIMIT_BACKEND):
+    if name == 'sqlite':
+        return SQLiteRateLimiter()
+    if name in ('off', 'none'):
+        return None
+    return MemoryRateLimiter()
+
+
+rate_limiter = make_rate_limiter()
+
+def check_rate_limit(route_class, client_id=None, cost=1):
+    """Seconds to wait if this request is over budget, else None"""
+    if rate_limiter is None:
+        return None
+    rate, burst = RATE_LIMITS[route_class]
+    buckets = [(f'{route_class}:ip:{request.remote_addr}', rate * RATE_LIMIT_IP_FACTOR, burst * RATE_LIMIT_IP_FACTOR)]
+    if client_id:
+        buckets.append((f'{route_class}:id:{client_id}', rate, burst))
+    wait = rate_limiter.take(buckets, cost)
+    if wait:
+        RATE_LIMITED.inc(route_class=route_class)
+        return wait
+    return None
+
+def too_many_requests(wait):
+    retry_after = max(1, math.ceil(wait))
+    response = jsonify({
+        'success': False,
+        'error': 'Too many requests',
+        'output': f'Too many requests; try again in {retry_after}s',
+        'type': 'error',
+        'retry_after': retry_after,
+    })
+    response.status_code = 429
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+def rate_limited(route_class, id_field, cost=None):
+    """Route decorator: admit a request only if its client has budget left
+
+    The client is identified by its IP plus, when the JSON body carries it,
+    `id_field` (session_id, visitor_id). cost(data) prices batch requests;
+    one costing more than a full bucket could never be admitted, so it is
+    refused outright.
+    """
+    def decorate(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            data = request.get_json(silent=True)
+            if not isinstance(data, dict):
+                data = {}
+            price = cost(data) if cost else 1
+            if rate_limiter is not None and price > RATE_LIMITS[route_class][1]:
+                return jsonify({'success': False, 'error': f'Request too large: it costs {price:g} '
+                                f'of a rate limit of {RATE_LIMITS[route_class][1]:g}'}), 400
+            wait = check_rate_limit(route_class, data.get(id_field), price)
+            if wait is not None:
+                return too_many_requests(wait)
+            return view(*args, **kwargs)
+        return wrapper
+    return decorate
+
 # Supabase Configuration - Set these as environment variables
 SUPABASE_URL = os.environ.get('SUPABASE_URL', '')
 SUPABASE_KEY = os.environ.get('SUPABASE_KEY', '')
@@ -28,248 +299,61 @@ def get_supabase_headers():
         'Content-Type': 'application/json'
     }
 
+# Supabase calls share one keep-alive pool per worker. When the pool is full
+# callers wait for a connection, so a crowd of guestbook requests (thousands
+# of greenlets under WORKER_CLASS=gevent) never opens more than this many
+UPSTREAM_POOL_SIZE = int(os.environ.get('UPSTREAM_POOL_SIZE', 32))
+UPSTREAM_TIMEOUT = float(os.environ.get('UPSTREAM_TIMEOUT', 10))
+
+_upstream = None
+_upstream_pid = None
+
+def upstream_session():
+    """This worker's pooled requests.Session (created after any fork)
+
+    requests (with urllib3 and certifi) is imported here rather than at the
+    top: it is a quarter of the app's import time and only the guestbook
+    needs it.
+    """
+    global _upstream, _upstream_pid
+    if _upstream_pid != os.getpid():
+        import requests
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=UPSTREAM_POOL_SIZE,
+                                                pool_block=True)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        _upstream, _upstream_pid = session, os.getpid()
+    return _upstream
+
+def supabase_request(op, method, url, **kwargs):
+    """Pooled request to Supabase, timed under `op` for /metrics"""
+    kwargs.setdefault('timeout', UPSTREAM_TIMEOUT)
+    session = upstream_session()
+    from requests import RequestException
+    with UPSTREAM_LATENCY.time(service='supabase', op=op):
+        try:
+            response = session.request(method, url, **kwargs)
+        except RequestException:
+            UPSTREAM_ERRORS.inc(service='supabase', op=op)
+            raise
+    if response.status_code >= 400:
+        UPSTREAM_ERRORS.inc(service='supabase', op=op)
+    return response
+
 # ============================================================================
 # VIRTUAL FILE SYSTEM - Maps to your portfolio HTML sections
 # ============================================================================
 
-VIRTUAL_FS = {
-    'type': 'directory',
-    'contents': {
-        'Bio.txt': {
-            'type': 'file',
-            'icon': '💻',
-            'window': 'about',
-            'content': '''╔══════════════════════════════════════════════════════════════╗
-║                    SUDARSHAN TIWARI                          ║
-║              Computer Science Student & Developer             ║
-╚══════════════════════════════════════════════════════════════╝
-
-Hi! I'm a Computer Science student at Missouri State University 
-specializing in full-stack development, Linux kernel programming, 
-and cloud architecture.
-
-EDUCATION:
-──────────────────────────────────────────────────────────────────
-  Missouri State University - Springfield, Missouri
-  Bachelor of Science in Computer Science
-  Jan 2023 - Dec 2026 (Expected)
-
-EXPERIENCE:
-──────────────────────────────────────────────────────────────────
-  ► Software Developer Intern - TuningSQL (Aug 2025 - Present)
-    • Full-stack web platform (PostgreSQL, PHP, JavaScript, Backbone.js)
-    • PHP backend endpoints for HTML DOM transformation
-    • Real-time validation and AJAX operations
-
-  ► Research Assistant - Missouri State University (May 2024 - Present)
-    • Kernel-level memory management subsystem (C/C++)
-    • Multi-threaded daemon for memory reclamation
-    • Benchmarking experiments for hybrid memory workloads
-
-SPECIALIZATIONS:
-──────────────────────────────────────────────────────────────────
-  • Full-Stack Development (React, Node.js, Angular, Django)
-  • Linux Kernel & System Programming (C/C++)
-  • Cloud Architecture (Azure, Docker, Heroku)
-  • Real-Time Systems (SignalR, WebSocket)
-  • Database Design (MongoDB, PostgreSQL, SQL Server)
-
-STATUS: Open to internship opportunities!
-'''
-        },
-        'Projects': {
-            'type': 'directory',
-            'icon': '📁',
-            'window': 'projects',
-            'contents': {
-                'SocialMedia.md': {
-                    'type': 'file',
-                    'content': '''💬 SOCIAL MEDIA WEB APP
-═══════════════════════════════════════════════════════════════
-Tech Stack: C#, Angular, SignalR, SQL Server, OAuth 2.0, JWT
-
-Description:
-Full-stack social platform with user authentication, real-time 
-chat using SignalR, posts/comments system, and RESTful API backend.
-
-Features:
-  • Real-time messaging with SignalR
-  • OAuth 2.0 and JWT authentication
-  • Post and comment system
-  • User profiles and connections
-'''
-                },
-                'PlacementTracker.md': {
-                    'type': 'file',
-                    'content': '''📊 PLACEMENT TRACKER DASHBOARD
-═══════════════════════════════════════════════════════════════
-Tech Stack: React.js, Node.js, Express.js, MySQL, Tailwind CSS
-
-Description:
-Comprehensive job application tracker with REST API, CRUD operations,
-search/filter functionality, and responsive dashboard.
-
-Features:
-  • Track job applications
-  • Search and filter
-  • Dashboard analytics
-  • Responsive design
-'''
-                },
-                'CustomShell.md': {
-                    'type': 'file',
-                    'content': '''🖥️ CUSTOM COMMAND SHELL
-═══════════════════════════════════════════════════════════════
-Tech Stack: C, Unix System Calls, Process Management
-
-Description:
-Unix-like shell supporting built-in commands (cd, pwd, exit), 
-external command execution via fork/exec, I/O redirection, 
-and background process management.
-
-Features:
-  • Built-in commands (cd, pwd, exit)
-  • External command execution
-  • I/O redirection (>, <, >>)
-  • Background processes (&)
-  • Command history
-'''
-                },
-                'TuningSQL.md': {
-                    'type': 'file',
-                    'content': '''🗄️ TUNINGSQL CONTENT PLATFORM
-═══════════════════════════════════════════════════════════════
-Tech Stack: PostgreSQL, PHP, Backbone.js, DOMDocument, XPath
-
-Description:
-Full-stack web content transformation platform with PHP backend 
-for HTML DOM manipulation and Backbone.js frontend.
-
-Features:
-  • HTML DOM transformation
-  • Real-time validation
-  • Content management system
-'''
-                },
-                'Win95Portfolio.md': {
-                    'type': 'file',
-                    'content': '''💻 WINDOWS 95 PORTFOLIO (You're Here!)
-═══════════════════════════════════════════════════════════════
-Tech Stack: HTML5, CSS3, JavaScript, Python Flask
-
-Description:
-Interactive retro portfolio with draggable windows, working terminal,
-and authentic Windows 95 UI.
-
-Features:
-  • Draggable & resizable windows
-  • Working command-line terminal
-  • Virtual file system
-  • Music player
-  • Start menu
-'''
-                }
-            }
-        },
-        'Skills.doc': {
-            'type': 'file',
-            'icon': '📄',
-            'window': 'skills',
-            'content': '''╔══════════════════════════════════════════════════════════════╗
-║                       TECHNICAL SKILLS                        ║
-╚══════════════════════════════════════════════════════════════╝
-
-LANGUAGES:
-──────────────────────────────────────────────────────────────────
-  █████████████████████░░░░  JavaScript   ████ Advanced
-  █████████████████████░░░░  Python       ████ Advanced
-  ████████████████░░░░░░░░░  C/C++        ███░ Intermediate
-  ████████████████░░░░░░░░░  PHP          ███░ Intermediate
-  ████████████████░░░░░░░░░  C#           ███░ Intermediate
-  █████████████████████░░░░  HTML/CSS     ████ Advanced
-  ████████████░░░░░░░░░░░░░  Go           ██░░ Learning
-
-FRAMEWORKS & LIBRARIES:
-──────────────────────────────────────────────────────────────────
-  Frontend:  React, Angular, Backbone.js, Tailwind CSS
-  Backend:   Flask, Express.js, Django, ASP.NET
-  Database:  PostgreSQL, MySQL, MongoDB, SQL Server
-
-TOOLS & PLATFORMS:
-──────────────────────────────────────────────────────────────────
-  • Linux / Linux Mint (Expert)
-  • Git / GitHub
-  • Docker
-  • Azure Cloud
-  • VS Code
-  • Heroku
-'''
-        },
-        'Honors.txt': {
-            'type': 'file',
-            'icon': '🏆',
-            'window': 'honors',
-            'content': '''╔══════════════════════════════════════════════════════════════╗
-║                    HONORS & ACHIEVEMENTS                      ║
-╚══════════════════════════════════════════════════════════════╝
-
-ACADEMIC HONORS:
-──────────────────────────────────────────────────────────────────
-  🏆 Dean's List - Missouri State University
-  🏆 International Student Academic Excellence Award
-
-CERTIFICATIONS:
-──────────────────────────────────────────────────────────────────
-  📜 CodePath Web Development (Web102)
-  📜 AWS Cloud Practitioner (In Progress)
-
-ACTIVITIES:
-──────────────────────────────────────────────────────────────────
-  • Association for Computing Machinery (ACM) Member
-  • Open Source Contributor
-  • Hackathon Participant
-'''
-        },
-        'Contact.txt': {
-            'type': 'file',
-            'icon': '✉️',
-            'window': 'contact',
-            'content': '''╔══════════════════════════════════════════════════════════════╗
-║                      CONTACT INFORMATION                      ║
-╚══════════════════════════════════════════════════════════════╝
-
-📧 Email:    st582s@missouristate.edu
-📱 Phone:    703-762-6809
-📍 Location: Springfield, Missouri
-
-ONLINE PRESENCE:
-──────────────────────────────────────────────────────────────────
-  🔗 GitHub:   github.com/ttsudarshan
-  💼 LinkedIn: linkedin.com/in/ttsudarshan
-
-I'm actively seeking internship opportunities!
-Feel free to reach out for collaborations or opportunities.
-'''
-        },
-        'CV.pdf': {
-            'type': 'file',
-            'icon': '📋',
-            'window': 'cv',
-            'content': '''[PDF Document]
-══════════════════════════════════════════════════════════════════
-Resume available for download at:
-https://github.com/ttsudarshan/Resume/raw/main/Sudarshan_Tiwaari_resume.pdf
-
-Type 'open CV.pdf' to view in PDF viewer window.
-══════════════════════════════════════════════════════════════════
-'''
-        }
-    }
-}
+# Content is loaded from CONTENT_DIR (see vfs.py), or from a compiled
+# snapshot when VFS_SNAPSHOT points at one
+VFS_SNAPSHOT = os.environ.get('VFS_SNAPSHOT', '')
+CONTENT_CHECK_INTERVAL = float(os.environ.get('CONTENT_CHECK_INTERVAL', 2))
 
 MESSAGES_FILE = 'anonymous_messages.json'
 
 @app.route('/api/send-message', methods=['POST'])
+@rate_limited('message', 'visitor_id')
 def send_anonymous_message():
     try:
         data = request.json
@@ -432,7 +516,7 @@ def get_guestbook_photos():
         if limit:
             query_url += f'&limit={limit}'
         
-        response = requests.get(query_url, headers=get_supabase_headers())
+        response = supabase_request('list_photos', 'GET', query_url, headers=get_supabase_headers())
         
         if response.status_code == 200:
             photos = response.json()
@@ -444,6 +528,7 @@ def get_guestbook_photos():
         return jsonify({'success': False, 'error': str(e), 'photos': []})
 
 @app.route('/api/guestbook/upload', methods=['POST'])
+@rate_limited('upload', 'visitor_id')
 def upload_guestbook_photo():
     """Upload a new guestbook photo"""
     try:
@@ -468,8 +553,8 @@ def upload_guestbook_photo():
         # Upload image to Supabase Storage
         image_bytes = base64.b64decode(image_data)
         
-        upload_response = requests.post(
-            f'{SUPABASE_URL}/storage/v1/object/{SUPABASE_BUCKET}/{filename}',
+        upload_response = supabase_request(
+            'upload_image', 'POST', f'{SUPABASE_URL}/storage/v1/object/{SUPABASE_BUCKET}/{filename}',
             headers={
                 'apikey': SUPABASE_KEY,
                 'Authorization': f'Bearer {SUPABASE_KEY}',
@@ -493,8 +578,8 @@ def upload_guestbook_photo():
             'created_at': datetime.utcnow().isoformat()
         }
         
-        db_response = requests.post(
-            f'{SUPABASE_URL}/rest/v1/guestbook_photos',
+        db_response = supabase_request(
+            'insert_photo', 'POST', f'{SUPABASE_URL}/rest/v1/guestbook_photos',
             headers=get_supabase_headers(),
             json=photo_data
         )
@@ -516,11 +601,11 @@ def delete_guestbook_photo(photo_id):
         
         data = request.json
         visitor_id = data.get('visitor_id')
-        is_admin = data.get('admin_key') == os.environ.get('ADMIN_KEY', 'your-secret-admin-key')
+        is_admin = check_admin_key(data.get('admin_key'))
         
         # First, get the photo to check ownership and get filename
-        photo_response = requests.get(
-            f'{SUPABASE_URL}/rest/v1/guestbook_photos?id=eq.{photo_id}&select=*',
+        photo_response = supabase_request(
+            'get_photo', 'GET', f'{SUPABASE_URL}/rest/v1/guestbook_photos?id=eq.{photo_id}&select=*',
             headers=get_supabase_headers()
         )
         
@@ -536,8 +621,8 @@ def delete_guestbook_photo(photo_id):
         # Delete from storage
         filename = photo.get('filename')
         if filename:
-            requests.delete(
-                f'{SUPABASE_URL}/storage/v1/object/{SUPABASE_BUCKET}/{filename}',
+            supabase_request(
+                'delete_image', 'DELETE', f'{SUPABASE_URL}/storage/v1/object/{SUPABASE_BUCKET}/{filename}',
                 headers={
                     'apikey': SUPABASE_KEY,
                     'Authorization': f'Bearer {SUPABASE_KEY}'
@@ -545,8 +630,8 @@ def delete_guestbook_photo(photo_id):
             )
         
         # Delete from database
-        delete_response = requests.delete(
-            f'{SUPABASE_URL}/rest/v1/guestbook_photos?id=eq.{photo_id}',
+        delete_response = supabase_request(
+            'delete_photo', 'DELETE', f'{SUPABASE_URL}/rest/v1/guestbook_photos?id=eq.{photo_id}',
             headers=get_supabase_headers()
         )
         
@@ -558,15 +643,121 @@ def delete_guestbook_photo(photo_id):
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
+ADMIN_PAGE_SIZE = 48
+THUMBNAIL_SIZE = (320, 240)
+# Supabase Storage can resize images on the fly (a paid-plan feature); without
+# it thumbnails are the originals, still only loaded as they scroll into view
+SUPABASE_IMAGE_TRANSFORMS = os.environ.get('SUPABASE_IMAGE_TRANSFORMS', '').lower() in ('1', 'true', 'yes')
+
+def thumbnail_url(image_url):
+    if not SUPABASE_IMAGE_TRANSFORMS or '/storage/v1/object/public/' not in image_url:
+        return image_url
+    width, height = THUMBNAIL_SIZE
+    return (image_url.replace('/storage/v1/object/public/', '/storage/v1/render/image/public/', 1)
+            + f'?width={width}&height={height}&resize=cover&quality=60')
+
+def encode_photo_cursor(photo):
+    return _b64encode(f"{photo['created_at']}|{photo['id']}".encode())
+
+def decode_photo_cursor(cursor):
+    """(created_at, id) of the photo a page starts after; ValueError if malformed
+
+    The id is kept as an opaque string, since the table's key may be a
+    bigint or a UUID.
+    """
+    created_at, _, photo_id = _b64decode(cursor).decode().rpartition('|')
+    datetime.fromisoformat(created_at.replace('Z', '+00:00'))  # nothing else may reach the filter
+    if not photo_id:
+        raise ValueError('cursor without an id')
+    return created_at, photo_id
+
+def _filter_value(value):
+    """A value double-quoted for a PostgREST logic filter"""
+    return '"' + str(value).replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+def list_photos_page(after=None, limit=ADMIN_PAGE_SIZE):
+    """One page of photos, newest first, and the cursor of the next page (or None)
+
+    Keyset pagination on (created_at, id): a page starts strictly after the
+    previous page's last photo, so deep pages cost the same as the first and
+    nothing is skipped or repeated while photos are added or deleted.
+    """
+    query = {
+        'select': 'id,visitor_name,visitor_id,image_url,created_at',
+        'order': 'created_at.desc,id.desc',
+        'limit': limit + 1,
+    }
+    if after:
+        created_at, photo_id = map(_filter_value, after)
+        query['or'] = f'(created_at.lt.{created_at},and(created_at.eq.{created_at},id.lt.{photo_id}))'
+    response = supabase_request('list_photos_page', 'GET',
+                                f'{SUPABASE_URL}/rest/v1/guestbook_photos?{urlencode(query)}',
+                                headers=get_supabase_headers())
+    if response.status_code != 200:
+        raise RuntimeError(f'Supabase returned {response.status_code}')
+    photos = response.json()
+    next_cursor = encode_photo_cursor(photos[limit - 1]) if len(photos) > limit else None
+    return photos[:limit], next_cursor
+
+def render_photo_cards(photos):
+    width, height = THUMBNAIL_SIZE
+    cards = []
+    for p in photos:
+        try:
+            taken = datetime.fromisoformat(p['created_at'].replace('Z', '+00:00')).strftime('%Y-%m-%d %I:%M %p')
+        except (KeyError, TypeError, ValueError):
+            taken = p.get('created_at', '')
+        cards.append(f"""
+            <div class="photo-card">
+                <a href="{escape(p.get('image_url', ''))}" target="_blank" rel="noopener">
+                    <img src="{escape(thumbnail_url(p.get('image_url', '')))}" alt="{escape(p.get('visitor_name', ''))}"
+                         width="{width}" height="{height}" loading="lazy" decoding="async">
+                </a>
+                <p><strong>{escape(p.get('visitor_name', ''))}</strong></p>
+                <p>{escape(taken)}</p>
+                <p style="font-size:10px;color:#666;">ID: {escape(p.get('visitor_id', ''))}</p>
+                <button class="delete-btn" data-id="{escape(p.get('id', ''))}">Delete</button>
+            </div>""")
+    return ''.join(cards)
+
 @app.route('/admin/guestbook')
 def admin_guestbook():
-    """Admin page to view and manage guestbook photos"""
-    admin_key = request.args.get('key', '')
-    expected_key = os.environ.get('ADMIN_KEY', 'your-secret-admin-key')
-    
-    if admin_key != expected_key:
+    """Admin page to view and manage guestbook photos, a page at a time
+
+    ?after=<cursor> starts after a given photo. With &format=fragment only the
+    next page's cards and cursor come back, as JSON, for infinite scroll.
+    """
+    key = request.args.get('key', '')
+    if not check_admin_key(key):
         return "Unauthorized. Add ?key=YOUR_ADMIN_KEY to access.", 403
     
+    fragment = request.args.get('format') == 'fragment'
+    try:
+        after = decode_photo_cursor(request.args['after']) if request.args.get('after') else None
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Bad cursor'}), 400
+    
+    photos, next_cursor, error = [], None, None
+    try:
+        if not SUPABASE_URL or not SUPABASE_KEY:
+            raise RuntimeError('Supabase not configured')
+        photos, next_cursor = list_photos_page(after)
+    except Exception as e:
+        if fragment:
+            return jsonify({'success': False, 'error': str(e)})
+        error = str(e)
+    
+    cards = render_photo_cards(photos)
+    if fragment:
+        return jsonify({'success': True, 'html': cards, 'next': next_cursor})
+    
+    if error:
+        cards = f'<p>Couldn\'t load photos: {escape(error)}</p>'
+    elif not photos:
+        cards = '<p>No photos yet</p>'
+    more = (f'<a id="more" href="?{escape(urlencode({"key": key, "after": next_cursor}))}" '
+            f'data-next="{next_cursor}">More photos →</a>' if next_cursor else '<span id="more" data-next=""></span>')
+    
     html = """
     <html>
     <head>
@@ -576,174 +767,1810 @@ def admin_guestbook():
             .header { background: #000080; color: white; padding: 10px; margin-bottom: 15px; }
             .photo-grid { display: grid; grid-template-columns: repeat(auto-fill, minmax(200px, 1fr)); gap: 15px; }
             .photo-card { background: white; padding: 10px; border: 2px solid #808080; }
-            .photo-card img { width: 100%; height: 150px; object-fit: cover; }
+            .photo-card img { width: 100%; height: 150px; object-fit: cover; background: #dfdfdf; }
             .photo-card p { margin: 5px 0; font-size: 12px; }
             .delete-btn { background: #ff4444; color: white; border: none; padding: 5px 10px; cursor: pointer; }
+            #more { display: block; margin: 20px 0; text-align: center; }
         </style>
     </head>
     <body>
         <div class="header"><h1>📸 Guestbook Admin</h1></div>
-        <div id="photos" class="photo-grid">Loading...</div>
+        <div id="photos" class="photo-grid">""" + cards + """</div>
+        """ + more + """
         <script>
-            const ADMIN_KEY = '""" + expected_key + """';
-            async function loadPhotos() {
-                const res = await fetch('/api/guestbook/photos');
-                const data = await res.json();
-                const container = document.getElementById('photos');
-                if (!data.photos || data.photos.length === 0) {
-                    container.innerHTML = '<p>No photos yet</p>';
-                    return;
+            const ADMIN_KEY = """ + json.dumps(key).replace('</', '<\\/') + """;
+            const grid = document.getElementById('photos');
+            const more = document.getElementById('more');
+            let loading = false;
+            
+            // Infinite scroll: fetch the next page when the "More" link nears the viewport
+            async function loadMore() {
+                const cursor = more.dataset.next;
+                if (loading || !cursor) return;
+                loading = true;
+                more.textContent = 'Loading...';
+                try {
+                    const params = new URLSearchParams({key: ADMIN_KEY, after: cursor, format: 'fragment'});
+                    const data = await (await fetch('/admin/guestbook?' + params)).json();
+                    if (!data.success) throw new Error(data.error);
+                    grid.insertAdjacentHTML('beforeend', data.html);
+                    more.dataset.next = data.next || '';
+                    more.textContent = data.next ? 'More photos →' : '';
+                } catch (err) {
+                    more.textContent = 'Could not load more photos (' + err.message + '), click to retry';
+                } finally {
+                    loading = false;
                 }
-                container.innerHTML = data.photos.map(p => `
-                    <div class="photo-card">
-                        <img src="${p.image_url}" alt="${p.visitor_name}">
-                        <p><strong>${p.visitor_name}</strong></p>
-                        <p>${new Date(p.created_at).toLocaleString()}</p>
-                        <p style="font-size:10px;color:#666;">ID: ${p.visitor_id}</p>
-                        <button class="delete-btn" onclick="deletePhoto('${p.id}')">Delete</button>
-                    </div>
-                `).join('');
+                // Re-observe so a page that still leaves the link in view loads the next one
+                observer.unobserve(more);
+                observer.observe(more);
             }
-            async function deletePhoto(id) {
-                if (!confirm('Delete this photo?')) return;
-                await fetch('/api/guestbook/delete/' + id, {
+            const observer = new IntersectionObserver(entries => {
+                if (entries.some(e => e.isIntersecting)) loadMore();
+            }, {rootMargin: '600px'});
+            observer.observe(more);
+            more.addEventListener('click', e => { e.preventDefault(); loadMore(); });
+            
+            grid.addEventListener('click', async e => {
+                const button = e.target.closest('.delete-btn');
+                if (!button || !confirm('Delete this photo?')) return;
+                button.disabled = true;
+                const res = await fetch('/api/guestbook/delete/' + button.dataset.id, {
                     method: 'DELETE',
                     headers: {'Content-Type': 'application/json'},
                     body: JSON.stringify({admin_key: ADMIN_KEY})
                 });
-                loadPhotos();
-            }
-            loadPhotos();
+                const data = await res.json();
+                if (data.success) {
+                    button.closest('.photo-card').remove();
+                } else {
+                    alert(data.error || 'Delete failed');
+                    button.disabled = false;
+                }
+            });
         </script>
     </body>
     </html>
     """
-    return html
+    return html
+
+# ============================================================================
+# PATH INDEX & COMPLETION - Flat lookup tables built from the content tree
+# ============================================================================
+
+HOME_DIR = '/home/sudarshan/Portfolio'
+
+class PrefixTrie:
+    """Case-insensitive prefix trie where every node caches its sorted matches"""
+
+    __slots__ = ('_root',)
+
+    def __init__(self, items=()):
+        # Each node is a dict of char -> child; the '' key holds the values
+        # of every word passing through that node, so a lookup is just a walk
+        self._root = {}
+        for key, value in sorted(items, key=lambda kv: kv[0].lower()):
+            node = self._root
+            node.setdefault('', []).append(value)
+            for ch in key.lower():
+                node = node.setdefault(ch, {})
+                node.setdefault('', []).append(value)
+        self._freeze(self._root)
+
+    def _freeze(self, node):
+        for key, child in node.items():
+            if key:
+                self._freeze(child)
+        node[''] = tuple(node.get('', ()))
+
+    def complete(self, prefix):
+        """Return every value whose key starts with prefix"""
+        node = self._root
+        for ch in prefix.lower():
+            node = node.get(ch)
+            if node is None:
+                return ()
+        return node.get('', ())
+
+
+class VFSIndex:
+    """Flattened view of a virtual filesystem tree, addressable by integer id
+
+    When rebuilt from a `previous` index, paths that still exist keep their
+    id, so sessions (which only store their cwd id) survive a content reload.
+    Ids of vanished paths become aliases of their closest surviving parent.
+    """
+
+    __slots__ = ('nodes', 'parts', '_keys', '_by_key', '_children', 'search', 'home', 'intern')
+
+    def __init__(self, root, previous=None, search=None, home=HOME_DIR, intern=None):
+        self.search = search            # vfs.Snapshot with a trigram index, if any
+        self.home = home                # absolute path shown for the root
+        self.intern = intern            # vfs.Interner shared with other tenants' indexes, if any
+        entries = []  # (key, parts, node) in tree order
+        self._walk(root, (), entries)
+        
+        ids = {}
+        size = len(previous.nodes) if previous else 0
+        for key, parts, node in entries:
+            idx = previous._by_key.get(key) if previous else None
+            if idx is None:
+                idx, size = size, size + 1
+            ids[key] = idx
+        
+        self.nodes = [None] * size      # id -> node dict
+        self.parts = [None] * size      # id -> tuple of names from the root
+        self._keys = [None] * size      # id -> tuple of lowercase names (lookup key)
+        self._by_key = ids
+        self._children = {}             # directory id -> PrefixTrie of (name, child id), built on first use
+        for key, parts, node in entries:
+            idx = ids[key]
+            self.nodes[idx], self.parts[idx], self._keys[idx] = node, parts, key
+        
+        for idx in range(size):
+            if self.nodes[idx] is None:
+                key = previous._keys[idx]
+                while key not in ids:
+                    key = key[:-1]
+                alias = ids[key]
+                self.nodes[idx], self.parts[idx], self._keys[idx] = self.nodes[alias], self.parts[alias], key
+
+    def _walk(self, node, parts, entries):
+        key = tuple(p.lower() for p in parts)
+        if self.intern is not None:
+            key, parts = self.intern(key), self.intern(parts)
+        entries.append((key, parts, node))
+        if node.get('type') == 'directory':
+            for name, child in node.get('contents', {}).items():
+                self._walk(child, parts + (name,), entries)
+
+    def read(self, idx):
+        return self.read_node(self.nodes[idx], self.intern)
+
+    @staticmethod
+    def read_node(node, intern=None):
+        """Body of a file node, loaded from disk the first time it's asked for"""
+        content = node.get('content')
+        if content is None:
+            source = node.get('source')
+            if source is not None and not isinstance(source, str):
+                return source.read()  # snapshot-backed; keep it out of the heap
+            try:
+                with open(source, encoding='utf-8', errors='replace', newline='') as f:
+                    content = f.read()
+            except (TypeError, OSError):
+                content = ''
+            if intern is not None:
+                content = intern(content)
+            node['content'] = content
+        return content
+
+    def is_dir(self, idx):
+        return self.nodes[idx].get('type') == 'directory'
+
+    def name(self, idx):
+        return self.parts[idx][-1] if self.parts[idx] else 'Portfolio'
+
+    def abs_path(self, idx):
+        return self.home + ''.join('/' + p for p in self.parts[idx])
+
+    def resolve(self, path, cwd=0):
+        """Resolve a (case-insensitive) path relative to cwd; None if missing"""
+        home = self.home
+        if path == home or path.startswith(home + '/'):
+            key, path = [], path[len(home):]
+        elif path.startswith('/') or path == '~' or path.startswith('~/'):
+            # The portfolio is the whole file system: / is its root, as ~ is
+            key, path = [], path[1:]
+        else:
+            key = list(self._keys[cwd])
+
+        for part in path.split('/'):
+            if not part or part == '.':
+                continue
+            if part == '..':
+                if key:
+                    key.pop()
+                continue
+            key.append(part.lower())
+            if tuple(key) not in self._by_key:
+                return None
+        return self._by_key[tuple(key)]
+
+    def children(self, idx, prefix=''):
+        """(name, id) pairs of a directory's entries starting with prefix"""
+        trie = self._children.get(idx)
+        if trie is None:
+            # Only Tab completion needs these; most directories are never completed in
+            node = self.nodes[idx]
+            if node.get('type') != 'directory':
+                return ()
+            key = self._keys[idx]
+            trie = self._children[idx] = PrefixTrie(
+                (name, (name, self._by_key[key + (name.lower(),)])) for name in node.get('contents', {})
+            )
+        return trie.complete(prefix)
+
+    def memory_bytes(self):
+        """Approximate heap held by the index; file bodies not read yet are
+        counted at their size on disk, since reading them keeps them"""
+        total = sum(sys.getsizeof(table) for table in (self.nodes, self.parts, self._keys, self._by_key))
+        for node, parts, key in zip(self.nodes, self.parts, self._keys):
+            total += sys.getsizeof(node) + sys.getsizeof(parts) + sys.getsizeof(key)
+            if parts:
+                total += sys.getsizeof(parts[-1]) + sys.getsizeof(key[-1])
+            if 'contents' in node:
+                total += sys.getsizeof(node['contents'])
+            elif node.get('content') is not None:
+                total += sys.getsizeof(node['content'])
+            elif isinstance(node.get('source'), str):
+                try:
+                    total += os.path.getsize(node['source'])
+                except OSError:
+                    pass
+        return total
+
+
+def load_vfs(tenant, previous=None):
+    """Build a tenant's VFSIndex from its compiled snapshot if it has one, else its content directory"""
+    if tenant.snapshot:
+        try:
+            snapshot = Snapshot(tenant.snapshot)
+            return VFSIndex(snapshot.tree(), previous, search=snapshot, home=tenant.home, intern=tenants.intern)
+        except (OSError, ValueError) as e:
+            print(f"WARNING: can't use VFS snapshot ({e}); loading {tenant.root}")
+    return VFSIndex(load_content_tree(tenant.root, tenants.intern), previous,
+                    home=tenant.home, intern=tenants.intern)
+
+
+class ContentWatcher:
+    """Polls a tenant's content directory (or snapshot file) and swaps in a rebuilt index
+
+    check() runs before each of the tenant's requests but only looks at the
+    disk once per interval. The new index is built off to the side and
+    published with a single assignment, so requests see either the old tree
+    or the new one.
+    """
+
+    def __init__(self, tenant, interval=CONTENT_CHECK_INTERVAL):
+        self.tenant = tenant
+        self.interval = interval
+        self.signature = self._signature()
+        self._next_check = time.monotonic() + interval
+        self._lock = threading.Lock()
+        self.reloads = 0
+
+    def check(self):
+        now = time.monotonic()
+        if now < self._next_check or not self._lock.acquire(blocking=False):
+            return False
+        try:
+            self._next_check = now + self.interval
+            if not self.refresh():
+                return False
+            self.reload()
+            return True
+        finally:
+            self._lock.release()
+
+    def refresh(self):
+        """Look at the disk again; True if the content changed since last time"""
+        signature = self._signature()
+        if signature == self.signature:
+            return False
+        self.signature = signature
+        return True
+
+    def _signature(self):
+        if self.tenant.snapshot:
+            return file_signature(self.tenant.snapshot)
+        return content_signature(self.tenant.root)
+
+    def reload(self):
+        tenant = self.tenant
+        tenant.load_profile()
+        tenant.generation += 1
+        tenants.publish(tenant, load_vfs(tenant, previous=tenant.index))
+        render_pure.cache_clear()
+        self.reloads += 1
+
+
+# ============================================================================
+# TENANTS - Many portfolios served by one process
+# ============================================================================
+
+# Without TENANTS_DIR the app serves the one portfolio in CONTENT_DIR (or
+# VFS_SNAPSHOT). With it, each subdirectory of TENANTS_DIR is another
+# portfolio, picked per request by a /t/<name>/ path prefix or by the Host
+# header; requests matching neither get the default one. A tenant's index is
+# loaded by its first request and kept in an LRU capped at TENANT_CACHE_BYTES.
+# Only the terminal is per tenant: the GUI page, guestbook, anonymous
+# messages and /admin pages stay shared and belong to the deployment's owner.
+TENANTS_DIR = os.environ.get('TENANTS_DIR', '')
+TENANT_CACHE_BYTES = int(os.environ.get('TENANT_CACHE_BYTES', 64 * 1024 * 1024))
+TENANT_PATH_PREFIX = '/t/'
+TENANT_NAME = re.compile(r'[a-z0-9][a-z0-9._-]{0,62}$')
+
+# Whose portfolio it is, for whoami, neofetch and the prompt. A tenant's
+# .profile.json overrides these; tenants other than the default start blank.
+PROFILE_FILE = '.profile.json'
+DEFAULT_PROFILE = MappingProxyType({
+    'user': 'sudarshan',
+    'name': 'Sudarshan Tiwari',
+    'role': 'Portfolio Owner',
+    'status': 'CS Student | Software Developer',
+    'location': 'Springfield, MO',
+    'kernel': 'Tiwari Custom Kernel',
+    'since': 'NOV 2025',
+    'cpu': 'Ryzen 7 4800h',
+    'disk': 'AWS',
+    'languages': 'JS, Python, C/C++, PHP',
+    'frameworks': 'React, Flask, Angular',
+    'tools': 'Git, Docker, Linux',
+})
+
+class Tenant:
+    """One hosted portfolio: where its content lives, whose it is and, while
+    it is cached, its VFSIndex
+
+    Tenant objects are small and kept for the life of the process; only the
+    index is loaded on demand and dropped again by the TenantRegistry.
+    """
+
+    __slots__ = ('name', 'root', 'snapshot', 'profile', 'home', 'env', 'index',
+                 'generation', 'size', 'watcher', 'loading')
+
+    def __init__(self, name, root, snapshot=''):
+        self.name = name            # '' for the default tenant
+        self.root = root
+        self.snapshot = snapshot
+        self.index = None
+        self.generation = 0         # bumped whenever the content changes
+        self.size = 0               # index.memory_bytes() when it was published
+        self.loading = threading.Lock()  # held while the index is being built
+        self.load_profile()
+        self.watcher = ContentWatcher(self)
+
+    def load_profile(self):
+        base = DEFAULT_PROFILE if not self.name else {**dict.fromkeys(DEFAULT_PROFILE, ''),
+                                                      'user': self.name, 'name': self.name}
+        try:
+            with open(os.path.join(self.root, PROFILE_FILE), encoding='utf-8') as f:
+                custom = json.load(f)
+        except FileNotFoundError:
+            custom = {}
+        except (OSError, ValueError) as e:
+            print(f"WARNING: ignoring {PROFILE_FILE} of tenant {self.name or '(default)'}: {e}")
+            custom = {}
+        if not isinstance(custom, dict):
+            custom = {}
+        profile = {**base, **{k: str(v) for k, v in custom.items() if k in DEFAULT_PROFILE}}
+        if not TENANT_NAME.match(profile['user']):  # it becomes part of every path
+            profile['user'] = base['user']
+        self.profile = MappingProxyType(profile)
+        self.home = f"/home/{profile['user']}/Portfolio"
+        self.env = MappingProxyType({
+            'USER': profile['user'],
+            'HOME': self.home,
+            'SHELL': '/bin/myshell',
+            'PWD': self.home
+        })
+
+    @property
+    def vfs(self):
+        """The tenant's VFSIndex, loaded first if it isn't cached"""
+        index = self.index
+        return index if index is not None else tenants.load(self)
+
+    def scope(self, session_id):
+        """Session id namespaced by tenant, so two tenants never share a shell"""
+        if not self.name:
+            return session_id
+        session_id = str(session_id)
+        return session_id if session_id.startswith(self.name + ':') else f'{self.name}:{session_id}'
+
+
+class TenantRegistry:
+    """Tenants by name, with their indexes in an LRU bounded by estimated bytes
+
+    The default tenant is pinned and not counted. When publishing an index
+    takes the total over budget, the least recently used tenants lose theirs
+    (never the one just published) and the shared Interner is swept, so
+    strings only those indexes used are freed too.
+    """
+
+    def __init__(self, root, default, budget=TENANT_CACHE_BYTES, intern=None):
+        self.root = root
+        self.default = default
+        self.budget = budget
+        self.intern = intern
+        self._tenants = {}              # name -> Tenant, for every tenant seen
+        self._loaded = OrderedDict()    # name -> Tenant holding an index, coldest first
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.loads = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._loaded)
+
+    def all(self):
+        return [self.default, *self._tenants.values()]
+
+    def get(self, name):
+        """The tenant called name, or None if TENANTS_DIR has no such portfolio"""
+        tenant = self._tenants.get(name)
+        if tenant is None and self.root and TENANT_NAME.match(name):
+            path = os.path.join(self.root, name)
+            if os.path.isdir(path):
+                with self._lock:
+                    tenant = self._tenants.get(name)
+                    if tenant is None:
+                        tenant = self._tenants[name] = Tenant(name, path)
+        return tenant
+
+    def touch(self, tenant):
+        """Mark a tenant as just used"""
+        if tenant.index is not None and tenant is not self.default:
+            with self._lock:
+                if tenant.name in self._loaded:
+                    self._loaded.move_to_end(tenant.name)
+
+    def load(self, tenant):
+        """A tenant's index, building it if needed (once, however many requests ask)
+
+        The build runs under the tenant's own lock, not the registry's, so
+        a cold tenant only holds up requests for that tenant.
+        """
+        with tenant.loading:
+            index = tenant.index
+            if index is None:
+                if tenant.watcher.refresh():
+                    # Changed while it wasn't cached
+                    tenant.load_profile()
+                    tenant.generation += 1
+                index = load_vfs(tenant)
+                self.publish(tenant, index)
+                with self._lock:
+                    self.loads += 1
+        # Not tenant.index: another tenant's publish may already have evicted it
+        return index
+
+    def publish(self, tenant, index):
+        size = index.memory_bytes()  # walks the whole index, so outside the lock
+        with self._lock:
+            self._publish(tenant, index, size)
+
+    def _publish(self, tenant, index, size):
+        if tenant is not self.default:
+            if tenant.name in self._loaded:
+                self.bytes -= tenant.size
+            self._loaded[tenant.name] = tenant
+            self._loaded.move_to_end(tenant.name)
+            self.bytes += size
+        tenant.index, tenant.size = index, size
+        evicted = 0
+        while self.bytes > self.budget and len(self._loaded) > 1:
+            _, victim = self._loaded.popitem(last=False)
+            victim.index = None
+            self.bytes -= victim.size
+            evicted += 1
+        if evicted:
+            self.evictions += evicted
+            if self.intern is not None:
+                self.intern.sweep()
+
+
+class TenantRouter:
+    """WSGI middleware that works out which tenant a request is for
+
+    /t/<name>/... reaches the app as /... with the prefix moved to
+    SCRIPT_NAME; otherwise the Host header's full name, then its first
+    label, is looked up. The result goes in environ['portfolio.tenant'].
+    """
+
+    def __init__(self, wsgi_app, registry):
+        self.wsgi_app = wsgi_app
+        self.registry = registry
+
+    def __call__(self, environ, start_response):
+        tenant = None
+        path = environ.get('PATH_INFO', '')
+        if path.startswith(TENANT_PATH_PREFIX):
+            name, slash, rest = path[len(TENANT_PATH_PREFIX):].partition('/')
+            tenant = self.registry.get(name)
+            if tenant is not None:
+                prefix = environ.get('SCRIPT_NAME', '') + TENANT_PATH_PREFIX + name
+                if not slash:
+                    # The page calls the API relative to its own directory
+                    query = environ.get('QUERY_STRING')
+                    return redirect(prefix + '/' + ('?' + query if query else ''), 301)(environ, start_response)
+                environ['SCRIPT_NAME'], environ['PATH_INFO'] = prefix, '/' + rest
+        if tenant is None:
+            host = environ.get('HTTP_HOST', '').lower().rsplit(':', 1)[0]
+            label = host.partition('.')[0]
+            tenant = self.registry.get(host) or (self.registry.get(label) if label != host else None)
+        tenant = tenant or self.registry.default
+        self.registry.touch(tenant)
+        environ['portfolio.tenant'] = tenant
+        return self.wsgi_app(environ, start_response)
+
+
+DEFAULT_TENANT = Tenant('', CONTENT_DIR, VFS_SNAPSHOT)
+tenants = TenantRegistry(TENANTS_DIR, DEFAULT_TENANT, intern=Interner() if TENANTS_DIR else None)
+tenants.publish(DEFAULT_TENANT, load_vfs(DEFAULT_TENANT))
+
+if TENANTS_DIR:
+    app.wsgi_app = TenantRouter(app.wsgi_app, tenants)
+
+def current_tenant():
+    """Tenant of the request being handled (see TenantRouter); the default elsewhere"""
+    if has_request_context():
+        return request.environ.get('portfolio.tenant', DEFAULT_TENANT)
+    return DEFAULT_TENANT
+
+@app.before_request
+def check_content():
+    tenant = current_tenant()
+    if tenant.index is not None:
+        tenant.watcher.check()
+
+def _common_prefix(words):
+    """Longest prefix shared by all words, compared case-insensitively"""
+    first = min(words, key=len)
+    for i, ch in enumerate(first.lower()):
+        if any(w[i].lower() != ch for w in words):
+            return first[:i]
+    return first
+
+# ============================================================================
+# SESSION STORE - Bounded, idle-expiring map of session_id -> PortfolioShell
+# ============================================================================
+
+SESSION_TTL = int(os.environ.get('SESSION_TTL', 30 * 60))       # idle seconds
+SESSION_MAX = int(os.environ.get('SESSION_MAX', 10000))         # per worker
+SESSION_SWEEP_INTERVAL = int(os.environ.get('SESSION_SWEEP_INTERVAL', 60))
+MEMORY_SAMPLE = 256   # shells sized up to estimate the store's memory
+
+class SessionStore:
+    """LRU-ordered session map with an idle TTL and a hard entry cap.
+
+    Entries are kept in last-access order, so both expiry and eviction only
+    ever pop from the cold end. Expired entries are dropped lazily when they
+    are looked up, and a full sweep runs at most every sweep_interval seconds
+    on the back of normal traffic (no background thread, so it is fork-safe).
+    """
+
+    def __init__(self, ttl=SESSION_TTL, max_entries=SESSION_MAX,
+                 sweep_interval=SESSION_SWEEP_INTERVAL, clock=time.monotonic):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.sweep_interval = sweep_interval
+        self._clock = clock
+        self._entries = OrderedDict()  # session_id -> shell, coldest first
+        self._lock = threading.Lock()
+        self._next_sweep = clock() + sweep_interval
+        self.created = 0
+        self.expired = 0
+        self.evicted = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, session_id):
+        """Return the live shell for session_id (refreshing it) or None"""
+        now = self._clock()
+        with self._lock:
+            self._maybe_sweep(now)
+            shell = self._entries.get(session_id)
+            if shell is None:
+                return None
+            if now - shell.last_seen > self.ttl:
+                del self._entries[session_id]
+                self.expired += 1
+                return None
+            shell.last_seen = now
+            self._entries.move_to_end(session_id)
+            return shell
+
+    def put(self, session_id, shell):
+        now = self._clock()
+        with self._lock:
+            if session_id not in self._entries:
+                self.created += 1
+            shell.last_seen = now
+            self._entries[session_id] = shell
+            self._entries.move_to_end(session_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evicted += 1
+
+    def sweep(self):
+        """Drop every idle-expired session now"""
+        with self._lock:
+            self._sweep(self._clock())
+
+    def _maybe_sweep(self, now):
+        if now >= self._next_sweep:
+            self._sweep(now)
+
+    def _sweep(self, now):
+        self._next_sweep = now + self.sweep_interval
+        entries = self._entries
+        while entries:
+            session_id, shell = next(iter(entries.items()))
+            if now - shell.last_seen <= self.ttl:
+                break
+            del entries[session_id]
+            self.expired += 1
+
+    def memory_bytes(self, sample=MEMORY_SAMPLE):
+        """Approximate heap held by the stored shells, for /metrics
+
+        Sizes up an evenly spaced sample of at most `sample` shells and
+        scales it, so the cost doesn't grow with the number of sessions.
+        """
+        with self._lock:
+            count = len(self._entries)
+            step = max(1, count // sample)
+            shells = list(islice(self._entries.values(), 0, None, step))
+        sampled = 0
+        for shell in shells:
+            sampled += sys.getsizeof(shell)
+            if shell.history:
+                sampled += sys.getsizeof(shell.history) + sys.getsizeof(shell.history._buf)
+                sampled += sum(sys.getsizeof(cmd) for _, cmd in shell.history.newest())
+            if shell._env_overlay:
+                sampled += sys.getsizeof(shell._env_overlay)
+        estimate = sampled * count // len(shells) if shells else 0
+        return sys.getsizeof(self._entries) + estimate
+
+    def stats(self):
+        return {
+            'live': len(self._entries),
+            'created': self.created,
+            'expired': self.expired,
+            'evicted': self.evicted,
+        }
+
+
+sessions = SessionStore()
+
+# ============================================================================
+# STATELESS SESSIONS - Shell state carried by the client in a signed token
+# ============================================================================
+
+# With STATELESS_SESSIONS on, nothing is kept server-side: every response
+# carries a `state` token (cwd, env overrides, recent history) signed with
+# SESSION_SECRET, and any worker holding the same secret can pick it up. A
+# token names the session it belongs to and when it was issued, so it can't
+# be replayed into another session or revived after SESSION_TTL.
+STATELESS_SESSIONS = os.environ.get('STATELESS_SESSIONS', '').lower() in ('1', 'true', 'yes')
+SESSION_SECRET = os.environ.get('SESSION_SECRET', '').encode()
+STATE_HISTORY = 20        # history entries carried in a token
+STATE_MAX_LENGTH = 4096   # tokens longer than this are rejected unread
+
+if STATELESS_SESSIONS and not SESSION_SECRET:
+    print("WARNING: STATELESS_SESSIONS without SESSION_SECRET; "
+          "tokens will only be valid on the worker that issued them")
+    SESSION_SECRET = os.urandom(32)
+
+def _b64encode(raw):
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode('ascii')
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+def _sign(payload):
+    return hmac.new(SESSION_SECRET, payload, hashlib.sha256).digest()[:16]
+
+def encode_state(shell):
+    """Serialize a shell into a compact signed token: v2.<payload>.<mac>
+
+    A token must stay within STATE_MAX_LENGTH or decode_state would reject
+    it, so the oldest history entries (and, after them, the earliest env
+    overrides) are left out until it fits.
+    """
+    state = [shell.session_id, int(time.time()), shell.to_state()]
+    token = _pack_state(state)
+    shell_state = state[2]
+    while len(token) > STATE_MAX_LENGTH and (shell_state[1] or shell_state[2]):
+        if shell_state[2]:
+            shell_state[2] = shell_state[2][(len(shell_state[2]) + 1) // 2:]
+        else:
+            overlay = dict(shell_state[1])
+            del overlay[next(iter(overlay))]
+            shell_state[1] = overlay
+        token = _pack_state(state)
+    return token
+
+def _pack_state(state):
+    raw = json.dumps(state, separators=(',', ':'), ensure_ascii=False).encode()
+    packed = zlib.compress(raw, 6)
+    # Leading byte says whether the JSON is stored raw or deflated
+    payload = b'z' + packed if len(packed) < len(raw) else b'j' + raw
+    return f'v2.{_b64encode(payload)}.{_b64encode(_sign(payload))}'
+
+def decode_state(token, session_id):
+    """Rebuild a shell from a token; None if it is malformed, forged,
+    another session's or older than SESSION_TTL"""
+    if not isinstance(token, str) or len(token) > STATE_MAX_LENGTH:
+        return None
+    try:
+        version, payload, mac = token.split('.')
+        if version != 'v2':
+            return None
+        payload = _b64decode(payload)
+        if not hmac.compare_digest(_b64decode(mac), _sign(payload)):
+            return None
+        raw = zlib.decompress(payload[1:]) if payload[:1] == b'z' else payload[1:]
+        owner, issued, state = json.loads(raw)
+        if owner != session_id or time.time() - issued > SESSION_TTL:
+            return None
+        return PortfolioShell.from_state(session_id, state)
+    except (ValueError, TypeError, zlib.error):
+        return None
+
+# ============================================================================
+# SESSION BACKENDS - Where server-side shell state lives between requests
+# ============================================================================
+
+# SESSION_BACKEND=memory keeps shells in this worker (SessionStore above);
+# sqlite and redis serialize them so every worker on a host (or every host)
+# sees the same terminal. A request loads its shell once and saves it once.
+SESSION_BACKEND = os.environ.get('SESSION_BACKEND', 'memory').lower()
+SESSION_DB = os.environ.get(
+    'SESSION_DB',
+    '/dev/shm/portfolio_sessions.db' if os.path.isdir('/dev/shm') else 'portfolio_sessions.db'
+)
+REDIS_URL = os.environ.get('REDIS_URL', 'redis://127.0.0.1:6379/0')
+BACKEND_HISTORY = 50  # history entries serialized with a shared-backend session
+
+class SessionBackend:
+    """Interface: load a shell by id, save it back after a request"""
+
+    def load(self, session_id):
+        raise NotImplementedError
+
+    def save(self, shell):
+        raise NotImplementedError
+
+    def stats(self):
+        return {}
+
+    @staticmethod
+    def dumps(shell):
+        # Only the newest entries travel with every save; PERSISTENT_HISTORY
+        # keeps the rest
+        return json.dumps(shell.to_state(BACKEND_HISTORY),
+                          separators=(',', ':'), ensure_ascii=False).encode()
+
+    @staticmethod
+    def loads(session_id, raw):
+        try:
+            return PortfolioShell.from_state(session_id, json.loads(raw))
+        except (ValueError, TypeError):
+            return None
+
+
+class MemorySessionBackend(SessionBackend):
+    """Live PortfolioShell objects in this process; nothing is serialized"""
+
+    def __init__(self, store):
+        self.store = store
+
+    def load(self, session_id):
+        return self.store.get(session_id)
+
+    def save(self, shell):
+        self.store.put(shell.session_id, shell)
+
+    def stats(self):
+        return {**self.store.stats(), 'bytes': self.store.memory_bytes()}
+
+
+class SQLiteSessionBackend(SessionBackend):
+    """Sessions in one SQLite file shared by every worker on the host.
+
+    Defaults to /dev/shm so the file lives in shared memory; WAL mode lets
+    readers in other workers proceed while one writes.
+    """
+
+    def __init__(self, path=SESSION_DB, ttl=SESSION_TTL, sweep_interval=SESSION_SWEEP_INTERVAL):
+        self.path = path
+        self.ttl = ttl
+        self.sweep_interval = sweep_interval
+        self._local = threading.local()
+        self._next_sweep = 0.0
+
+    def _conn(self):
+        # Connections must not cross a fork or a thread
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS sessions '
+                         '(id TEXT PRIMARY KEY, state BLOB NOT NULL, expires REAL NOT NULL)')
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def load(self, session_id):
+        now = time.time()
+        conn = self._conn()
+        if now >= self._next_sweep:
+            self._next_sweep = now + self.sweep_interval
+            conn.execute('DELETE FROM sessions WHERE expires < ?', (now,))
+        row = conn.execute('SELECT state FROM sessions WHERE id = ? AND expires >= ?',
+                           (session_id, now)).fetchone()
+        return self.loads(session_id, row[0]) if row else None
+
+    def save(self, shell):
+        self._conn().execute('INSERT OR REPLACE INTO sessions VALUES (?, ?, ?)',
+                             (shell.session_id, self.dumps(shell), time.time() + self.ttl))
+
+    def stats(self):
+        row = self._conn().execute('SELECT COUNT(*) FROM sessions WHERE expires >= ?',
+                                   (time.time(),)).fetchone()
+        return {'live': row[0], 'bytes': os.path.getsize(self.path)}
+
+
+class RespClient:
+    """Minimal Redis-protocol (RESP2) client over one socket per thread.
+
+    `send` pipelines a command without waiting; its reply is drained before
+    the next `call`, so a session save never adds a round trip of its own.
+    """
+
+    def __init__(self, url=REDIS_URL, timeout=2.0):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or '127.0.0.1'
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.strip('/') or 0)
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _conn(self):
+        local = self._local
+        if getattr(local, 'sock', None) is None or local.pid != os.getpid():
+            sock = socket.create_connection((self.host, self.port), self.timeout)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            local.sock, local.reader, local.pid, local.pending = sock, sock.makefile('rb'), os.getpid(), 0
+            if self.password:
+                self._roundtrip('AUTH', self.password)
+            if self.db:
+                self._roundtrip('SELECT', self.db)
+        return local
+
+    @staticmethod
+    def _pack(args):
+        out = [b'*%d\r\n' % len(args)]
+        for arg in args:
+            if not isinstance(arg, bytes):
+                arg = str(arg).encode()
+            out.append(b'$%d\r\n%s\r\n' % (len(arg), arg))
+        return b''.join(out)
+
+    def _read(self, reader):
+        line = reader.readline()
+        if not line:
+            raise ConnectionError('Redis connection closed')
+        kind, rest = line[:1], line[1:-2]
+        if kind == b'+':
+            return rest.decode()
+        if kind == b'-':
+            raise RuntimeError(rest.decode())
+        if kind == b':':
+            return int(rest)
+        if kind == b'$':
+            size = int(rest)
+            return None if size < 0 else reader.read(size + 2)[:-2]
+        if kind == b'*':
+            size = int(rest)
+            return None if size < 0 else [self._read(reader) for _ in range(size)]
+        raise ConnectionError(f'Bad RESP reply: {line!r}')
+
+    def _roundtrip(self, *args):
+        local = self._local
+        local.sock.sendall(self._pack(args))
+        return self._read(local.reader)
+
+    def _drain(self, local):
+        while local.pending:
+            local.pending -= 1
+            self._read(local.reader)
+
+    def call(self, *args):
+        try:
+            local = self._conn()
+            self._drain(local)
+            return self._roundtrip(*args)
+        except (OSError, ConnectionError):
+            self.close()
+            raise
+
+    def send(self, *args):
+        try:
+            local = self._conn()
+            local.sock.sendall(self._pack(args))
+            local.pending += 1
+        except (OSError, ConnectionError):
+            self.close()
+            raise
+
+    def close(self):
+        sock = getattr(self._local, 'sock', None)
+        if sock is not None:
+            sock.close()
+        self._local.sock = None
+
+
+class RedisSessionBackend(SessionBackend):
+    """Sessions in Redis (or anything speaking its protocol), keyed shell:<id>"""
+
+    def __init__(self, url=REDIS_URL, ttl=SESSION_TTL):
+        self.client = RespClient(url)
+        self.ttl = ttl
+
+    def load(self, session_id):
+        raw = self.client.call('GET', 'shell:' + session_id)
+        return self.loads(session_id, raw) if raw else None
+
+    def save(self, shell):
+        self.client.send('SET', 'shell:' + shell.session_id, self.dumps(shell), 'EX', self.ttl)
+
+
+# PERSISTENT_HISTORY keeps each session's command history in SQLite beyond
+# the session itself, so a reloaded page (or an expired session) resumes it.
+PERSISTENT_HISTORY = os.environ.get('PERSISTENT_HISTORY', '').lower() in ('1', 'true', 'yes')
+HISTORY_DB = os.environ.get('HISTORY_DB', 'portfolio_history.db')
+
+class HistoryStore:
+    """Per-session command history in SQLite, appended incrementally"""
+
+    def __init__(self, path=HISTORY_DB, capacity=None):
+        self.path = path
+        self.capacity = capacity
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS history (session_id TEXT NOT NULL, '
+                         'seq INTEGER NOT NULL, command TEXT NOT NULL, PRIMARY KEY (session_id, seq))')
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def load(self, session_id):
+        """The session's newest entries as a HistoryRing, or None"""
+        capacity = self.capacity or PortfolioShell.max_history
+        rows = self._conn().execute(
+            'SELECT seq, command FROM history WHERE session_id = ? ORDER BY seq DESC LIMIT ?',
+            (session_id, capacity)).fetchall()
+        if not rows:
+            return None
+        return HistoryRing(capacity, [cmd for _, cmd in reversed(rows)], rows[0][0] + 1)
+
+    def append(self, session_id, history):
+        """Write the entries added since the last append, then trim"""
+        start = max(history.synced, history.first)
+        if start >= history.total:
+            return
+        conn = self._conn()
+        with conn:
+            conn.execute('BEGIN')
+            conn.executemany('INSERT OR REPLACE INTO history VALUES (?, ?, ?)',
+                             [(session_id, seq, history.get(seq)) for seq in range(start, history.total)])
+            conn.execute('DELETE FROM history WHERE session_id = ? AND seq < ?',
+                         (session_id, history.total - history.capacity))
+        history.synced = history.total
+
+
+history_store = HistoryStore() if PERSISTENT_HISTORY else None
+
+def make_session_backend(name=SESSION_BACKEND):
+    if name == 'sqlite':
+        return SQLiteSessionBackend()
+    if name == 'redis':
+        return RedisSessionBackend()
+    return MemorySessionBackend(sessions)
+
+
+session_backend = make_session_backend()
+
+SESSIONS_LIVE = metrics.gauge('portfolio_sessions_live', 'Terminal sessions currently stored',
+                              aggregate='sum' if SESSION_BACKEND == 'memory' else 'max')
+SESSIONS_BYTES = metrics.gauge('portfolio_session_store_bytes', 'Memory (or file size) used by the session store',
+                               aggregate='sum' if SESSION_BACKEND == 'memory' else 'max')
+SESSIONS_CHURN = metrics.counter('portfolio_sessions_total', 'Sessions created, expired or evicted', ('event',))
+
+@metrics.collector
+def collect_session_stats():
+    stats = session_backend.stats()
+    if 'live' in stats:
+        SESSIONS_LIVE.set(stats['live'])
+    if 'bytes' in stats:
+        SESSIONS_BYTES.set(stats['bytes'])
+    for event in ('created', 'expired', 'evicted'):
+        if event in stats:
+            SESSIONS_CHURN.set(stats[event], event=event)
+
+def load_shell(data, create=True):
+    """Find the shell a request refers to, from its token or the session backend"""
+    tenant = current_tenant()
+    session_id = tenant.scope(data.get('session_id', 'default'))
+    if STATELESS_SESSIONS:
+        shell = decode_state(data.get('state'), session_id)
+    else:
+        shell = session_backend.load(session_id)
+    if shell is not None and shell.tenant is not tenant:
+        shell = None
+    if shell is not None and shell.cwd >= len(shell.vfs.nodes):
+        # Its tenant's content changed while the index was out of the cache
+        shell.cwd = 0
+    if shell is None and create:
+        shell = PortfolioShell(session_id, tenant)
+        if history_store is not None:
+            shell.history = history_store.load(session_id)
+    if shell is not None and tracer is not None and has_request_context():
+        trace_request(shell, data)
+    return shell
+
+def save_shell(shell, result):
+    """Persist a shell after a request; in stateless mode, hand back its token"""
+    if history_store is not None and shell.history:
+        history_store.append(shell.session_id, shell.history)
+    if STATELESS_SESSIONS:
+        result['state'] = encode_state(shell)
+    else:
+        session_backend.save(shell)
+    return result
+
+# ============================================================================
+# SHELL LEXER & STREAMS - Quoting, $VAR expansion and lazy line pipelines
+# ============================================================================
+
+class ShellError(Exception):
+    """A command failed; the message is shown to the user as an error"""
+
+
+class Op(str):
+    """An unquoted shell operator (|, <, >, >>), as opposed to a plain word"""
+
+
+_VAR_RE = re.compile(r'\$(?:\{(\w+)\}|([A-Za-z_]\w*))')
+
+def lex(line, env):
+    """Split a command line into words and Op tokens in a single pass.
+
+    Handles 'single' and "double" quotes, backslash escapes and $VAR /
+    ${VAR} expansion (not inside single quotes); unknown variables expand
+    to nothing, as in bash.
+    """
+    words, buf = [], []
+    in_word = False
+    i, n = 0, len(line)
+
+    def expand(i):
+        m = _VAR_RE.match(line, i)
+        if not m:
+            buf.append('$')
+            return i + 1, True
+        value = env.get(m.group(1) or m.group(2), '')
+        buf.append(value)
+        return m.end(), bool(value)
+
+    while i < n:
+        ch = line[i]
+        if ch in ' \t':
+            if in_word:
+                words.append(''.join(buf))
+                buf.clear()
+                in_word = False
+            i += 1
+        elif ch in '|<>':
+            if in_word:
+                words.append(''.join(buf))
+                buf.clear()
+                in_word = False
+            if line.startswith('>>', i):
+                words.append(Op('>>'))
+                i += 2
+            else:
+                words.append(Op(ch))
+                i += 1
+        elif ch == "'":
+            end = line.find("'", i + 1)
+            if end < 0:
+                raise ShellError("bash: unexpected EOF while looking for matching `''")
+            buf.append(line[i + 1:end])
+            in_word = True
+            i = end + 1
+        elif ch == '"':
+            in_word = True
+            i += 1
+            while i < n and line[i] != '"':
+                if line[i] == '\\' and i + 1 < n and line[i + 1] in '"\\$':
+                    buf.append(line[i + 1])
+                    i += 2
+                elif line[i] == '$':
+                    i, _ = expand(i)
+                else:
+                    buf.append(line[i])
+                    i += 1
+            if i >= n:
+                raise ShellError('bash: unexpected EOF while looking for matching `"\'')
+            i += 1
+        elif ch == '\\':
+            if i + 1 < n:
+                buf.append(line[i + 1])
+                in_word = True
+            i += 2
+        elif ch == '$':
+            i, nonempty = expand(i)
+            in_word = in_word or nonempty
+        else:
+            buf.append(ch)
+            in_word = True
+            i += 1
+
+    if in_word:
+        words.append(''.join(buf))
+    return words
+
+def iter_lines(text):
+    """Lazily yield the lines of text (same pieces as text.split('\\n'))"""
+    start = 0
+    while True:
+        end = text.find('\n', start)
+        if end < 0:
+            yield text[start:]
+            return
+        yield text[start:end]
+        start = end + 1
+
+OUTPUT_PAGE_LINES = int(os.environ.get('OUTPUT_PAGE_LINES', 200))
+OUTPUT_PAGE_BYTES = int(os.environ.get('OUTPUT_PAGE_BYTES', 64 * 1024))
+PAGER_LINES = 30          # screenful for less/more
+CURSOR_TTL = 5 * 60       # seconds an unread page is kept
+CURSOR_MAX = 1000         # open cursors per worker
+
+def take_page(lines, page_lines=OUTPUT_PAGE_LINES, page_bytes=OUTPUT_PAGE_BYTES):
+    """Pull one page off a line stream: (lines, rest of the stream or None)"""
+    page, size = [], 0
+    it = iter(lines)
+    for line in it:
+        page.append(line)
+        size += len(line) + 1
+        if len(page) >= page_lines or size >= page_bytes:
+            break
+    else:
+        return page, None
+    peek = next(it, None)
+    if peek is None:
+        return page, None
+    return page, chain((peek,), it)
+
+
+class OutputCursors:
+    """Cursors into the unread remainder of paged command output.
+
+    A cursor is a signed token naming the session, the command's lexed
+    words, the directory it ran in and how many lines were already sent, so
+    any worker (or a stateless one) can re-run the command and carry on from
+    there. The worker that ran it also keeps the remainder as a lazy stream,
+    so pages nobody asks for are never produced and the usual next page
+    costs no re-run. Cursors expire after CURSOR_TTL.
+    """
+
+    def __init__(self, ttl=CURSOR_TTL, max_entries=CURSOR_MAX, secret=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # gunicorn.conf.py hands every worker the same WORKER_SECRET; set
+        # SESSION_SECRET for cursors to carry over between hosts as well
+        self.secret = secret or SESSION_SECRET or os.environ.get('WORKER_SECRET', '').encode() or os.urandom(32)
+        self._streams = OrderedDict()  # nonce -> (offset, lines, expires)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._streams)
+
+    def open(self, shell, words, lines, page_lines, offset, nonce=None):
+        """Token for the lines after the first `offset` of words' output"""
+        nonce = nonce or secrets.token_urlsafe(9)
+        expires = time.time() + self.ttl
+        spec = [nonce, shell.session_id, '/'.join(shell.vfs.parts[shell.cwd]),
+                [[w] if isinstance(w, Op) else w for w in words], offset, page_lines, int(expires)]
+        payload = json.dumps(spec, separators=(',', ':'), ensure_ascii=False).encode()
+        with self._lock:
+            self._expire(time.monotonic())
+            self._streams[nonce] = (offset, lines, time.monotonic() + self.ttl)
+            while len(self._streams) > self.max_entries:
+                self._streams.popitem(last=False)
+        return f'p1.{_b64encode(payload)}.{_b64encode(self._sign(payload))}'
+
+    def next_page(self, cursor, shell):
+        """Result with the next page of a cursor's output, or None if unknown/expired"""
+        spec = self._decode(cursor, shell.session_id)
+        if spec is None:
+            return None
+        nonce, _, cwd, words, offset, page_lines = spec
+        with self._lock:
+            entry = self._streams.pop(nonce, None)
+        # Popped, so no other request can pull from this stream meanwhile
+        if entry is not None and entry[0] == offset:
+            lines = entry[1]
+        else:
+            lines = self._rerun(shell, cwd, words, offset)
+            if isinstance(lines, dict):
+                return lines
+        page, rest = take_page(lines, page_lines)
+        result = {'output': '\n'.join(page), 'type': 'success'}
+        if rest is not None:
+            result['output_truncated'] = True
+            result['next_page'] = self.open(shell, words, rest, page_lines, offset + len(page), nonce)
+        return result
+
+    def close(self, cursor, shell):
+        spec = self._decode(cursor, shell.session_id)
+        if spec is not None:
+            with self._lock:
+                self._streams.pop(spec[0], None)
+
+    def _rerun(self, shell, cwd, words, offset):
+        """Output lines of words run again in cwd, after the first `offset`"""
+        index = shell.vfs
+        idx = index.resolve(cwd)
+        if idx is None or not index.is_dir(idx):
+            return {'output': 'Output expired; run the command again', 'type': 'error'}
+        saved, shell.cwd = shell.cwd, idx
+        try:
+            result = shell._evaluate(words)
+        finally:
+            shell.cwd = saved
+        if result.get('type') == 'error':
+            return result
+        lines = iter_lines(result.get('output', ''))
+        if 'next_page' in result:
+            lines = chain(lines, result['next_page'][0])
+        return islice(lines, offset, None)
+
+    def _sign(self, payload):
+        return hmac.new(self.secret, payload, hashlib.sha256).digest()[:16]
+
+    def _decode(self, cursor, session_id):
+        """(nonce, session, cwd, words, offset, page_lines) of a valid cursor, else None"""
+        if not isinstance(cursor, str) or len(cursor) > STATE_MAX_LENGTH:
+            return None
+        try:
+            version, payload, mac = cursor.split('.')
+            payload = _b64decode(payload)
+            if version != 'p1' or not hmac.compare_digest(_b64decode(mac), self._sign(payload)):
+                return None
+            nonce, owner, cwd, words, offset, page_lines, expires = json.loads(payload)
+        except (ValueError, TypeError):
+            return None
+        if owner != session_id or expires < time.time():
+            return None
+        words = [Op(w[0]) if isinstance(w, list) else w for w in words]
+        return nonce, owner, cwd, words, int(offset), int(page_lines)
+
+    def _expire(self, now):
+        entries = self._streams
+        while entries:
+            nonce, entry = next(iter(entries.items()))
+            if entry[2] > now:
+                break
+            del entries[nonce]
+
+
+output_cursors = OutputCursors()
+
+def _count_option(args, default=10):
+    """Pull a -n N / -nN / -N line count out of args"""
+    n, rest = default, []
+    it = iter(args)
+    for arg in it:
+        if arg == '-n':
+            arg = '-' + next(it, '')
+        elif arg.startswith('-n'):
+            arg = '-' + arg[2:]
+        if arg.startswith('-') and len(arg) > 1:
+            if not arg[1:].isdigit():
+                raise ShellError(f'invalid number of lines: {arg[1:]!r}')
+            n = int(arg[1:])
+        else:
+            rest.append(arg)
+    return n, rest
+
+
+# ============================================================================
+# COMMAND HISTORY - Fixed-size ring buffer with a lazily built search index
+# ============================================================================
+
+HISTORY_SIZE = int(os.environ.get('HISTORY_SIZE', 50))
+HISTORY_COMMAND_LENGTH = 200  # characters of a command kept in history
+
+def _history_trigrams(text):
+    text = text.lower()
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+class HistoryRing:
+    """The last `capacity` commands of a session, O(1) to append
+
+    Every command gets a sequence number (its 0-based position in the
+    session's whole history). search() scans the first time; a ring searched
+    again (one that lives across requests) gets a trigram index, which is
+    then kept up to date on append. Commands are cut to
+    HISTORY_COMMAND_LENGTH, so a ring's size is bounded.
+    """
+
+    __slots__ = ('capacity', 'total', 'synced', '_origin', '_buf', '_index')
+
+    def __init__(self, capacity=HISTORY_SIZE, commands=(), total=None):
+        """commands are oldest first; total is the seq to continue numbering from"""
+        commands = [cmd[:HISTORY_COMMAND_LENGTH] for cmd in list(commands)[-capacity:]]
+        self.capacity = capacity
+        self.total = len(commands) if total is None else max(total, len(commands))
+        self._origin = self.total - len(commands)  # seq stored in _buf[0]
+        self._buf = commands
+        self._index = None  # None: never searched, False: scanned once, else dict
+        self.synced = self.total  # entries below this seq are persisted
+
+    def __len__(self):
+        return len(self._buf)
+
+    def __bool__(self):
+        return self.total > 0
+
+    def append(self, command):
+        command = command[:HISTORY_COMMAND_LENGTH]
+        seq = self.total
+        if len(self._buf) < self.capacity:
+            self._buf.append(command)
+        else:
+            if isinstance(self._index, dict):
+                self._unindex(seq - self.capacity)
+            self._buf[(seq - self._origin) % self.capacity] = command
+        self.total = seq + 1
+        if isinstance(self._index, dict):
+            for tri in _history_trigrams(command):
+                self._index.setdefault(tri, set()).add(seq)
+
+    def get(self, seq):
+        return self._buf[(seq - self._origin) % self.capacity]
+
+    @property
+    def first(self):
+        """Sequence number of the oldest entry still held"""
+        return self.total - len(self)
+
+    def newest(self, n=None):
+        """(seq, command) pairs, newest first"""
+        stop = self.first if n is None else max(self.first, self.total - n)
+        for seq in range(self.total - 1, stop - 1, -1):
+            yield seq, self.get(seq)
+
+    def _build_index(self):
+        self._index = {}
+        for seq, command in self.newest():
+            for tri in _history_trigrams(command):
+                self._index.setdefault(tri, set()).add(seq)
+
+    def _unindex(self, seq):
+        for tri in _history_trigrams(self.get(seq)):
+            seqs = self._index.get(tri)
+            if seqs is not None:
+                seqs.discard(seq)
+                if not seqs:
+                    del self._index[tri]
+
+    def search(self, query, skip=0, limit=1):
+        """Reverse search: newest entries containing query (case-insensitive)"""
+        needle = query.lower()
+        if len(needle) < 3 or self._index is None:
+            if self._index is None:
+                self._index = False
+            candidates = (seq for seq, _ in self.newest())
+        else:
+            if self._index is False:
+                self._build_index()
+            seqs = None
+            for tri in _history_trigrams(needle):
+                found = self._index.get(tri, set())
+                seqs = found if seqs is None else seqs & found
+                if not seqs:
+                    return []
+            candidates = sorted(seqs, reverse=True)
+        matches = []
+        for seq in candidates:
+            command = self.get(seq)
+            if needle in command.lower():
+                if skip:
+                    skip -= 1
+                    continue
+                matches.append((seq, command))
+                if len(matches) >= limit:
+                    break
+        return matches
 
-# Session storage
-sessions = {}
 
 class PortfolioShell:
-    """Virtual shell for portfolio interaction"""
+    """Virtual shell for portfolio interaction
+
+    Kept deliberately small since a worker may hold a great many idle
+    sessions: the working directory is an id into its tenant's VFSIndex, and
+    history and environment overrides are only allocated once a session
+    needs them.
+    """
     
-    def __init__(self, session_id):
+    __slots__ = ('session_id', 'tenant', 'cwd', 'history', '_env_overlay', 'last_seen')
+    
+    max_history = HISTORY_SIZE
+    
+    def __init__(self, session_id, tenant=None):
         self.session_id = session_id
-        self.current_dir = '/home/sudarshan/Portfolio'
-        self.current_fs = VIRTUAL_FS
-        self.path_stack = []
-        self.history = []
-        self.max_history = 50
-        self.env = {
-            'USER': 'sudarshan',
-            'HOME': '/home/sudarshan/Portfolio',
-            'SHELL': '/bin/myshell',
-            'PWD': '/home/sudarshan/Portfolio'
-        }
+        self.tenant = tenant or current_tenant()
+        self.cwd = 0
+        self.history = None
+        self._env_overlay = None
+        self.last_seen = 0.0
+    
+    @property
+    def vfs(self):
+        return self.tenant.vfs
+    
+    @property
+    def env(self):
+        # Tenant defaults; `export` writes to a per-session overlay
+        if self._env_overlay is None:
+            return self.tenant.env
+        return {**self.tenant.env, **self._env_overlay}
+    
+    @property
+    def current_dir(self):
+        return self.vfs.abs_path(self.cwd)
+    
+    @property
+    def current_fs(self):
+        return self.vfs.nodes[self.cwd]
+    
+    def to_state(self, history_limit=STATE_HISTORY):
+        """Compact, JSON-ready snapshot of the session-specific state"""
+        history = self.history
+        recent = [cmd for _, cmd in history.newest(history_limit)] if history else []
+        return [
+            '/'.join(self.vfs.parts[self.cwd]),
+            self._env_overlay or {},
+            recent[::-1],
+            history.total if history else 0,
+        ]
+    
+    @classmethod
+    def from_state(cls, session_id, state, tenant=None):
+        cwd, overlay, history = state[:3]
+        if len(state) > 3:
+            total = int(state[3])
+        else:
+            # Older states list history newest first and carry no total
+            total, history = None, history[::-1]
+        shell = cls(session_id, tenant)
+        index = shell.vfs
+        idx = index.resolve(str(cwd))
+        if idx is not None and index.is_dir(idx):
+            shell.cwd = idx
+        if overlay:
+            shell._env_overlay = {str(k): str(v) for k, v in dict(overlay).items()}
+        if history:
+            shell.history = HistoryRing(cls.max_history, [str(cmd) for cmd in history], total)
+        return shell
     
     def get_prompt(self):
         """Get the shell prompt"""
         return f"{self.current_dir}$ "
     
-    def navigate_to_path(self, path):
-        """Navigate to a path and return the filesystem node"""
-        if path == '/' or path == '~' or path == self.env['HOME']:
-            return VIRTUAL_FS, []
+    # Command name -> handler method; shared by every session
+    COMMANDS = {
+        'help': 'cmd_help',
+        'pwd': 'cmd_pwd',
+        'whoami': 'cmd_whoami',
+        'cd': 'cmd_cd',
+        'ls': 'cmd_ls',
+        'dir': 'cmd_ls',
+        'cat': 'cmd_cat',
+        'clear': 'cmd_clear',
+        'cls': 'cmd_clear',
+        'history': 'cmd_history',
+        'exit': 'cmd_exit',
+        'quit': 'cmd_exit',
+        'echo': 'cmd_echo',
+        'date': 'cmd_date',
+        'time': 'cmd_time',
+        'open': 'cmd_open',
+        'tree': 'cmd_tree',
+        'neofetch': 'cmd_neofetch',
+        'env': 'cmd_env',
+        'export': 'cmd_export',
+        'uname': 'cmd_uname',
+        'hostname': 'cmd_hostname',
+        'uptime': 'cmd_uptime',
+        'man': 'cmd_man',
+        'touch': 'cmd_touch',
+        'mkdir': 'cmd_mkdir',
+        'rm': 'cmd_rm',
+        'grep': 'cmd_grep',
+        'find': 'cmd_find',
+        'head': 'cmd_head',
+        'tail': 'cmd_tail',
+        'wc': 'cmd_wc',
+        'less': 'cmd_less',
+        'more': 'cmd_less',
+    }
+    
+    # Commands whose result depends only on (args, cwd), never on session
+    # state or the clock; their responses are cached by render_pure()
+    PURE_COMMANDS = frozenset({
+        'help', 'pwd', 'whoami', 'ls', 'dir', 'cat', 'open', 'tree',
+        'neofetch', 'uname', 'hostname', 'uptime', 'man', 'touch', 'mkdir',
+        'rm', 'grep', 'find', 'head', 'tail', 'wc', 'less', 'more',
+    })
+    
+    # Commands that can read from and write to a pipeline as lazy line
+    # streams; anything else in a pipeline has its output split into lines
+    STREAM_COMMANDS = {
+        'cat': 'pipe_cat',
+        'grep': 'pipe_grep',
+        'head': 'pipe_head',
+        'tail': 'pipe_tail',
+        'wc': 'pipe_wc',
+        'less': 'pipe_less',
+        'more': 'pipe_less',
+    }
+    
+    # What Tab should offer for a command's arguments (default: any path)
+    COMPLETION_KINDS = {
+        'cd': 'dir',
+        'tree': 'dir',
+        'man': 'command',
+        'cat': 'file',
+        'head': 'file',
+        'tail': 'file',
+        'wc': 'file',
+        'less': 'file',
+        'more': 'file',
+        'open': 'file',
+        'grep': 'file',
+    }
+    
+    def execute(self, command):
+        """Execute a shell command"""
+        if not command.strip():
+            return {'output': '', 'type': 'info', 'prompt': self.get_prompt()}
         
-        # Handle absolute vs relative path
-        if path.startswith('/home/sudarshan/Portfolio'):
-            parts = path.replace('/home/sudarshan/Portfolio', '').strip('/').split('/')
-        elif path.startswith('/'):
-            return None, []
+        result = self._run(self._parse(command))
+        result['prompt'] = self.get_prompt()
+        return result
+    
+    def execute_json(self, command, **extra):
+        """Execute a command and return the response body as JSON bytes
+
+        Pure commands are served from a cache of pre-serialized results;
+        only the prompt and any extra fields are spliced in per call.
+        """
+        body, _ = self._execute_body(command)
+        return splice_json(body, prompt=self.get_prompt(), **extra)
+    
+    def _execute_body(self, command):
+        """(serialized result without prompt, result type) for a command"""
+        words = self._parse(command) if command.strip() else None
+        if not words:
+            result = {'output': '', 'type': 'info'}
+        elif isinstance(words, dict):
+            result = words
         else:
-            parts = path.strip('/').split('/')
-        
-        parts = [p for p in parts if p]  # Remove empty strings
+            start = time.perf_counter()
+            name = words[0].lower()
+            pipeline = any(isinstance(w, Op) for w in words)
+            label = 'pipeline' if pipeline else (name if name in self.COMMANDS else 'unknown')
+            pure = 'true' if name in self.PURE_COMMANDS and not pipeline else 'false'
+            if pure == 'true':
+                cached = render_pure(self.tenant, self.tenant.generation, name, tuple(words[1:]), self.cwd)
+                if cached is not None:
+                    SHELL_LATENCY.observe(time.perf_counter() - start, command=label, pure=pure)
+                    return cached
+            result = self._run(words)
+            SHELL_LATENCY.observe(time.perf_counter() - start, command=label, pure=pure)
+        return dump_json(result), result.get('type')
+    
+    def _parse(self, command):
+        """Record a command in history and lex it into words
+
+        Returns an error result instead if the line cannot be lexed.
+        """
+        if self.history is None:
+            self.history = HistoryRing(self.max_history)
+        self.history.append(command)
         
-        current = VIRTUAL_FS
-        path_stack = []
+        try:
+            return lex(command.strip(), self.env)
+        except ShellError as e:
+            return {'output': str(e), 'type': 'error'}
+    
+    def _run(self, words):
+        """Run lexed words: a single command or a pipeline"""
+        if isinstance(words, dict):
+            return words
+        result = self._evaluate(words)
+        if 'next_page' in result:
+            # The unread rest of the output waits behind a cursor
+            rest, page_lines, sent = result['next_page']
+            result['next_page'] = output_cursors.open(self, words, rest, page_lines, sent)
+        return result
+    
+    def _evaluate(self, words):
+        """Result of lexed words; paged output's next_page is still (rest, page_lines, sent)"""
+        if not words:
+            return {'output': '', 'type': 'info'}
+        if any(isinstance(w, Op) for w in words):
+            return self._run_pipeline(words)
+        return self._bound(self._dispatch(words[0].lower(), words[1:]))
+    
+    def _run_pipeline(self, words):
+        """Chain each stage's output lines into the next as lazy generators"""
+        stages = [[]]
+        for word in words:
+            if isinstance(word, Op) and word == '|':
+                stages.append([])
+            else:
+                stages[-1].append(word)
         
-        for part in parts:
-            if part == '..':
-                if path_stack:
-                    path_stack.pop()
-                    # Navigate back
-                    current = VIRTUAL_FS
-                    for p in path_stack:
-                        current = current['contents'][p]
-            elif part == '.':
+        try:
+            stream = None
+            for n, stage in enumerate(stages, 1):
+                stage, stdin = self._redirect(stage, 'newline' if n == len(stages) else '|')
+                if not stage:
+                    raise ShellError("bash: syntax error near unexpected token `|'")
+                stream = self._stream(stage[0].lower(), stage[1:], stdin if stdin is not None else stream)
+        except ShellError as e:
+            return {'output': str(e), 'type': 'error'}
+        if stage[0].lower() in ('less', 'more'):
+            return self._collect(stream, PAGER_LINES, pager=True)
+        return self._collect(stream)
+    
+    def _redirect(self, stage, end='newline'):
+        """Strip redirections from a stage; returns (words, stdin or None)
+
+        end names the token after the stage, for a redirection missing its target.
+        """
+        words, stdin = [], None
+        it = iter(stage)
+        for word in it:
+            if not isinstance(word, Op):
+                words.append(word)
                 continue
-            elif current.get('type') == 'directory' and part in current.get('contents', {}):
-                if current['contents'][part].get('type') == 'directory':
-                    current = current['contents'][part]
-                    path_stack.append(part)
-                else:
-                    return None, []  # Trying to cd into a file
+            target = next(it, None)
+            if target is None or isinstance(target, Op):
+                raise ShellError(f"bash: syntax error near unexpected token `{target or end}'")
+            if word == '<':
+                stdin = self._open_lines('bash', target)
             else:
-                return None, []
-        
-        return current, path_stack
+                raise ShellError(f'bash: {target}: Read-only file system')
+        return words, stdin
     
-    def execute(self, command):
-        """Execute a shell command"""
-        if not command.strip():
-            return {'output': '', 'type': 'info', 'prompt': self.get_prompt()}
-        
-        # Add to history
-        self.history.insert(0, command)
-        if len(self.history) > self.max_history:
-            self.history.pop()
-        
-        # Parse command
-        parts = command.strip().split()
-        cmd = parts[0].lower()
-        args = parts[1:] if len(parts) > 1 else []
-        
-        # Command mapping
-        commands = {
-            'help': self.cmd_help,
-            'pwd': self.cmd_pwd,
-            'whoami': self.cmd_whoami,
-            'cd': self.cmd_cd,
-            'ls': self.cmd_ls,
-            'dir': self.cmd_ls,
-            'cat': self.cmd_cat,
-            'clear': self.cmd_clear,
-            'cls': self.cmd_clear,
-            'history': self.cmd_history,
-            'exit': self.cmd_exit,
-            'quit': self.cmd_exit,
-            'echo': self.cmd_echo,
-            'date': self.cmd_date,
-            'time': self.cmd_time,
-            'open': self.cmd_open,
-            'tree': self.cmd_tree,
-            'neofetch': self.cmd_neofetch,
-            'env': self.cmd_env,
-            'export': self.cmd_export,
-            'uname': self.cmd_uname,
-            'hostname': self.cmd_hostname,
-            'uptime': self.cmd_uptime,
-            'man': self.cmd_man,
-            'touch': self.cmd_touch,
-            'mkdir': self.cmd_mkdir,
-            'rm': self.cmd_rm,
-            'grep': self.cmd_grep,
-            'find': self.cmd_find,
-            'head': self.cmd_head,
-            'tail': self.cmd_tail,
-            'wc': self.cmd_wc,
+    def _stream(self, cmd, args, stdin):
+        """Lazy line generator for one pipeline stage"""
+        handler = self.STREAM_COMMANDS.get(cmd)
+        if handler:
+            return getattr(self, handler)(args, stdin)
+        return self._buffered(cmd, args)
+    
+    def _buffered(self, cmd, args):
+        """Adapt a regular command to a pipeline stage (ignores stdin)"""
+        result = self._dispatch(cmd, args)
+        if result.get('type') == 'error':
+            raise ShellError(result['output'])
+        yield from iter_lines(result.get('output', ''))
+    
+    def _open_lines(self, cmd, path):
+        """Line stream of a VFS file, resolved relative to the cwd"""
+        index = self.vfs
+        idx = index.resolve(path, self.cwd)
+        if idx is None:
+            raise ShellError(f"{cmd}: {path}: No such file")
+        if index.is_dir(idx):
+            raise ShellError(f"{cmd}: {path}: Is a directory")
+        return iter_lines(index.read(idx))
+    
+    def _input(self, cmd, files, stdin, usage):
+        """Lines from the named files, else from stdin"""
+        if files:
+            for path in files:
+                yield from self._open_lines(cmd, path)
+        elif stdin is not None:
+            yield from stdin
+        else:
+            raise ShellError(usage)
+    
+    def _collect(self, lines, page_lines=OUTPUT_PAGE_LINES, pager=False):
+        """Turn a line stream into a command result, one page at a time
+
+        Output beyond the first page is left unread; the result then says
+        `output_truncated`, and _run turns its `next_page` into a cursor.
+        """
+        try:
+            page, rest = take_page(lines, page_lines)
+        except ShellError as e:
+            return {'output': str(e), 'type': 'error'}
+        result = {'output': '\n'.join(page), 'type': 'success'}
+        if rest is not None:
+            result['output_truncated'] = True
+            result['next_page'] = (rest, page_lines, len(page))
+        if pager:
+            result['pager'] = True
+        return result
+    
+    def _bound(self, result):
+        """Page a prebuilt result whose output is too large to send at once"""
+        output = result.get('output')
+        if (isinstance(output, str) and 'next_page' not in result
+                and (len(output) > OUTPUT_PAGE_BYTES or output.count('\n') >= OUTPUT_PAGE_LINES)):
+            paged = self._collect(iter_lines(output))
+            paged['type'] = result.get('type', 'success')
+            return {**result, **paged}
+        return result
+    
+    def _dispatch(self, cmd, args):
+        handler = self.COMMANDS.get(cmd)
+        if handler:
+            return getattr(self, handler)(args)
+        return {
+            'output': f"bash: {cmd}: command not found\nType 'help' for available commands.",
+            'type': 'error'
         }
-        
-        if cmd in commands:
-            result = commands[cmd](args)
+    
+    def complete(self, line, cursor=None):
+        """Context-aware Tab completion for the word under the cursor"""
+        text = line if cursor is None else line[:cursor]
+        word = re.split(r'[\s|<>]', text)[-1]
+        start = len(text) - len(word)
+        before = text[:start].rsplit('|', 1)[-1].split()
+        
+        if not before:
+            kind = 'command'
         else:
-            result = {
-                'output': f"bash: {cmd}: command not found\nType 'help' for available commands.",
-                'type': 'error'
-            }
+            kind = self.COMPLETION_KINDS.get(before[0].lower(), 'path')
         
-        result['prompt'] = self.get_prompt()
-        return result
+        if kind == 'command':
+            dir_part, leaf = '', word
+            candidates = list(COMMAND_TRIE.complete(word))
+        else:
+            dir_part, _, leaf = word.rpartition('/')
+            if dir_part or word.startswith('/'):
+                dir_part += '/'
+            index = self.vfs
+            dir_idx = index.resolve(dir_part, self.cwd)
+            candidates = []
+            if dir_idx is not None:
+                for name, idx in index.children(dir_idx, leaf):
+                    if index.is_dir(idx):
+                        candidates.append(name + '/')
+                    elif kind != 'dir':
+                        candidates.append(name)
+        
+        if not candidates:
+            return {'completions': [], 'prefix': word, 'start': start, 'end': len(text)}
+        
+        prefix = _common_prefix(candidates)
+        if len(prefix) < len(leaf):
+            prefix = leaf
+        prefix = dir_part + prefix
+        if len(candidates) == 1 and not prefix.endswith('/'):
+            prefix += ' '
+        return {'completions': candidates, 'prefix': prefix, 'start': start, 'end': len(text)}
     
     def cmd_help(self, args):
         """Help command"""
@@ -763,9 +2590,10 @@ class PortfolioShell:
    head <file>      Show first 10 lines
    tail <file>      Show last 10 lines
    wc <file>        Word/line count
-   grep <str> <f>   Search in file
+   grep <str> <f>   Search in file (grep -r <str> [dir] for a tree)
    find <name>      Find files by name
    open <file>      Open file in GUI window
+   less <file>      Page through a file (also: more)
 
  SYSTEM INFO:
    whoami           Display current user
@@ -782,6 +2610,7 @@ class PortfolioShell:
    clear / cls      Clear the screen
    history          Show command history
    man <cmd>        Show manual for command
+   cmd1 | cmd2      Pipe output (cat Bio.txt | grep Linux | head -3)
    help             Display this help message
    exit / quit      Exit the shell
 
@@ -797,13 +2626,14 @@ class PortfolioShell:
     
     def cmd_whoami(self, args):
         """Display user info"""
+        profile = self.tenant.profile
         output = f'''╔═══════════════════════════════════════╗
 ║            USER INFORMATION           ║
 ╚═══════════════════════════════════════╝
-  User:     sudarshan
-  Role:     Portfolio Owner
-  Status:   CS Student | Software Developer
-  Location: Springfield, MO
+  User:     {profile['user']}
+  Role:     {profile['role']}
+  Status:   {profile['status']}
+  Location: {profile['location']}
   Shell:    /bin/myshell
 '''
         return {'output': output, 'type': 'success'}
@@ -811,35 +2641,16 @@ class PortfolioShell:
     def cmd_cd(self, args):
         """Change directory"""
         if not args or args[0] in ['~', '/']:
-            self.current_dir = '/home/sudarshan/Portfolio'
-            self.current_fs = VIRTUAL_FS
-            self.path_stack = []
+            self.cwd = 0
             return {'output': '', 'type': 'success'}
         
         target = args[0]
-        
-        if target == '..':
-            if self.path_stack:
-                self.path_stack.pop()
-                self.current_fs = VIRTUAL_FS
-                for p in self.path_stack:
-                    self.current_fs = self.current_fs['contents'][p]
-                self.current_dir = '/home/sudarshan/Portfolio'
-                if self.path_stack:
-                    self.current_dir += '/' + '/'.join(self.path_stack)
+        index = self.vfs
+        idx = index.resolve(target, self.cwd)
+        if idx is not None and index.is_dir(idx):
+            self.cwd = idx
             return {'output': '', 'type': 'success'}
         
-        # Try to navigate to target
-        if self.current_fs.get('type') == 'directory':
-            contents = self.current_fs.get('contents', {})
-            # Case-insensitive search
-            for name, item in contents.items():
-                if name.lower() == target.lower() and item.get('type') == 'directory':
-                    self.path_stack.append(name)
-                    self.current_fs = item
-                    self.current_dir = '/home/sudarshan/Portfolio/' + '/'.join(self.path_stack)
-                    return {'output': '', 'type': 'success'}
-        
         return {'output': f"cd: {target}: No such directory", 'type': 'error'}
     
     def cmd_ls(self, args):
@@ -849,14 +2660,14 @@ class PortfolioShell:
         # If argument provided, try to list that directory
         if args:
             target = args[0]
-            if target_fs.get('type') == 'directory':
-                for name, item in target_fs.get('contents', {}).items():
-                    if name.lower() == target.lower():
-                        if item.get('type') == 'directory':
-                            target_fs = item
-                            break
-                        else:
-                            return {'output': f"  {item.get('icon', '📄')} {name}", 'type': 'info'}
+            index = self.vfs
+            idx = index.resolve(target, self.cwd)
+            if idx is None:
+                return {'output': f"ls: cannot access '{target}': No such file or directory", 'type': 'error'}
+            item = index.nodes[idx]
+            if item.get('type') != 'directory':
+                return {'output': f"  {item.get('icon', '📄')} {index.name(idx)}", 'type': 'info'}
+            target_fs = item
         
         if target_fs.get('type') != 'directory':
             return {'output': 'Not a directory', 'type': 'error'}
@@ -883,20 +2694,10 @@ class PortfolioShell:
     
     def cmd_cat(self, args):
         """Display file contents"""
-        if not args:
-            return {'output': 'Usage: cat <filename>', 'type': 'error'}
-        
-        filename = args[0]
-        
-        if self.current_fs.get('type') == 'directory':
-            contents = self.current_fs.get('contents', {})
-            for name, item in contents.items():
-                if name.lower() == filename.lower():
-                    if item['type'] == 'directory':
-                        return {'output': f"cat: {filename}: Is a directory", 'type': 'error'}
-                    return {'output': item.get('content', ''), 'type': 'success'}
-        
-        return {'output': f"cat: {filename}: No such file", 'type': 'error'}
+        return self._collect(self.pipe_cat(args, None))
+    
+    def pipe_cat(self, args, stdin):
+        yield from self._input('cat', args, stdin, 'Usage: cat <filename>')
     
     def cmd_clear(self, args):
         """Clear screen"""
@@ -907,9 +2708,10 @@ class PortfolioShell:
         if not self.history:
             return {'output': 'No command history', 'type': 'info'}
         
+        n = int(args[0]) if args and args[0].isdigit() else 20
         lines = ['Command History:', '─' * 40]
-        for i, cmd in enumerate(reversed(self.history[-20:]), 1):
-            lines.append(f'  {i:3d}  {cmd}')
+        for seq, cmd in reversed(list(self.history.newest(n))):
+            lines.append(f'  {seq + 1:3d}  {cmd}')
         
         return {'output': '\n'.join(lines), 'type': 'info'}
     
@@ -919,11 +2721,8 @@ class PortfolioShell:
     
     def cmd_echo(self, args):
         """Echo text"""
-        text = ' '.join(args)
-        # Handle environment variables
-        for key, value in self.env.items():
-            text = text.replace(f'${key}', value)
-        return {'output': text, 'type': 'success'}
+        # $VAR expansion already happened in lex()
+        return {'output': ' '.join(args), 'type': 'success'}
     
     def cmd_date(self, args):
         """Show date"""
@@ -939,19 +2738,19 @@ class PortfolioShell:
             return {'output': 'Usage: open <filename>', 'type': 'error'}
         
         filename = args[0]
-        
-        if self.current_fs.get('type') == 'directory':
-            contents = self.current_fs.get('contents', {})
-            for name, item in contents.items():
-                if name.lower() == filename.lower():
-                    window = item.get('window')
-                    if window:
-                        return {
-                            'output': f'Opening {name}...',
-                            'type': 'open_window',
-                            'window': window
-                        }
-                    return {'output': f'Cannot open {name} in GUI', 'type': 'error'}
+        index = self.vfs
+        idx = index.resolve(filename, self.cwd)
+        
+        if idx is not None:
+            name = index.name(idx)
+            window = index.nodes[idx].get('window')
+            if window:
+                return {
+                    'output': f'Opening {name}...',
+                    'type': 'open_window',
+                    'window': window
+                }
+            return {'output': f'Cannot open {name} in GUI', 'type': 'error'}
         
         return {'output': f"open: {filename}: No such file", 'type': 'error'}
     
@@ -976,32 +2775,32 @@ class PortfolioShell:
             return lines
         
         tree_lines = ['📁 Portfolio', '│']
-        tree_lines.extend(build_tree(VIRTUAL_FS))
+        tree_lines.extend(build_tree(self.vfs.nodes[0]))
         
         return {'output': '\n'.join(tree_lines), 'type': 'info'}
     
     def cmd_neofetch(self, args):
         """System info fancy display"""
         output = '''
-                   _,met$$$$$gg.          sudarshan@portfolio
+                   _,met$$$$$gg.          {user}@portfolio
                 ,g$$$$$$$$$$$$$$$P.       ──────────────────────
               ,g$$P"     """Y$$.".        OS: Windows 95 Portfolio Edition
-             ,$$P'              `$$$.     Host: Sudarshan Tiwari
-            ',$$P       ,ggs.     `$$b:   Kernel: Tiwari Custom Kernel
-            `d$$'     ,$P"'   .    $$$    Uptime: Since NOV 2025
+             ,$$P'              `$$$.     Host: {name}
+            ',$$P       ,ggs.     `$$b:   Kernel: {kernel}
+            `d$$'     ,$P"'   .    $$$    Uptime: Since {since}
              $$P      d$'     ,    $$P    Shell: MyShell 1.0
              $$:      $$.   -    ,d$$'    Terminal: Win95 Terminal
-             $$;      Y$b._   _,d$P'      CPU: Ryzen 7 4800h
+             $$;      Y$b._   _,d$P'      CPU: {cpu}
              Y$$.    `.`"Y$$$$P"'         Memory: 1337MB / ∞MB
-             `$$b      "-.__              Disk: AWS
+             `$$b      "-.__              Disk: {disk}
               `Y$$                        
-               `Y$$.                      LANGUAGES: JS, Python, C/C++, PHP
-                 `$$b.                    FRAMEWORKS: React, Flask, Angular
-                   `Y$$b.                 TOOLS: Git, Docker, Linux
+               `Y$$.                      LANGUAGES: {languages}
+                 `$$b.                    FRAMEWORKS: {frameworks}
+                   `Y$$b.                 TOOLS: {tools}
                      `"Y$b._              
                         `"""              ████████████████████████████
 
-'''
+'''.format_map(self.tenant.profile)
         return {'output': output, 'type': 'success'}
     
     def cmd_env(self, args):
@@ -1017,18 +2816,20 @@ class PortfolioShell:
             return {'output': 'Usage: export VAR=value', 'type': 'error'}
         
         key, value = args[0].split('=', 1)
-        self.env[key] = value
+        if self._env_overlay is None:
+            self._env_overlay = {}
+        self._env_overlay[key] = value
         return {'output': '', 'type': 'success'}
     
     def cmd_uname(self, args):
         """System information"""
         if args and '-a' in args:
-            return {'output': 'Windows95 Portfolio 1.0 sudarshan-pc x86_64 MyShell', 'type': 'success'}
+            return {'output': f"Windows95 Portfolio 1.0 {self.tenant.profile['user']}-pc x86_64 MyShell", 'type': 'success'}
         return {'output': 'Windows95 Portfolio', 'type': 'success'}
     
     def cmd_hostname(self, args):
         """Show hostname"""
-        return {'output': 'sudarshan-portfolio', 'type': 'success'}
+        return {'output': f"{self.tenant.profile['user']}-portfolio", 'type': 'success'}
     
     def cmd_uptime(self, args):
         """Show uptime"""
@@ -1047,6 +2848,7 @@ class PortfolioShell:
             'help': 'help - display available commands\nUsage: help',
             'open': 'open - open file in GUI window\nUsage: open <filename>',
             'tree': 'tree - display directory tree\nUsage: tree',
+            'less': 'less - page through a file or piped output\nUsage: less <filename>, cmd | less\nSpace/Enter: next page, q: quit',
         }
         
         cmd = args[0].lower()
@@ -1077,20 +2879,54 @@ class PortfolioShell:
         if len(args) < 2:
             return {'output': 'Usage: grep <pattern> <filename>', 'type': 'error'}
         
-        pattern = args[0].lower()
-        filename = args[1]
-        
-        if self.current_fs.get('type') == 'directory':
-            contents = self.current_fs.get('contents', {})
-            for name, item in contents.items():
-                if name.lower() == filename.lower() and item['type'] == 'file':
-                    content = item.get('content', '')
-                    matches = [line for line in content.split('\n') if pattern in line.lower()]
-                    if matches:
-                        return {'output': '\n'.join(matches), 'type': 'success'}
-                    return {'output': f'No matches found for "{pattern}"', 'type': 'info'}
-        
-        return {'output': f"grep: {filename}: No such file", 'type': 'error'}
+        result = self._collect(self.pipe_grep(args, None))
+        if result['type'] == 'success' and not result['output']:
+            pattern = [a for a in args if not a.startswith('-')][0]
+            return {'output': f'No matches found for "{pattern.lower()}"', 'type': 'info'}
+        return result
+    
+    def pipe_grep(self, args, stdin):
+        """Case-insensitive substring match; -v inverts, -r searches directories"""
+        invert = '-v' in args
+        words = [a for a in args if a not in ('-i', '-v', '-r', '-R')]
+        if not words:
+            raise ShellError('Usage: grep <pattern> <filename>')
+        pattern = words[0].lower()
+        if '-r' in args or '-R' in args:
+            yield from self._grep_tree(pattern, words[1:] or ['.'], invert)
+            return
+        for line in self._input('grep', words[1:], stdin, 'Usage: grep <pattern> <filename>'):
+            if (pattern in line.lower()) != invert:
+                yield line
+    
+    def _grep_tree(self, pattern, paths, invert):
+        """grep -r: matching lines of every file under paths, as name:line"""
+        index = self.vfs
+        # The snapshot's trigram index rules out files that can't match
+        candidates = index.search.candidates(pattern) if index.search and not invert else None
+        
+        def walk(node, prefix):
+            for name, item in node.get('contents', {}).items():
+                if item.get('type') == 'directory':
+                    yield from walk(item, f'{prefix}{name}/')
+                else:
+                    yield f'{prefix}{name}', item
+        
+        for path in paths:
+            idx = index.resolve(path, self.cwd)
+            if idx is None:
+                raise ShellError(f'grep: {path}: No such file or directory')
+            if index.is_dir(idx):
+                prefix = '' if path.strip('/') in ('', '.') else path.rstrip('/') + '/'
+                files = walk(index.nodes[idx], prefix)
+            else:
+                files = [(path, index.nodes[idx])]
+            for name, node in files:
+                if candidates is not None and id(node) not in candidates:
+                    continue
+                for line in iter_lines(index.read_node(node, index.intern)):
+                    if (pattern in line.lower()) != invert:
+                        yield f'{name}:{line}'
     
     def cmd_find(self, args):
         """Find files"""
@@ -1109,113 +2945,636 @@ class PortfolioShell:
                     if item.get('type') == 'directory':
                         search(item, full_path)
         
-        search(VIRTUAL_FS, '.')
+        search(self.vfs.nodes[0], '.')
         
         if results:
             return {'output': '\n'.join(results), 'type': 'success'}
         return {'output': f'No files matching "{pattern}" found', 'type': 'info'}
     
+    def cmd_less(self, args):
+        """Page through a file"""
+        return self._collect(self.pipe_less(args, None), PAGER_LINES, pager=True)
+    
+    def pipe_less(self, args, stdin):
+        yield from self._input('less', args, stdin, 'Missing filename ("less --help" for help)')
+    
     def cmd_head(self, args):
         """Show first lines of file"""
         if not args:
             return {'output': 'Usage: head <filename>', 'type': 'error'}
-        
-        filename = args[0]
-        n = 10
-        
-        if self.current_fs.get('type') == 'directory':
-            contents = self.current_fs.get('contents', {})
-            for name, item in contents.items():
-                if name.lower() == filename.lower() and item['type'] == 'file':
-                    lines = item.get('content', '').split('\n')[:n]
-                    return {'output': '\n'.join(lines), 'type': 'success'}
-        
-        return {'output': f"head: {filename}: No such file", 'type': 'error'}
+        return self._collect(self.pipe_head(args, None))
+    
+    def pipe_head(self, args, stdin):
+        # islice stops pulling once it has n lines, so upstream stages
+        # never produce more than head needs
+        n, files = _count_option(args)
+        yield from islice(self._input('head', files, stdin, 'Usage: head <filename>'), n)
     
     def cmd_tail(self, args):
         """Show last lines of file"""
         if not args:
             return {'output': 'Usage: tail <filename>', 'type': 'error'}
-        
-        filename = args[0]
-        n = 10
-        
-        if self.current_fs.get('type') == 'directory':
-            contents = self.current_fs.get('contents', {})
-            for name, item in contents.items():
-                if name.lower() == filename.lower() and item['type'] == 'file':
-                    lines = item.get('content', '').split('\n')[-n:]
-                    return {'output': '\n'.join(lines), 'type': 'success'}
-        
-        return {'output': f"tail: {filename}: No such file", 'type': 'error'}
+        return self._collect(self.pipe_tail(args, None))
+    
+    def pipe_tail(self, args, stdin):
+        n, files = _count_option(args)
+        yield from deque(self._input('tail', files, stdin, 'Usage: tail <filename>'), maxlen=n)
     
     def cmd_wc(self, args):
         """Word count"""
         if not args:
             return {'output': 'Usage: wc <filename>', 'type': 'error'}
-        
-        filename = args[0]
-        
-        if self.current_fs.get('type') == 'directory':
-            contents = self.current_fs.get('contents', {})
-            for name, item in contents.items():
-                if name.lower() == filename.lower() and item['type'] == 'file':
-                    content = item.get('content', '')
-                    lines = len(content.split('\n'))
-                    words = len(content.split())
-                    chars = len(content)
-                    return {'output': f'  {lines} lines, {words} words, {chars} characters', 'type': 'success'}
-        
-        return {'output': f"wc: {filename}: No such file", 'type': 'error'}
+        return self._collect(self.pipe_wc(args, None))
+    
+    def pipe_wc(self, args, stdin):
+        lines = words = chars = 0
+        for line in self._input('wc', args, stdin, 'Usage: wc <filename>'):
+            lines += 1
+            words += len(line.split())
+            chars += len(line) + 1
+        yield f'  {lines} lines, {words} words, {max(chars - 1, 0)} characters'
+
+
+COMMAND_TRIE = PrefixTrie((name, name) for name in PortfolioShell.COMMANDS)
+
+PURE_CACHE_SIZE = int(os.environ.get('PURE_CACHE_SIZE', 4096))
+
+def dump_json(obj):
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode()
+
+def splice_json(body, **extra):
+    """Add keys to an already-serialized JSON object without re-encoding it"""
+    if not extra:
+        return body
+    tail = dump_json(extra)
+    if body == b'{}':
+        return tail
+    return body[:-1] + b',' + tail[1:]
+
+@lru_cache(maxsize=PURE_CACHE_SIZE)
+def render_pure(tenant, generation, cmd, args, cwd):
+    """(serialized result, result type) of a pure command run in a tenant's `cwd`
+
+    generation only keys the cache: results from before the tenant's
+    content last changed are never looked up again.
+    """
+    shell = PortfolioShell('', tenant)
+    shell.cwd = cwd
+    result = shell._bound(shell._dispatch(cmd, list(args)))
+    if 'next_page' in result:
+        # Paged output continues from a live stream, so it can't be
+        # shared; let callers run these uncached
+        return None
+    return dump_json(result), result.get('type')
+
+PURE_CACHE = metrics.counter('portfolio_pure_cache_total', 'Pure-command cache lookups', ('result',))
+VFS_RELOADS = metrics.counter('portfolio_vfs_reloads_total', 'Content reloads picked up by this worker')
+TENANTS_CACHED = metrics.gauge('portfolio_tenants_cached', 'Tenants whose VFS index is loaded (besides the default)')
+TENANT_CACHE_USED = metrics.gauge('portfolio_tenant_cache_bytes', 'Estimated memory held by cached tenant indexes')
+TENANT_CACHE_EVENTS = metrics.counter('portfolio_tenant_cache_total', 'Tenant indexes loaded or evicted', ('event',))
+PROCESS_RSS = metrics.gauge('portfolio_process_resident_memory_bytes', 'Resident memory of the workers')
+
+@metrics.collector
+def collect_process_stats():
+    info = render_pure.cache_info()
+    PURE_CACHE.set(info.hits, result='hit')
+    PURE_CACHE.set(info.misses, result='miss')
+    VFS_RELOADS.set(sum(tenant.watcher.reloads for tenant in tenants.all()))
+    TENANTS_CACHED.set(len(tenants))
+    TENANT_CACHE_USED.set(tenants.bytes)
+    TENANT_CACHE_EVENTS.set(tenants.loads, event='load')
+    TENANT_CACHE_EVENTS.set(tenants.evictions, event='evict')
+    try:
+        with open('/proc/self/statm') as f:
+            PROCESS_RSS.set(int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE'))
+    except OSError:
+        pass
+
+
+# ============================================================================
+# PROFILING - Admin-triggered stack sampling of live requests (see profiler.py)
+# ============================================================================
+
+PROFILE_DIR = os.environ.get('PROFILE_DIR', tempfile.gettempdir())
+PROFILE_MAX_SECONDS = 300
+
+profiler = SamplingProfiler(output_dir=PROFILE_DIR)
+
+@app.route('/admin/profile', methods=['GET', 'POST'])
+def admin_profile():
+    """Start a profiling run (POST) or fetch the latest one (GET)
+
+    POST ?seconds=30&route=/api/execute&interval_ms=5 samples the requests
+    this worker serves for that long, optionally only those whose route
+    contains `route`. GET returns the top-N summary as JSON, or
+    ?format=folded for flamegraph input.
+    """
+    if not check_admin_key(request.args.get('key') or request.headers.get('X-Admin-Key', '')):
+        return "Unauthorized. Add ?key=YOUR_ADMIN_KEY to access.", 403
+    
+    if request.method == 'POST':
+        if 'gevent.monkey' in sys.modules and sys.modules['gevent.monkey'].is_module_patched('threading'):
+            # Requests run on greenlets, which sys._current_frames() cannot see
+            return jsonify({'success': False, 'error': 'Profiling needs thread workers, not gevent'}), 409
+        seconds = min(max(request.args.get('seconds', 30, type=float), 0.1), PROFILE_MAX_SECONDS)
+        route = request.args.get('route', '')
+        profiler.interval = min(max(request.args.get('interval_ms', 5, type=float), 1), 1000) / 1000
+        me = threading.get_ident()
+        
+        def targets():
+            return {ident: label for ident, label in list(ACTIVE_REQUESTS.items())
+                    if ident != me and route in label}
+        
+        description = f"{route or 'all routes'} for {seconds:g}s in worker {os.getpid()}"
+        if not profiler.start(seconds, targets, description):
+            return jsonify({'success': False, 'error': 'A profile is already running',
+                            **profiler.summary(0)}), 409
+        return jsonify({'success': True, 'description': description, 'pid': os.getpid()})
+    
+    if request.args.get('format') == 'folded':
+        return app.response_class(profiler.folded(), mimetype='text/plain')
+    return jsonify(profiler.summary(request.args.get('top', 20, type=int)))
+
+
+# ============================================================================
+# TRACE CAPTURE - Opt-in, anonymized request traces for replay (see tracing.py)
+# ============================================================================
+
+# TRACE_FILE turns capture on. TRACE_SAMPLE is the fraction of sessions (and
+# of sessionless requests) recorded; the file stops growing at TRACE_MAX_BYTES.
+# Replay a trace with tools/replay.py.
+TRACE_FILE = os.environ.get('TRACE_FILE', '')
+TRACE_SAMPLE = float(os.environ.get('TRACE_SAMPLE', 1.0))
+TRACE_MAX_BYTES = int(os.environ.get('TRACE_MAX_BYTES', 64 * 1024 * 1024))
+TRACE_SKIP = ('/admin', '/metrics')   # operator routes, not visitor traffic
+
+# Words of a command line kept verbatim besides command names and paths:
+# options and counts of at most three digits (head -20), but no longer digit
+# runs, which may be phone numbers, PINs or account numbers
+TRACE_KEEP = re.compile(r'(-{1,2}[A-Za-z][A-Za-z-]*\d{0,3}|-?\d{1,3}|\$\{?[A-Za-z_]\w*\}?|\.{1,2}|~|/)$')
+_TRACE_WORD = re.compile(r'"(?:\\.|[^"\\])*"?|\'[^\']*\'?|[^\s|<>"\']+')
+
+# A salt derived from SESSION_SECRET gives every worker the same anonymous ids
+tracer = TraceWriter(
+    TRACE_FILE, TRACE_MAX_BYTES, TRACE_SAMPLE,
+    salt=hmac.new(SESSION_SECRET, b'trace', hashlib.sha256).digest() if SESSION_SECRET else None,
+) if TRACE_FILE else None
+
+def anonymize_line(shell, line):
+    """A command line with anything that could be personal blanked out
+
+    Command names, options, short numbers, $VARs and paths that exist in the
+    shell's file system (or begin one, for Tab completion) are kept; other
+    words, and everything in quotes, become runs of x of the same length, so
+    the replayed line lexes, completes and costs about the same.
+    """
+    def replace(match):
+        word = match.group(0)
+        if word[0] in '"\'':
+            # Quoted text is free-form, whatever words it happens to contain
+            closed = len(word) > 1 and word[-1] == word[0]
+            body = re.sub(r'\S', 'x', word[1:-1] if closed else word[1:])
+            return word[0] + body + (word[0] if closed else '')
+        if _public_word(shell, word):
+            return word
+        name, eq, value = word.partition('=')
+        if eq and name.isidentifier():
+            return f"{name}={'x' * len(value)}"  # export NAME=value
+        return 'x' * len(word)
+    return _TRACE_WORD.sub(replace, line)
+
+def _public_word(shell, word):
+    if word.lower() in PortfolioShell.COMMANDS or TRACE_KEEP.match(word):
+        return True
+    index = shell.vfs
+    if index.resolve(word.rstrip('/'), shell.cwd) is not None:
+        return True
+    dir_part, _, leaf = word.rpartition('/')
+    dir_idx = index.resolve(dir_part, shell.cwd) if dir_part else shell.cwd
+    return dir_idx is not None and index.is_dir(dir_idx) and bool(index.children(dir_idx, leaf))
+
+def trace_fields(shell, data):
+    """The replayable parts of a terminal request, or None if its session isn't sampled"""
+    session = tracer.session(shell.session_id)
+    if not tracer.sampled(session):
+        return None
+    fields = {'s': session}
+    if shell.tenant.name:
+        fields['tn'] = shell.tenant.name
+    if isinstance(data.get('command'), str):
+        fields['c'] = anonymize_line(shell, data['command'])
+    if isinstance(data.get('commands'), list):
+        fields['cs'] = [anonymize_line(shell, c) for c in data['commands'] if isinstance(c, str)]
+    if isinstance(data.get('line'), str):
+        fields['l'] = anonymize_line(shell, data['line'])
+        if isinstance(data.get('cursor'), int):
+            fields['k'] = data['cursor']
+    elif isinstance(data.get('partial'), str):
+        fields['p'] = anonymize_line(shell, data['partial'])
+    if isinstance(data.get('query'), str):
+        fields['q'] = 'x' * len(data['query'])
+    return fields
+
+def trace_request(shell, data):
+    """Called by load_shell: remember what record_trace() should write"""
+    g.trace = trace_fields(shell, data) or False
+
+@app.after_request
+def record_trace(response):
+    if tracer is None:
+        return response
+    fields = g.pop('trace', None)
+    if fields is False:
+        return response
+    route = _route_label()
+    if fields is None:
+        # Not a terminal request: sample it on its own
+        if route.startswith(TRACE_SKIP) or not tracer.sampled():
+            return response
+        fields = {}
+    elapsed = time.perf_counter() - g.get('request_start', time.perf_counter())
+    tracer.write({
+        't': round(time.time() - elapsed, 3),
+        'r': f'{request.method} {route}',
+        **fields,
+        'in': request.content_length or 0,
+        'out': response.calculate_content_length() or 0,
+        'st': response.status_code,
+        'ms': round(elapsed * 1000, 2),
+    })
+    return response
+
+# WebSocket ops, recorded as the HTTP requests that would have done the same
+TRACE_SOCKET_ROUTES = {
+    'execute': 'POST /api/execute',
+    'autocomplete': 'POST /api/autocomplete',
+    'history_search': 'POST /api/history/search',
+    'page': 'POST /api/page',
+}
+
+def trace_socket_message(shell, message, reply, start):
+    elapsed = time.perf_counter() - start
+    try:
+        data = json.loads(message)
+        route = TRACE_SOCKET_ROUTES.get(data.get('op'))
+    except (ValueError, AttributeError):
+        return
+    if route is None:
+        return
+    fields = trace_fields(shell, data)
+    if fields is not None:
+        tracer.write({
+            't': round(time.time() - elapsed, 3),
+            'r': route,
+            **fields,
+            'ws': 1,
+            'in': len(message),
+            'out': len(reply),
+            'st': 429 if b'"retry_after"' in reply else 200,
+            'ms': round(elapsed * 1000, 2),
+        })
+
+
+# ============================================================================
+# STATIC ASSETS - Fingerprinted, pre-compressed copies of static/ (see assets.py)
+# ============================================================================
+
+ASSET_PIPELINE = os.environ.get('ASSET_PIPELINE', '1').lower() not in ('0', 'false', 'no')
+ASSET_MAX_AGE = 365 * 24 * 3600
+
+ASSETS = None
+if ASSET_PIPELINE:
+    try:
+        ASSETS = load_assets()
+    except (OSError, ValueError) as e:
+        print(f"WARNING: can't build static assets ({e}); serving /static/ as is")
+
+@app.route('/assets/<path:name>')
+def fingerprinted_asset(name):
+    """A built asset, in the best encoding the client accepts; cached forever"""
+    found = ASSETS.lookup(name, request.headers.get('Accept-Encoding', '')) if ASSETS else None
+    if found is None:
+        return 'Not found', 404
+    path, mimetype, encoding = found
+    response = send_file(path, mimetype=mimetype, conditional=True, max_age=ASSET_MAX_AGE)
+    response.headers['Cache-Control'] = f'public, max-age={ASSET_MAX_AGE}, immutable'
+    response.headers['Vary'] = 'Accept-Encoding'
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+
+# ============================================================================
+# RESPONSE COMPRESSION - gzip/brotli for dynamic text responses
+# ============================================================================
+
+COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))  # bytes; smaller fits a packet anyway
+COMPRESS_TYPES = frozenset({
+    'application/json', 'text/plain', 'text/html', 'text/css',
+    'text/javascript', 'application/javascript', 'image/svg+xml',
+})
+
+# (gzip level, brotli quality) by payload size: small bodies are cheap to
+# squeeze hard, large ones get a faster setting
+COMPRESS_LEVELS = ((16 * 1024, (6, 5)), (256 * 1024, (4, 4)), (None, (1, 1)))
+
+COMPRESSION_BYTES = metrics.counter('portfolio_response_compression_bytes_total',
+                                    'Dynamic response bytes before and after compression', ('stage',))
+
+class LoadGauge:
+    """1-minute load average per CPU, re-read at most once a second"""
+
+    def __init__(self):
+        self.cpus = os.cpu_count() or 1
+        self.value = 0.0
+        self._next_read = 0.0
+
+    def per_cpu(self):
+        now = time.monotonic()
+        if now >= self._next_read:
+            self._next_read = now + 1.0
+            try:
+                self.value = os.getloadavg()[0] / self.cpus
+            except OSError:
+                self.value = 0.0
+        return self.value
+
+
+cpu_load = LoadGauge()
+
+def compression_level(encoding, size):
+    """Level for a body of `size` bytes; fastest once the CPUs are saturated"""
+    for limit, levels in COMPRESS_LEVELS:
+        if limit is None or size <= limit:
+            break
+    if cpu_load.per_cpu() >= 1.0:
+        levels = COMPRESS_LEVELS[-1][1]
+    return levels[0] if encoding == 'gzip' else levels[1]
+
+@app.after_request
+def compress_response(response):
+    """Compress sizeable text responses the client can decode
+
+    Files (send_file marks them direct_passthrough), streams, and anything
+    already carrying a Content-Encoding are left alone.
+    """
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESS_TYPES
+            or (response.content_length or 0) < COMPRESS_MIN_SIZE):
+        return response
+    encoding = negotiate(AVAILABLE_ENCODINGS, request.headers.get('Accept-Encoding', ''))
+    response.vary.add('Accept-Encoding')
+    if encoding is None:
+        return response
+    body = response.get_data()
+    packed = compress(encoding, body, compression_level(encoding, len(body)))
+    if packed is None or len(packed) >= len(body):
+        return response
+    response.set_data(packed)
+    response.headers['Content-Encoding'] = encoding
+    if response.get_etag()[0]:
+        etag, weak = response.get_etag()
+        response.set_etag(f'{etag}-{encoding}', weak)
+    COMPRESSION_BYTES.inc(len(body), stage='in')
+    COMPRESSION_BYTES.inc(len(packed), stage='out')
+    return response
 
 
 # ============================================================================
 # API ROUTES
 # ============================================================================
 
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus scrape target, merged across workers"""
+    auth = request.headers.get('Authorization', '')
+    token = auth[7:] if auth.startswith('Bearer ') else request.args.get('key', '')
+    allowed = (hmac.compare_digest(token.encode(), METRICS_TOKEN.encode())
+               if METRICS_TOKEN else check_admin_key(token))
+    if not allowed:
+        return 'Unauthorized', 403
+    return app.response_class(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+class RenderedPage:
+    """A template with no per-request data, rendered once and kept as bytes
+
+    Holds the page pre-compressed in every encoding assets.py builds, plus
+    an ETag per encoding. The template's file is checked at most once per
+    CONTENT_CHECK_INTERVAL and the page is re-rendered only when it (or the
+    asset build it links to) changed.
+    """
+
+    def __init__(self, template, interval=CONTENT_CHECK_INTERVAL):
+        self.template = template
+        self.path = os.path.join(app.root_path, app.template_folder, template)
+        self.interval = interval
+        self.key = None
+        self.bodies = {}  # encoding (None = identity) -> bytes
+        self.etags = {}
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+
+    def variant(self, accept_encoding):
+        """(body, etag, encoding) best suited to an Accept-Encoding header"""
+        now = time.monotonic()
+        if now >= self._next_check:
+            self._next_check = now + self.interval
+            key = (file_signature(self.path), ASSETS.signature if ASSETS else None)
+            if key != self.key:
+                with self._lock:
+                    if key != self.key:
+                        self._render(key)
+        bodies, etags = self.bodies, self.etags
+        encoding = negotiate(bodies, accept_encoding)
+        return bodies[encoding], etags[encoding], encoding
+
+    def _render(self, key):
+        app.jinja_env.cache.clear()  # pick up an edited template
+        html = render_template(self.template)
+        body = (ASSETS.rewrite(html) if ASSETS else html).encode('utf-8')
+        digest = hashlib.sha256(body).hexdigest()[:16]
+        bodies, etags = {None: body}, {None: digest}
+        for encoding, _ in ENCODINGS:
+            packed = compress(encoding, body)
+            if packed is not None:
+                bodies[encoding] = packed
+                etags[encoding] = f'{digest}-{encoding}'
+        # Publish both maps together; readers may be mid-request
+        self.bodies, self.etags, self.key = bodies, etags, key
+
+
+index_page = RenderedPage('index.html')
+
+def warm_up():
+    """Do the first visitor's work ahead of time (gunicorn preload_app calls
+    this in the master, so every forked worker starts with it done)"""
+    with app.app_context():
+        index_page.variant('')
+
 @app.route('/')
 def index():
     """Serve main page"""
-    return render_template('index.html')
+    body, etag, encoding = index_page.variant(request.headers.get('Accept-Encoding', ''))
+    headers = {'ETag': f'"{etag}"', 'Vary': 'Accept-Encoding', 'Cache-Control': 'no-cache'}
+    if request.if_none_match.contains(etag):
+        return app.response_class(status=304, headers=headers)
+    if encoding:
+        headers['Content-Encoding'] = encoding
+    return app.response_class(body, mimetype='text/html', headers=headers)
 
 @app.route('/api/execute', methods=['POST'])
+@rate_limited('execute', 'session_id')
 def execute_command():
     """API endpoint to execute commands"""
     try:
         data = request.json
         command = data.get('command', '').strip()
-        session_id = data.get('session_id', 'default')
         
         if not command:
-            shell = sessions.get(session_id, PortfolioShell(session_id))
-            return jsonify({'output': '', 'type': 'info', 'prompt': shell.get_prompt()})
+            shell = load_shell(data, create=False)
+            prompt = shell.get_prompt() if shell else f'{current_tenant().home}$ '
+            return jsonify({'output': '', 'type': 'info', 'prompt': prompt})
         
         # Get or create shell session
-        if session_id not in sessions:
-            sessions[session_id] = PortfolioShell(session_id)
+        shell = load_shell(data)
+        body = shell.execute_json(command)
+        body = splice_json(body, **save_shell(shell, {}))
         
-        shell = sessions[session_id]
-        result = shell.execute(command)
-        
-        return jsonify(result)
+        return app.response_class(body, mimetype='application/json')
     
     except Exception as e:
         return jsonify({
             'output': f'Error: {str(e)}',
             'type': 'error',
-            'prompt': '/home/sudarshan/Portfolio$ '
+            'prompt': f'{current_tenant().home}$ '
         }), 500
 
+BATCH_MAX_COMMANDS = 100
+# A batch is priced as one request plus a fraction per command, so a full
+# batch (26 tokens) fits the default execute burst of 40
+BATCH_COMMAND_COST = 0.25
+
+def batch_cost(data):
+    commands = data.get('commands')
+    return 1 + BATCH_COMMAND_COST * len(commands) if isinstance(commands, list) else 1
+
+if batch_cost({'commands': [''] * BATCH_MAX_COMMANDS}) > RATE_LIMITS['execute'][1]:
+    print(f"WARNING: the execute rate limit's burst of {RATE_LIMITS['execute'][1]:g} is below the "
+          f"cost of a full batch; batches of {BATCH_MAX_COMMANDS} commands will be refused")
+
+@app.route('/api/execute/batch', methods=['POST'])
+@rate_limited('execute', 'session_id', cost=batch_cost)
+def execute_batch():
+    """Run an ordered list of commands for one session in a single request
+
+    Body: {"commands": [...], "session_id": ..., "stop_on_error": true}.
+    Each result carries its own output/type/prompt; with stop_on_error
+    (the default) the batch stops after the first failing command.
+    """
+    try:
+        data = request.json
+        commands = data.get('commands') if isinstance(data, dict) else None
+        if not isinstance(commands, list) or not all(isinstance(c, str) for c in commands):
+            return jsonify({'success': False, 'error': 'commands must be a list of strings'}), 400
+        if len(commands) > BATCH_MAX_COMMANDS:
+            return jsonify({'success': False, 'error': f'At most {BATCH_MAX_COMMANDS} commands per batch'}), 400
+        stop_on_error = data.get('stop_on_error', True)
+        
+        shell = load_shell(data)
+        bodies = []
+        stopped = False
+        for command in commands:
+            try:
+                body, rtype = shell._execute_body(command)
+            except Exception as e:
+                body, rtype = dump_json({'output': f'Error: {str(e)}', 'type': 'error'}), 'error'
+            bodies.append(splice_json(body, prompt=shell.get_prompt()))
+            if rtype == 'error' and stop_on_error:
+                stopped = True
+                break
+        
+        tail = save_shell(shell, {
+            'completed': len(bodies),
+            'stopped': stopped,
+            'prompt': shell.get_prompt(),
+        })
+        body = splice_json(b'{"results":[' + b','.join(bodies) + b']}', **tail)
+        return app.response_class(body, mimetype='application/json')
+    
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/page', methods=['POST'])
+def next_output_page():
+    """Next page of a truncated command result ({"cursor", "close"?})"""
+    try:
+        data = request.json
+        # Any worker can resume a cursor, even one that never saw the session
+        shell = load_shell(data, create=False)
+        if shell is None:
+            shell = PortfolioShell(current_tenant().scope(data.get('session_id', 'default')), current_tenant())
+        return jsonify(read_page(shell, data.get('cursor'), data.get('close')))
+    except Exception as e:
+        return jsonify({'output': f'Error: {str(e)}', 'type': 'error'}), 500
+
+def read_page(shell, cursor, close=False):
+    if close:
+        output_cursors.close(cursor, shell)
+        return {'output': '', 'type': 'info'}
+    try:
+        result = output_cursors.next_page(cursor, shell)
+    except ShellError as e:
+        return {'output': str(e), 'type': 'error'}
+    if result is None:
+        return {'output': 'Output expired; run the command again', 'type': 'error'}
+    return result
+
 @app.route('/api/session', methods=['GET'])
 def get_session():
-    """Create new session"""
-    session_id = str(uuid.uuid4())
-    sessions[session_id] = PortfolioShell(session_id)
-    shell = sessions[session_id]
-    return jsonify({
-        'session_id': session_id,
+    """Create a new session, or resume ?session_id= (with ?state= when stateless)"""
+    session_id = request.args.get('session_id')
+    shell = None
+    if session_id:
+        shell = load_shell({'session_id': session_id, 'state': request.args.get('state')}, create=False)
+        if shell is None and history_store is not None:
+            shell = load_shell({'session_id': session_id})
+            if not shell.history:
+                shell = None
+    if shell is None:
+        shell = PortfolioShell(current_tenant().scope(str(uuid.uuid4())))
+    result = {
+        'session_id': shell.session_id,
         'prompt': shell.get_prompt()
-    })
+    }
+    if socket_transport_enabled():
+        result['websocket'] = True
+    if shell.history:
+        # Oldest first, for the client's arrow-key history
+        result['history'] = [cmd for _, cmd in shell.history.newest(STATE_HISTORY * 5)][::-1]
+    return jsonify(save_shell(shell, result))
+
+def search_history(shell, query, skip=0, limit=1):
+    """Ctrl-R: newest history entries containing query"""
+    history = shell.history
+    if history_store is not None and (not history or history.first > 0):
+        # The shell may only hold its recent entries (e.g. a stateless token)
+        history = history_store.load(shell.session_id) or history
+    if not history or not query:
+        return {'matches': []}
+    skip = max(0, int(skip or 0))
+    limit = min(max(1, int(limit or 1)), 50)
+    return {'matches': [{'index': seq + 1, 'command': cmd}
+                        for seq, cmd in history.search(query, skip, limit)]}
+
+@app.route('/api/history/search', methods=['POST'])
+def history_search():
+    """Reverse search ({"query", "skip"?, "limit"?})"""
+    try:
+        data = request.json
+        return jsonify(search_history(load_shell(data), str(data.get('query', '')),
+                                      data.get('skip'), data.get('limit')))
+    except Exception as e:
+        return jsonify({'matches': [], 'error': str(e)}), 500
 
 @app.route('/api/autocomplete', methods=['POST'])
 def autocomplete():
@@ -1223,26 +3582,128 @@ def autocomplete():
     try:
         data = request.json
         partial = data.get('partial', '')
-        session_id = data.get('session_id', 'default')
         
-        if session_id not in sessions:
-            sessions[session_id] = PortfolioShell(session_id)
+        shell = load_shell(data)
         
-        shell = sessions[session_id]
+        line = data.get('line')
+        if line is None:
+            # Older clients only send the word being completed
+            result = shell.complete('ls ' + partial)
+            result['start'] -= 3
+            result['end'] -= 3
+            return jsonify(result)
         
-        # Get completions from current directory
-        completions = []
-        if shell.current_fs.get('type') == 'directory':
-            for name in shell.current_fs.get('contents', {}).keys():
-                if name.lower().startswith(partial.lower()):
-                    completions.append(name)
-        
-        return jsonify({'completions': completions})
+        return jsonify(shell.complete(line, data.get('cursor')))
     
     except Exception as e:
         return jsonify({'completions': []})
 
 
+
+# ============================================================================
+# WEBSOCKET TERMINAL - One long-lived connection per open terminal
+# ============================================================================
+
+# An open socket holds whatever serves it for as long as it stays open: a
+# greenlet under gevent, but a whole thread of a gthread worker, where a few
+# idle tabs would starve every other request. So with WEBSOCKET_TERMINAL=auto
+# the socket is only offered under gevent; 1 offers it anyway, 0 never.
+WEBSOCKET_TERMINAL = os.environ.get('WEBSOCKET_TERMINAL', 'auto').lower()
+SOCKET_IDLE_TIMEOUT = float(os.environ.get('SOCKET_IDLE_TIMEOUT', 120))
+# WebSocket terminal is optional; HTTP still works without flask_sock
+SOCKET_AVAILABLE = find_spec('flask_sock') is not None
+
+def socket_transport_enabled():
+    """Whether clients are told to connect to /ws/terminal"""
+    if not SOCKET_AVAILABLE:
+        return False
+    if WEBSOCKET_TERMINAL == 'auto':
+        # gunicorn's gevent worker patches sockets before it serves anything
+        monkey = sys.modules.get('gevent.monkey')
+        return monkey is not None and monkey.is_module_patched('socket')
+    return WEBSOCKET_TERMINAL in ('1', 'true', 'yes')
+
+def handle_terminal_message(shell, message):
+    """Answer one WebSocket message, recording it if trace capture is on"""
+    if tracer is None:
+        return answer_terminal_message(shell, message)
+    start = time.perf_counter()
+    reply = answer_terminal_message(shell, message)
+    trace_socket_message(shell, message, reply, start)
+    return reply
+
+def answer_terminal_message(shell, message):
+    """Answer one WebSocket message for a shell; returns the JSON reply bytes
+
+    Messages mirror the HTTP API: {"id", "op": "execute", "command"},
+    {"id", "op": "autocomplete", "line", "cursor"} or
+    {"id", "op": "history_search", "query", "skip"}. The id is echoed back so
+    the client can match replies to requests.
+    """
+    try:
+        data = json.loads(message)
+        msg_id = data.get('id')
+        op = data.get('op')
+        if op == 'execute':
+            wait = check_rate_limit('execute', shell.session_id)
+            if wait is not None:
+                retry_after = max(1, math.ceil(wait))
+                return dump_json({'id': msg_id, 'output': f'Too many requests; try again in {retry_after}s',
+                                  'type': 'error', 'retry_after': retry_after, 'prompt': shell.get_prompt()})
+            body = shell.execute_json(str(data.get('command', '')))
+            return splice_json(body, id=msg_id, **save_shell(shell, {}))
+        if op == 'autocomplete':
+            return dump_json({'id': msg_id, **shell.complete(str(data.get('line', '')), data.get('cursor'))})
+        if op == 'history_search':
+            return dump_json({'id': msg_id, **search_history(shell, str(data.get('query', '')),
+                                                              data.get('skip'), data.get('limit'))})
+        if op == 'page':
+            return dump_json({'id': msg_id, **read_page(shell, data.get('cursor'), data.get('close'))})
+        if op == 'ping':
+            return dump_json({'id': msg_id, 'op': 'pong'})
+        return dump_json({'id': msg_id, 'output': f'Unknown op: {op}', 'type': 'error'})
+    except Exception as e:
+        return dump_json({'output': f'Error: {str(e)}', 'type': 'error', 'prompt': f'{shell.tenant.home}$ '})
+
+def serve_terminal_socket(ws):
+    """Terminal over WebSocket; the HTTP endpoints remain as a fallback"""
+    shell = load_shell({
+        'session_id': request.args.get('session_id', 'default'),
+        'state': request.args.get('state'),
+    })
+    while True:
+        message = ws.receive(timeout=SOCKET_IDLE_TIMEOUT)
+        if message is None:
+            # Idle: hand the connection back; the client reconnects when needed
+            ws.close(reason=1000, message='idle')
+            break
+        ws.send(handle_terminal_message(shell, message).decode())
+
+@lru_cache(maxsize=None)
+def _socket_view():
+    """flask_sock's wrapper around serve_terminal_socket, built on first use
+
+    Importing flask_sock pulls in simple_websocket, wsproto and h11, about a
+    fifth of a cold start, so it waits for the first WebSocket visitor.
+    """
+    from flask_sock import Sock
+    views = []
+
+    class Capture:
+        def route(self, path, **kwargs):
+            return views.append
+
+    Sock().route('/ws/terminal', bp=Capture())(serve_terminal_socket)
+    return views[0]
+
+if SOCKET_AVAILABLE:
+    @app.route('/ws/terminal', websocket=True)
+    def terminal_socket():
+        if not socket_transport_enabled():
+            return jsonify({'error': 'WebSocket terminal is off'}), 404
+        return _socket_view()()
+
+
 if __name__ == '__main__':
     port = int(os.environ.get("PORT", 5000))
     print("=" * 60)
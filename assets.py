@@ -0,0 +1,215 @@
+"""
+Static asset pipeline - fingerprinting and pre-compression
+
+Copies every file under static/ to ASSET_BUILD_DIR as name.<hash>.ext, with
+gzip (and, if the brotli module is installed, brotli) variants of the text
+files written alongside. A file's hash covers its contents after its own
+/static/ references have been rewritten, so a changed image also changes
+the name of the script that points at it. Fingerprinted files never change,
+so they can be cached by browsers forever.
+
+    python assets.py build
+
+The manifest records a signature of the sources, so the app (or gunicorn's
+on_starting hook) only rebuilds when something under static/ changed.
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+
+try:
+    import brotli
+except ImportError:  # brotli variants are optional; gzip is always built
+    brotli = None
+
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(ROOT, 'static')
+ASSET_BUILD_DIR = os.environ.get('ASSET_BUILD_DIR', os.path.join(ROOT, '.assets'))
+ASSET_MANIFEST = 'manifest.json'
+ASSET_URL_PREFIX = '/assets/'
+
+TEXT_TYPES = ('.js', '.css', '.html', '.svg', '.json', '.txt', '.md', '.map')
+COMPRESSED_TYPES = {'.js', '.css', '.html', '.svg', '.json', '.txt', '.md', '.map', '.ico', '.bmp', '.wasm'}
+MIN_COMPRESS_SIZE = 256
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))  # in order of preference
+AVAILABLE_ENCODINGS = ('br', 'gzip') if brotli else ('gzip',)
+
+REFERENCE = re.compile(r'/static/([A-Za-z0-9_./-]+)')
+
+
+def _sources(static_dir):
+    for dirpath, dirnames, filenames in os.walk(static_dir):
+        dirnames.sort()
+        for name in sorted(filenames):
+            path = os.path.join(dirpath, name)
+            yield os.path.relpath(path, static_dir).replace(os.sep, '/'), path
+
+def source_signature(static_dir=STATIC_DIR):
+    """Fingerprint of names, sizes and mtimes under static_dir"""
+    h = hashlib.sha256()
+    for rel, path in _sources(static_dir):
+        st = os.stat(path)
+        h.update(f'{rel}\0{st.st_size}\0{st.st_mtime_ns}\n'.encode())
+    h.update(b'br' if brotli else b'')
+    return h.hexdigest()[:16]
+
+def fingerprinted(rel, data):
+    stem, ext = os.path.splitext(rel)
+    return f'{stem}.{hashlib.sha256(data).hexdigest()[:10]}{ext}'
+
+def rewrite_references(text, files):
+    """Point /static/<path> references at their fingerprinted URLs"""
+    def replace(match):
+        built = files.get(match.group(1))
+        return ASSET_URL_PREFIX + built if built else match.group(0)
+    return REFERENCE.sub(replace, text)
+
+
+def build_assets(static_dir=STATIC_DIR, out_dir=ASSET_BUILD_DIR):
+    """Fingerprint and compress static_dir into out_dir; returns the manifest"""
+    signature = source_signature(static_dir)
+    sources = dict(_sources(static_dir))
+    contents = {}
+    for rel, path in sources.items():
+        with open(path, 'rb') as f:
+            contents[rel] = f.read()
+
+    # Binary files first: text files may reference them
+    order = sorted(sources, key=lambda rel: rel.endswith(TEXT_TYPES))
+    files, encodings = {}, {}
+    for rel in order:
+        data = contents[rel]
+        if rel.endswith(TEXT_TYPES):
+            data = rewrite_references(data.decode('utf-8'), files).encode('utf-8')
+        name = fingerprinted(rel, data)
+        files[rel] = name
+        target = os.path.join(out_dir, name)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        if not os.path.exists(target):
+            _write(target, data)
+        variants = []
+        if os.path.splitext(rel)[1] in COMPRESSED_TYPES and len(data) >= MIN_COMPRESS_SIZE:
+            for encoding, suffix in ENCODINGS:
+                packed = compress(encoding, data)
+                if packed is not None and len(packed) < len(data):
+                    if not os.path.exists(target + suffix):
+                        _write(target + suffix, packed)
+                    variants.append(encoding)
+        encodings[name] = variants
+
+    manifest = {'signature': signature, 'files': files, 'encodings': encodings}
+    manifest_path = os.path.join(out_dir, ASSET_MANIFEST)
+    try:
+        with open(manifest_path) as f:
+            previous = json.load(f).get('files', {})
+    except (OSError, ValueError):
+        previous = {}
+    _write(manifest_path, json.dumps(manifest, indent=1).encode())
+    # Keep the previous build too: pages rendered by not-yet-restarted
+    # workers may still point at it
+    _prune(out_dir, set(files.values()) | set(previous.values()))
+    return manifest
+
+def _prune(out_dir, keep):
+    for dirpath, _, filenames in os.walk(out_dir):
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            rel = os.path.relpath(path, out_dir).replace(os.sep, '/')
+            base = rel[:-3] if rel.endswith(('.br', '.gz')) else rel
+            if rel != ASSET_MANIFEST and base not in keep and not name.endswith('.tmp'):
+                os.remove(path)
+
+def compress(encoding, data, level=None):
+    """data encoded for Content-Encoding `encoding`, or None if unavailable
+
+    level is gzip's 1-9 or brotli's quality 0-11; the default is the maximum,
+    for files compressed once at build time.
+    """
+    if encoding == 'gzip':
+        return gzip.compress(data, compresslevel=9 if level is None else level, mtime=0)
+    if encoding == 'br' and brotli is not None:
+        return brotli.compress(data, quality=11 if level is None else level)
+    return None
+
+def accepted_encodings(header):
+    """Content codings an Accept-Encoding header allows (q=0 excludes one)"""
+    accepted = set()
+    for part in (header or '').lower().split(','):
+        coding, _, params = part.partition(';')
+        if params.replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            accepted.add(coding.strip())
+    return accepted
+
+def negotiate(variants, header):
+    """Preferred encoding among variants that the client accepts, else None"""
+    accepted = accepted_encodings(header)
+    for encoding, _ in ENCODINGS:
+        if encoding in variants and encoding in accepted:
+            return encoding
+    return None
+
+def _write(path, data):
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+class AssetIndex:
+    """Lookup of built assets for serving: URL name -> file and encodings"""
+
+    def __init__(self, manifest, out_dir=ASSET_BUILD_DIR):
+        self.out_dir = out_dir
+        self.signature = manifest['signature']
+        self.files = manifest['files']  # source path -> fingerprinted name
+        self.encodings = manifest['encodings']
+
+    def url(self, rel):
+        name = self.files.get(rel)
+        return ASSET_URL_PREFIX + name if name else '/static/' + rel
+
+    def rewrite(self, text):
+        return rewrite_references(text, self.files)
+
+    def lookup(self, name, accept_encoding=''):
+        """(path, mimetype, content encoding or None) for a built name, or None"""
+        variants = self.encodings.get(name)
+        if variants is None:
+            return None
+        mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        path = os.path.join(self.out_dir, name)
+        encoding = negotiate(variants, accept_encoding)
+        if encoding:
+            return path + dict(ENCODINGS)[encoding], mimetype, encoding
+        return path, mimetype, None
+
+
+def load_assets(static_dir=STATIC_DIR, out_dir=ASSET_BUILD_DIR):
+    """AssetIndex for the current sources, building only if they changed"""
+    try:
+        with open(os.path.join(out_dir, ASSET_MANIFEST)) as f:
+            manifest = json.load(f)
+        if manifest.get('signature') != source_signature(static_dir):
+            manifest = None
+    except (OSError, ValueError):
+        manifest = None
+    if manifest is None:
+        manifest = build_assets(static_dir, out_dir)
+    return AssetIndex(manifest, out_dir)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Fingerprint and pre-compress static assets')
+    parser.add_argument('command', choices=['build'])
+    parser.add_argument('--static', default=STATIC_DIR)
+    parser.add_argument('--out', default=ASSET_BUILD_DIR)
+    opts = parser.parse_args()
+    manifest = build_assets(opts.static, opts.out)
+    print(f"Built {len(manifest['files'])} assets into {opts.out}"
+          + ('' if brotli else ' (brotli not installed; gzip only)'))
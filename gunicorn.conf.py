@@ -0,0 +1,82 @@
+"""
+Gunicorn settings - loaded automatically from the working directory
+"""
+
+import os
+import secrets
+import shutil
+import sys
+
+# gunicorn reads this file before applying --pythonpath, so find the app's
+# modules next to it whatever the working directory is
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import assets
+import metrics
+import vfs
+
+
+# Workers publish their metrics here so /metrics can merge them; set before
+# the app is imported (which may happen in the master with preload_app)
+os.environ.setdefault('METRICS_DIR', f'/dev/shm/portfolio-metrics-{os.getpid()}'
+                      if os.path.isdir('/dev/shm') else f'/tmp/portfolio-metrics-{os.getpid()}')
+
+# A random key every worker of this server shares, for things any worker must
+# be able to verify (output page cursors) when SESSION_SECRET isn't set
+os.environ.setdefault('WORKER_SECRET', secrets.token_hex(32))
+
+# Threads by default. WORKER_CLASS=gevent runs each request on a greenlet
+# instead (and patches sockets so Supabase calls yield), so slow uploads,
+# polling visitors and open WebSockets cost kilobytes rather than a thread.
+worker_class = os.environ.get('WORKER_CLASS', 'gthread')
+threads = int(os.environ.get('THREADS', 16))
+worker_connections = int(os.environ.get('WORKER_CONNECTIONS', 1000))
+
+# Import the app once in the master and fork workers from it: a waking dyno
+# pays for one import instead of one per worker, and the workers share the
+# imported code and rendered pages copy-on-write
+preload_app = os.environ.get('PRELOAD_APP', '1').lower() not in ('0', 'false', 'no')
+
+
+def build_artifacts(log):
+    """Compile the VFS snapshot and static assets once, before any worker is forked"""
+    if os.environ.get('ASSET_PIPELINE', '1').lower() not in ('0', 'false', 'no'):
+        assets.load_assets()
+    snapshot = os.environ.get('VFS_SNAPSHOT')
+    if snapshot:
+        build_id = vfs.build_snapshot(snapshot)
+        log(f"Built VFS snapshot {snapshot} (build {build_id})")
+
+
+if preload_app:
+    # The master imports the app before on_starting runs, so build first
+    build_artifacts(print)
+    if worker_class == 'gevent':
+        # ...and patch first: locks and sockets the app creates at import
+        # must already be the cooperative kind when workers inherit them
+        from gevent import monkey
+        monkey.patch_all()
+
+
+def on_starting(server):
+    metrics.clear_directory(os.environ['METRICS_DIR'])
+    if not preload_app:
+        build_artifacts(server.log.info)
+    elif server.cfg.worker_class_str == 'gevent' and worker_class != 'gevent':
+        server.log.warning("Preloading for gevent workers needs WORKER_CLASS=gevent, "
+                           "not --worker-class, so the app is imported after patching")
+
+
+def when_ready(server):
+    if server.cfg.preload_app:
+        import app
+        app.warm_up()
+
+
+def child_exit(server, worker):
+    """Keep an exited worker's counters, drop its gauges"""
+    metrics.mark_process_dead(worker.pid, os.environ['METRICS_DIR'])
+
+
+def on_exit(server):
+    shutil.rmtree(os.environ['METRICS_DIR'], ignore_errors=True)
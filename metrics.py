@@ -0,0 +1,323 @@
+"""
+Request metrics in Prometheus text format
+
+Counters, gauges and histograms live in a Registry in each process. With
+several gunicorn workers a scrape only reaches one of them, so every worker
+also writes its values to METRICS_DIR (at most once per flush interval) and
+the worker answering the scrape merges all the files:
+
+    METRICS_DIR=/dev/shm/portfolio-metrics gunicorn app:app
+
+Counters and histograms are summed across workers, including workers that
+have since exited. Gauges are summed (or maxed, for values every worker
+reads from shared state) over live workers only.
+"""
+
+import json
+import os
+import threading
+import time
+
+
+# Seconds; spans cached commands (tens of µs) to slow upstream calls
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Metric:
+    kind = 'untyped'
+
+    def __init__(self, registry, name, help, labels=(), aggregate='sum'):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.aggregate = aggregate
+        self.values = {}  # label values tuple -> value
+        self._lock = registry.lock
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labels)
+
+    def set(self, value, **labels):
+        with self._lock:
+            self.values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+
+class Gauge(Metric):
+    """aggregate='sum' adds workers' values; 'max' is for shared state"""
+
+    kind = 'gauge'
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    """Cumulative-bucket histogram; each value is [bucket counts, sum, count]"""
+
+    kind = 'histogram'
+
+    def __init__(self, registry, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(registry, name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self.values.get(key)
+            if entry is None:
+                entry = self.values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    def time(self, **labels):
+        return _Timer(self, labels)
+
+
+class _Timer:
+    __slots__ = ('histogram', 'labels', 'start')
+
+    def __init__(self, histogram, labels):
+        self.histogram, self.labels = histogram, labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(names, values, extra=None):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Registry:
+
+    def __init__(self, directory='', flush_interval=1.0):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.metrics = {}
+        self.collectors = []
+        self._dirty = False
+        self._flusher_pid = None
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _add(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help, labels=()):
+        return self._add(Counter(self, name, help, labels))
+
+    def gauge(self, name, help, labels=(), aggregate='sum'):
+        return self._add(Gauge(self, name, help, labels, aggregate))
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        return self._add(Histogram(self, name, help, labels, buckets))
+
+    def collector(self, fn):
+        """Register fn() to refresh callback-style metrics before export"""
+        self.collectors.append(fn)
+        return fn
+
+    def collect(self):
+        for fn in self.collectors:
+            try:
+                fn()
+            except Exception as e:
+                print(f"WARNING: metrics collector {fn.__name__} failed: {e}")
+
+    def dump(self):
+        """This process's values as a JSON-ready dict"""
+        with self.lock:
+            return {
+                name: {
+                    'kind': m.kind, 'help': m.help, 'labels': m.labels, 'aggregate': m.aggregate,
+                    'buckets': getattr(m, 'buckets', None),
+                    'values': [[list(key), _copy(value)] for key, value in m.values.items()],
+                }
+                for name, m in self.metrics.items()
+            }
+
+    def flush(self, force=False):
+        """Write this worker's file, with collectors run first
+
+        Called after each request, which only marks the values dirty:
+        collectors can be slow, and no request should pay for them. A
+        background thread (started lazily, so after any fork) writes them at
+        most once per flush interval; force writes now, for a scrape.
+        """
+        if not self.directory:
+            return
+        if not force:
+            self._dirty = True
+            if self._flusher_pid != os.getpid():
+                self._flusher_pid = os.getpid()
+                threading.Thread(target=self._flush_loop, daemon=True).start()
+            return
+        self._dirty = False
+        self.collect()
+        path = os.path.join(self.directory, f'{os.getpid()}.json')
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.dump(), f, separators=(',', ':'))
+        os.replace(tmp_path, path)
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            if self._dirty:
+                self.flush(force=True)
+
+    def render(self):
+        """Prometheus text exposition of every worker's metrics"""
+        if self.directory:
+            self.flush(force=True)
+            merged = merge_directory(self.directory)
+        else:
+            self.collect()
+            merged = self.dump()
+        return render_text(merged)
+
+
+def _copy(value):
+    if isinstance(value, list):
+        return [list(value[0]), value[1], value[2]]
+    return value
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _merge_into(merged, dump, live):
+    for name, metric in dump.items():
+        target = merged.setdefault(name, {**metric, 'values': {}})
+        if metric['kind'] == 'gauge' and not live:
+            continue
+        values = target['values']
+        for key, value in metric['values']:
+            key = tuple(key)
+            if key not in values:
+                values[key] = _copy(value)
+            elif metric['kind'] == 'histogram':
+                current = values[key]
+                current[0] = [a + b for a, b in zip(current[0], value[0])]
+                current[1] += value[1]
+                current[2] += value[2]
+            elif metric['aggregate'] == 'max':
+                values[key] = max(values[key], value)
+            else:
+                values[key] += value
+
+
+def merge_directory(directory):
+    """Combine every worker file (and the archive of exited workers)"""
+    merged = {}
+    for filename in sorted(os.listdir(directory)):
+        if not filename.endswith('.json'):
+            continue
+        stem = filename[:-len('.json')]
+        try:
+            with open(os.path.join(directory, filename)) as f:
+                dump = json.load(f)
+        except (OSError, ValueError):
+            continue
+        live = stem.isdigit() and _pid_alive(int(stem))
+        _merge_into(merged, dump, live)
+    for metric in merged.values():
+        metric['values'] = [[list(k), v] for k, v in metric['values'].items()]
+    return merged
+
+
+def mark_process_dead(pid, directory):
+    """Fold an exited worker's counters into archive.json (gunicorn child_exit)"""
+    if not directory:
+        return
+    path = os.path.join(directory, f'{pid}.json')
+    archive_path = os.path.join(directory, 'archive.json')
+    try:
+        with open(path) as f:
+            dump = json.load(f)
+    except (OSError, ValueError):
+        return
+    merged = {}
+    try:
+        with open(archive_path) as f:
+            _merge_into(merged, json.load(f), live=False)
+    except (OSError, ValueError):
+        pass
+    _merge_into(merged, dump, live=False)
+    for metric in merged.values():
+        metric['values'] = [[list(k), v] for k, v in metric['values'].items()]
+    with open(f'{archive_path}.tmp', 'w') as f:
+        json.dump(merged, f, separators=(',', ':'))
+    os.replace(f'{archive_path}.tmp', archive_path)
+    os.remove(path)
+
+
+def render_text(merged):
+    lines = []
+    for name in sorted(merged):
+        metric = merged[name]
+        if not metric['values']:
+            continue
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['kind']}")
+        names = metric['labels']
+        for key, value in sorted(metric['values'], key=lambda kv: kv[0]):
+            if metric['kind'] == 'histogram':
+                cumulative = 0
+                for bound, count in zip(metric['buckets'], value[0]):
+                    cumulative += count
+                    le = 'le="%s"' % _number(bound)
+                    lines.append(f'{name}_bucket{_labels(names, key, le)} {cumulative}')
+                le = 'le="+Inf"'
+                lines.append(f'{name}_bucket{_labels(names, key, le)} {value[2]}')
+                lines.append(f'{name}_sum{_labels(names, key)} {_number(value[1])}')
+                lines.append(f'{name}_count{_labels(names, key)} {value[2]}')
+            else:
+                lines.append(f'{name}{_labels(names, key)} {_number(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+def clear_directory(directory):
+    """Remove files left by a previous server run"""
+    if not directory or not os.path.isdir(directory):
+        return
+    for filename in os.listdir(directory):
+        if filename.endswith(('.json', '.tmp')):
+            os.remove(os.path.join(directory, filename))
@@ -0,0 +1,145 @@
+"""
+On-demand stack-sampling profiler
+
+A background thread wakes every `interval` seconds and records the Python
+stack of each thread that is serving a request, using sys._current_frames().
+Nothing is installed in the request path, so the cost is confined to the
+sampling thread and stops when the run ends.
+
+Results come out as folded stacks, one "frame;frame;frame count" line per
+distinct stack (the input format of flamegraph.pl and speedscope), and as a
+top-N summary of the functions seen most often, on-CPU or not.
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+
+def _frame_label(code):
+    # co_qualname (Class.method) is new in Python 3.11
+    name = getattr(code, 'co_qualname', code.co_name)
+    return f'{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+
+class SamplingProfiler:
+    """One profiling run at a time per process; the last results are kept"""
+
+    def __init__(self, interval=0.005, output_dir=None):
+        self.interval = interval
+        self.output_dir = output_dir  # each finished run is also written here
+        self.output = None
+        self.stacks = Counter()
+        self.samples = 0
+        self.started = None
+        self.stopped = None
+        self.description = ''
+        self._thread = None
+        self._stop = threading.Event()
+        self._labels = {}
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, seconds, threads, description=''):
+        """Sample for `seconds`; threads() returns {thread ident: root label}
+
+        Only threads listed by threads() are sampled, under their label (e.g.
+        the route they are serving). Returns False if a run is in progress.
+        """
+        if self.running:
+            return False
+        self.stacks = Counter()
+        self.samples = 0
+        self.started, self.stopped = time.time(), None
+        self.output = None
+        self.description = description
+        self._labels.clear()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(seconds, threads),
+                                        name='sampling-profiler', daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self, seconds, threads):
+        deadline = time.monotonic() + seconds
+        labels = self._labels
+        while not self._stop.is_set() and time.monotonic() < deadline:
+            targets = threads()
+            if targets:
+                frames = sys._current_frames()
+                for ident, root in targets.items():
+                    frame = frames.get(ident)
+                    if frame is None:
+                        continue
+                    stack = []
+                    while frame is not None:
+                        code = frame.f_code
+                        label = labels.get(code)
+                        if label is None:
+                            label = labels[code] = _frame_label(code)
+                        stack.append(label)
+                        frame = frame.f_back
+                    stack.append(root)
+                    self.stacks[';'.join(reversed(stack))] += 1
+                    self.samples += 1
+                del frames
+            self._stop.wait(self.interval)
+        self.stopped = time.time()
+        if self.output_dir:
+            try:
+                self.output = self.write(self.output_dir)
+            except OSError as e:
+                print(f"WARNING: couldn't save profile to {self.output_dir}: {e}")
+
+    def folded(self):
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+    def summary(self, top=20):
+        """Most frequent functions: `self` at the top of the stack, `total` anywhere in it"""
+        own, total = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(';')
+            own[frames[-1]] += count
+            for frame in set(frames[1:]):
+                total[frame] += count
+        samples = self.samples or 1
+
+        def rows(counter):
+            return [{'function': name, 'samples': count, 'percent': round(100 * count / samples, 1)}
+                    for name, count in counter.most_common(top)]
+
+        return {
+            'description': self.description,
+            'running': self.running,
+            'started': self.started,
+            'stopped': self.stopped,
+            'interval': self.interval,
+            'samples': self.samples,
+            'output': self.output,
+            'self': rows(own),
+            'total': rows(total),
+        }
+
+    def write(self, directory, top=20):
+        """Save folded stacks and a text summary; returns the folded file's path"""
+        stem = os.path.join(directory, f'profile-{os.getpid()}-{int(self.started)}')
+        with open(stem + '.folded', 'w') as f:
+            f.write(self.folded())
+        summary = self.summary(top)
+        with open(stem + '.txt', 'w') as f:
+            f.write(f"{summary['description']}: {summary['samples']} samples "
+                    f"every {self.interval * 1000:g} ms\n")
+            for title in ('self', 'total'):
+                f.write(f'\n{title}:\n')
+                for row in summary[title]:
+                    f.write(f"  {row['percent']:5.1f}%  {row['samples']:7d}  {row['function']}\n")
+        return stem + '.folded'
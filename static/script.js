@@ -371,20 +371,108 @@ document.addEventListener('dragstart', (e) => e.preventDefault());
     const terminalPrompt = document.getElementById('terminal-prompt');
     
     let sessionId = null;
+    let sessionState = null;  // signed shell state, when the server is stateless
+    // The terminal API sits beside the page, which may be served under a
+    // tenant prefix such as /t/<name>/
+    const apiBase = location.pathname.replace(/\/[^/]*$/, '');
     let commandHistory = [];
     let historyIndex = -1;
     
-    // Initialize terminal session
+    // WebSocket transport, used when the server offers it; requests fall
+    // back to HTTP whenever it's down
+    let socket = null;
+    let socketEnabled = false;
+    let socketIdle = false;  // closed by the server for inactivity
+    let socketFailures = 0;
+    let nextMessageId = 1;
+    const pendingReplies = new Map();
+    
+    function connectSocket() {
+        if (!socketEnabled || !('WebSocket' in window) || socketFailures >= 3) return;
+        const scheme = location.protocol === 'https:' ? 'wss:' : 'ws:';
+        const params = new URLSearchParams({ session_id: sessionId });
+        if (sessionState) params.set('state', sessionState);
+        const ws = new WebSocket(`${scheme}//${location.host}${apiBase}/ws/terminal?${params}`);
+        ws.onopen = () => {
+            socket = ws;
+            socketFailures = 0;
+        };
+        ws.onmessage = (event) => {
+            const data = JSON.parse(event.data);
+            const pending = pendingReplies.get(data.id);
+            if (pending) {
+                pendingReplies.delete(data.id);
+                pending.resolve(data);
+            }
+        };
+        ws.onclose = (event) => {
+            const wasOpen = socket === ws;
+            socket = null;
+            pendingReplies.forEach(pending => pending.reject(new Error('Socket closed')));
+            pendingReplies.clear();
+            if (wasOpen && event.reason === 'idle') {
+                // Reconnect with the next command rather than right away
+                socketIdle = true;
+                return;
+            }
+            socketFailures++;
+            if (wasOpen) setTimeout(connectSocket, 2000);
+        };
+    }
+    
+    const httpPaths = { history_search: 'history/search' };
+    
+    // Send an execute/autocomplete request over the socket if open, else HTTP
+    async function terminalRequest(op, payload) {
+        if (socketIdle) {
+            socketIdle = false;
+            connectSocket();
+        }
+        if (socket && socket.readyState === WebSocket.OPEN) {
+            try {
+                return await new Promise((resolve, reject) => {
+                    const id = nextMessageId++;
+                    pendingReplies.set(id, { resolve, reject });
+                    socket.send(JSON.stringify({ id, op, ...payload }));
+                });
+            } catch (error) {
+                // Socket dropped mid-request; retry over HTTP below
+            }
+        }
+        const response = await fetch(`${apiBase}/api/${httpPaths[op] || op}`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ ...payload, session_id: sessionId, state: sessionState })
+        });
+        return response.json();
+    }
+    
+    // Initialize terminal session, resuming the previous one after a reload
     async function initTerminal() {
         try {
-            const response = await fetch('/api/session');
+            const params = new URLSearchParams();
+            const saved = localStorage.getItem('terminalSession' + apiBase);
+            if (saved) params.set('session_id', saved);
+            const savedState = localStorage.getItem('terminalState' + apiBase);
+            if (savedState) params.set('state', savedState);
+            const response = await fetch(`${apiBase}/api/session?${params}`);
             const data = await response.json();
             sessionId = data.session_id;
+            sessionState = data.state || null;
+            socketEnabled = Boolean(data.websocket);
             terminalPrompt.textContent = data.prompt;
+            if (data.history) commandHistory = data.history.slice().reverse();
+            localStorage.setItem('terminalSession' + apiBase, sessionId);
+            rememberState();
         } catch (error) {
             console.error('Failed to init terminal:', error);
             sessionId = 'local-' + Date.now();
         }
+        connectSocket();
+    }
+    
+    function rememberState() {
+        if (sessionState) localStorage.setItem('terminalState' + apiBase, sessionState);
     }
     
     // Execute command
@@ -400,13 +488,11 @@ document.addEventListener('dragstart', (e) => e.preventDefault());
         appendOutput(`${terminalPrompt.textContent}${command}`, 'command');
         
         try {
-            const response = await fetch('/api/execute', {
-                method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({ command, session_id: sessionId })
-            });
-            
-            const result = await response.json();
+            const result = await terminalRequest('execute', { command });
+            if (result.state) {
+                sessionState = result.state;
+                rememberState();
+            }
             
             // Handle different response types
             if (result.type === 'clear') {
@@ -423,6 +509,9 @@ document.addEventListener('dragstart', (e) => e.preventDefault());
             } else if (result.output) {
                 appendOutput(result.output, result.type || 'info');
             }
+            if (result.next_page) {
+                startPager(result.next_page);
+            }
             
             // Update prompt
             if (result.prompt) {
@@ -433,6 +522,106 @@ document.addEventListener('dragstart', (e) => e.preventDefault());
         }
     }
     
+    // Oversized output arrives a page at a time; the rest waits on the server
+    let pageCursor = null;
+    let moreLine = null;
+    
+    function startPager(cursor) {
+        pageCursor = cursor;
+        appendOutput('-- More -- (space/enter: next page, q: quit)', 'info');
+        moreLine = terminalOutput.lastChild;
+    }
+    
+    async function pagerKey(key) {
+        const cursor = pageCursor;
+        pageCursor = null;
+        if (moreLine) moreLine.remove();
+        moreLine = null;
+        if (key === 'q' || key === 'Escape') {
+            terminalRequest('page', { cursor, close: true }).catch(() => {});
+            return;
+        }
+        try {
+            const page = await terminalRequest('page', { cursor });
+            if (page.output) appendOutput(page.output, page.type || 'info');
+            if (page.next_page) startPager(page.next_page);
+        } catch (error) {
+            appendOutput(`Error: ${error.message}`, 'error');
+        }
+    }
+    
+    // Ctrl-R reverse search: keys edit the query, the input shows the match
+    let search = null;
+    
+    function startSearch() {
+        search = { query: '', skip: 0, match: '', prompt: terminalPrompt.textContent, line: terminalInput.value };
+        renderSearch();
+    }
+    
+    function renderSearch() {
+        const failed = search.query && !search.match ? 'failing ' : '';
+        terminalPrompt.textContent = `(${failed}reverse-i-search)'${search.query}': `;
+        terminalInput.value = search.match;
+    }
+    
+    async function runSearch() {
+        const current = search;
+        if (!current.query) {
+            current.match = '';
+            renderSearch();
+            return;
+        }
+        try {
+            const data = await terminalRequest('history_search', { query: current.query, skip: current.skip });
+            if (search !== current) return;
+            if (data.matches && data.matches.length) {
+                current.match = data.matches[0].command;
+            } else if (current.skip) {
+                current.skip--;  // no older match; stay on this one
+            } else {
+                current.match = '';
+            }
+            renderSearch();
+        } catch (error) {
+            console.error('History search error:', error);
+        }
+    }
+    
+    function endSearch(keepMatch) {
+        terminalPrompt.textContent = search.prompt;
+        terminalInput.value = keepMatch ? search.match : search.line;
+        search = null;
+    }
+    
+    async function searchKey(e) {
+        if (e.key === 'r' && e.ctrlKey) {
+            e.preventDefault();
+            search.skip++;
+            await runSearch();
+        } else if (e.key === 'Escape' || (e.key === 'g' && e.ctrlKey)) {
+            e.preventDefault();
+            endSearch(false);
+        } else if (e.key === 'Enter') {
+            e.preventDefault();
+            const command = search.match;
+            endSearch(true);
+            terminalInput.value = '';
+            await executeCommand(command);
+        } else if (e.key === 'Backspace') {
+            e.preventDefault();
+            search.query = search.query.slice(0, -1);
+            search.skip = 0;
+            await runSearch();
+        } else if (e.key.length === 1 && !e.ctrlKey && !e.metaKey) {
+            e.preventDefault();
+            search.query += e.key;
+            search.skip = 0;
+            await runSearch();
+        } else if (['ArrowLeft', 'ArrowRight', 'Tab'].includes(e.key)) {
+            endSearch(true);  // accept the match for editing
+        }
+    }
+    
     // Append output to terminal
     function appendOutput(text, type = 'info') {
         const line = document.createElement('div');
@@ -445,7 +634,21 @@ document.addEventListener('dragstart', (e) => e.preventDefault());
     // Handle input
     if (terminalInput) {
         terminalInput.addEventListener('keydown', async (e) => {
-            if (e.key === 'Enter') {
+            if (pageCursor) {
+                if ([' ', 'Enter', 'q', 'Escape'].includes(e.key)) {
+                    e.preventDefault();
+                    await pagerKey(e.key);
+                }
+                return;
+            }
+            if (search) {
+                await searchKey(e);
+                return;
+            }
+            if (e.key === 'r' && e.ctrlKey) {
+                e.preventDefault();
+                startSearch();
+            } else if (e.key === 'Enter') {
                 const command = terminalInput.value;
                 terminalInput.value = '';
                 await executeCommand(command);
@@ -466,26 +669,22 @@ document.addEventListener('dragstart', (e) => e.preventDefault());
                 }
             } else if (e.key === 'Tab') {
                 e.preventDefault();
-                // Tab completion
-                const partial = terminalInput.value.split(' ').pop();
-                if (partial) {
-                    try {
-                        const response = await fetch('/api/autocomplete', {
-                            method: 'POST',
-                            headers: { 'Content-Type': 'application/json' },
-                            body: JSON.stringify({ partial, session_id: sessionId })
-                        });
-                        const data = await response.json();
-                        if (data.completions && data.completions.length === 1) {
-                            const parts = terminalInput.value.split(' ');
-                            parts[parts.length - 1] = data.completions[0];
-                            terminalInput.value = parts.join(' ');
-                        } else if (data.completions && data.completions.length > 1) {
+                // Tab completion (server works out context from the cursor)
+                const line = terminalInput.value;
+                const cursor = terminalInput.selectionStart;
+                try {
+                    const data = await terminalRequest('autocomplete', { line, cursor });
+                    if (data.completions && data.completions.length) {
+                        const before = line.slice(0, data.start);
+                        terminalInput.value = before + data.prefix + line.slice(data.end);
+                        const caret = before.length + data.prefix.length;
+                        terminalInput.setSelectionRange(caret, caret);
+                        if (data.completions.length > 1) {
                             appendOutput(data.completions.join('  '), 'info');
                         }
-                    } catch (error) {
-                        console.error('Autocomplete error:', error);
                     }
+                } catch (error) {
+                    console.error('Autocomplete error:', error);
                 }
             } else if (e.key === 'l' && e.ctrlKey) {
                 e.preventDefault();
@@ -1799,7 +1998,11 @@ document.addEventListener('dragstart', (e) => e.preventDefault());
                 const response = await fetch('/api/send-message', {
                     method: 'POST',
                     headers: { 'Content-Type': 'application/json' },
-                    body: JSON.stringify({ message })
+                    // Keys the rate limit, so visitors behind one IP don't share it
+                    body: JSON.stringify({
+                        message,
+                        visitor_id: window.visitorId || localStorage.getItem('guestbook_visitor_id')
+                    })
                 });
                 
                 const result = await response.json();
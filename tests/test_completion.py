@@ -0,0 +1,36 @@
+"""Tab completion only offers paths the shell can open"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app
+
+
+def offered(shell, line):
+    """Full words Tab would produce for each candidate of line"""
+    result = shell.complete(line)
+    word = line[result['start']:result['end']]
+    dir_part = word.rpartition('/')[0] + '/' if '/' in word else ''
+    return [dir_part + candidate for candidate in result['completions']]
+
+
+def test_every_completion_resolves():
+    shell = app.PortfolioShell('completion')
+    lines = ['cat ', 'cat /', 'cat /B', 'cat ~/', 'ls Pro', 'cat Projects/', 'cd /Pro',
+             'cat /Projects/', 'head ../', 'grep x ~/Projects/']
+    for cwd in ('~', '~/Projects'):
+        shell.execute(f'cd {cwd}')
+        for line in lines:
+            words = offered(shell, line)
+            for word in words:
+                assert shell.vfs.resolve(word.rstrip('/'), shell.cwd) is not None, (cwd, line, word)
+
+
+def test_root_anchored_completion_runs():
+    shell = app.PortfolioShell('completion')
+    result = shell.complete('cat /B')
+    assert result['prefix'] == '/Bio.txt '
+    assert shell.execute('cat /Bio.txt')['type'] == 'success'
+    assert shell.execute('cd /')['type'] != 'error'
+    assert shell.get_prompt() == f'{shell.tenant.home}$ '
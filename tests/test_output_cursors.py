@@ -0,0 +1,78 @@
+"""Paged output resumes from its signed p1 cursor"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app
+
+
+@pytest.fixture
+def big_file(monkeypatch):
+    """Every file reads as 1000 numbered lines"""
+    def open_lines(self, cmd, path):
+        return (f'line {i}' for i in range(1000))
+
+    monkeypatch.setattr(app.PortfolioShell, '_open_lines', open_lines)
+
+
+def expected(start, count=app.OUTPUT_PAGE_LINES):
+    return '\n'.join(f'line {i}' for i in range(start, start + count))
+
+
+def first_page(shell):
+    result = shell.execute('cat big.txt')
+    assert result['output'] == expected(0)
+    assert result['output_truncated']
+    return result['next_page']
+
+
+def test_resume_returns_next_page(big_file):
+    shell = app.PortfolioShell('cursors')
+    cursor = first_page(shell)
+    assert cursor.startswith('p1.')
+
+    page = app.read_page(shell, cursor)
+    assert page['output'] == expected(app.OUTPUT_PAGE_LINES)
+    assert 'next_page' in page
+
+
+def test_resume_after_the_stream_is_evicted(big_file):
+    shell = app.PortfolioShell('cursors')
+    cursor = first_page(shell)
+    app.output_cursors._streams.clear()
+
+    page = app.read_page(shell, cursor)
+    assert page['type'] == 'success'
+    assert page['output'] == expected(app.OUTPUT_PAGE_LINES)
+    # The re-run carries on to the end like the original stream would
+    pages = [expected(0), page['output']]
+    while 'next_page' in page:
+        page = app.read_page(shell, page['next_page'])
+        pages.append(page['output'])
+    assert '\n'.join(pages) == expected(0, 1000)
+
+
+def test_cursor_of_another_session_is_rejected(big_file):
+    cursor = first_page(app.PortfolioShell('cursors'))
+    page = app.read_page(app.PortfolioShell('intruder'), cursor)
+    assert page['type'] == 'error'
+    assert page['output'] == 'Output expired; run the command again'
+
+
+def test_tampered_cursor_is_rejected(big_file):
+    shell = app.PortfolioShell('cursors')
+    cursor = first_page(shell)
+    version, payload, mac = cursor.split('.')
+    forged = app._b64decode(payload).replace(b'big.txt', b'Bio.txt')
+    assert forged != app._b64decode(payload)
+
+    for bad in (f'{version}.{app._b64encode(forged)}.{mac}',
+                f'{version}.{payload}.{app._b64encode(bytes(16))}',
+                f'p9.{payload}.{mac}'):
+        page = app.read_page(shell, bad)
+        assert page['type'] == 'error'
+    # The genuine cursor still works afterwards
+    assert app.read_page(shell, cursor)['output'] == expected(app.OUTPUT_PAGE_LINES)
@@ -0,0 +1,22 @@
+"""Token-bucket pricing of batch requests"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app
+
+
+def test_full_batch_admitted_then_limited(monkeypatch):
+    monkeypatch.setattr(app, 'rate_limiter', app.MemoryRateLimiter())
+    client = app.app.test_client()
+    body = {'session_id': 'batch-limits', 'commands': ['pwd'] * app.BATCH_MAX_COMMANDS}
+    environ = {'REMOTE_ADDR': '203.0.113.7'}
+
+    first = client.post('/api/execute/batch', json=body, environ_base=environ)
+    assert first.status_code == 200
+    assert first.get_json()['completed'] == app.BATCH_MAX_COMMANDS
+
+    second = client.post('/api/execute/batch', json=body, environ_base=environ)
+    assert second.status_code == 429
+    assert int(second.headers['Retry-After']) >= 1
@@ -0,0 +1,75 @@
+"""Lexing and pipelines: quoting, operators and how errors surface"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app
+
+
+def test_quotes_and_escapes():
+    env = {'NAME': 'sudarshan', 'EMPTY': ''}
+    assert app.lex('''echo 'a  b' "c  d" e\\ f''', env) == ['echo', 'a  b', 'c  d', 'e f']
+    assert app.lex('''echo '$NAME' "$NAME" ${NAME}x''', env) == ['echo', '$NAME', 'sudarshan', 'sudarshanx']
+    assert app.lex('echo "say \\"hi\\" \\$NAME"', env) == ['echo', 'say "hi" $NAME']
+    assert app.lex('echo $EMPTY $MISSING ""', env) == ['echo', '']
+    assert app.lex("echo 'a|b' a\\|b", env) == ['echo', 'a|b', 'a|b']
+
+
+def test_operators_are_tokens_only_when_unquoted():
+    words = app.lex('cat Bio.txt|grep "x|y" >> out', {})
+    assert words == ['cat', 'Bio.txt', '|', 'grep', 'x|y', '>>', 'out']
+    assert [isinstance(w, app.Op) for w in words] == [False, False, True, False, False, True, False]
+
+
+@pytest.mark.parametrize('line', ["echo 'open", 'echo "open', 'echo "a\\"'])
+def test_unterminated_quote(line):
+    with pytest.raises(app.ShellError, match='unexpected EOF'):
+        app.lex(line, {})
+    result = app.PortfolioShell('lexer').execute(line)
+    assert result['type'] == 'error'
+    assert 'unexpected EOF' in result['output']
+
+
+def test_head_stops_the_pipeline_early(monkeypatch):
+    pulled = []
+
+    def open_lines(self, cmd, path):
+        for i in range(100000):
+            pulled.append(i)
+            yield f'line {i} {"match" if i % 2 else "skip"}'
+
+    monkeypatch.setattr(app.PortfolioShell, '_open_lines', open_lines)
+    result = app.PortfolioShell('lexer').execute('cat big.txt | grep match | head -n1')
+    assert result['type'] == 'success'
+    assert result['output'] == 'line 1 match'
+    assert 'next_page' not in result
+    assert len(pulled) < 10
+
+
+@pytest.mark.parametrize('line, message', [
+    ('cat Bio.txt > out.txt', 'bash: out.txt: Read-only file system'),
+    ('cat Bio.txt >> out.txt', 'bash: out.txt: Read-only file system'),
+    ('cat Bio.txt >', "bash: syntax error near unexpected token `newline'"),
+    ('grep x < | head', "bash: syntax error near unexpected token `|'"),
+    ('grep x < missing.txt', 'bash: missing.txt: No such file'),
+    ('head < Projects', 'bash: Projects: Is a directory'),
+    ('cat Bio.txt | | head', "bash: syntax error near unexpected token `|'"),
+])
+def test_redirection_errors(line, message):
+    result = app.PortfolioShell('lexer').execute(line)
+    assert result['type'] == 'error'
+    assert result['output'] == message
+
+
+def test_input_redirection_feeds_the_stage():
+    shell = app.PortfolioShell('lexer')
+    assert shell.execute('head -n1 < Bio.txt')['output'] == shell.execute('head -n1 Bio.txt')['output']
+
+
+def test_unknown_command_mid_pipe():
+    result = app.PortfolioShell('lexer').execute('cat Bio.txt | frobnicate | head -n1')
+    assert result['type'] == 'error'
+    assert result['output'].startswith('bash: frobnicate: command not found')
@@ -0,0 +1,66 @@
+"""Stateless session tokens survive an encode -> decode round trip"""
+
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app
+
+
+def noise(seed, length):
+    """Non-ASCII text that zlib can't shrink much"""
+    rng = random.Random(seed)
+    return ''.join(chr(rng.randrange(0x400, 0x4ff)) for _ in range(length))
+
+
+def test_large_history_round_trips():
+    shell = app.PortfolioShell('tokens')
+    shell.execute('cd Projects')
+    shell.execute('export EDITOR=vim')
+    for i in range(app.STATE_HISTORY):
+        shell.execute(f'echo {noise(i, 200)}')
+
+    token = app.encode_state(shell)
+    assert len(token) <= app.STATE_MAX_LENGTH
+
+    restored = app.decode_state(token, 'tokens')
+    assert restored is not None
+    assert restored.get_prompt() == shell.get_prompt()
+    assert restored.env['EDITOR'] == 'vim'
+    assert next(restored.history.newest())[1] == next(shell.history.newest())[1][:200]
+    assert restored.history.total == shell.history.total
+
+
+def test_oversized_env_round_trips():
+    shell = app.PortfolioShell('tokens')
+    for i in range(40):
+        shell.execute(f'export VAR{i}={noise(i, 300)}')
+
+    token = app.encode_state(shell)
+    assert len(token) <= app.STATE_MAX_LENGTH
+
+    restored = app.decode_state(token, 'tokens')
+    assert restored is not None
+    assert restored.env['VAR39'] == shell.env['VAR39']
+
+
+def test_token_is_bound_to_its_session():
+    shell = app.PortfolioShell('tokens')
+    shell.execute('cd Projects')
+    token = app.encode_state(shell)
+    assert app.decode_state(token, 'tokens') is not None
+    assert app.decode_state(token, 'someone-else') is None
+
+
+def test_stale_token_is_rejected(monkeypatch):
+    shell = app.PortfolioShell('tokens')
+    now = app.time.time()
+    monkeypatch.setattr(app.time, 'time', lambda: now - app.SESSION_TTL - 5)
+    stale = app.encode_state(shell)
+    monkeypatch.setattr(app.time, 'time', lambda: now - app.SESSION_TTL + 5)
+    fresh = app.encode_state(shell)
+    monkeypatch.undo()
+
+    assert app.decode_state(stale, 'tokens') is None
+    assert app.decode_state(fresh, 'tokens') is not None
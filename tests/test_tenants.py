@@ -0,0 +1,64 @@
+"""Requests reach the right tenant, and tenants never see each other's files or shells"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    """Test client for an app serving tenants alice and bob out of tmp_path"""
+    for name in ('alice', 'bob'):
+        root = tmp_path / name
+        root.mkdir()
+        (root / f'{name}.txt').write_text(f'{name} was here\n')
+    registry = app.TenantRegistry(str(tmp_path), app.DEFAULT_TENANT)
+    monkeypatch.setattr(app, 'tenants', registry)
+    monkeypatch.setattr(app, 'rate_limiter', app.MemoryRateLimiter())
+    monkeypatch.setattr(app.app, 'wsgi_app', app.TenantRouter(app.app.wsgi_app, registry))
+    return app.app.test_client()
+
+
+def run(client, url, command, session_id='shared-id', **kwargs):
+    response = client.post(url, json={'command': command, 'session_id': session_id}, **kwargs)
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_path_prefix_routes_to_tenant(client):
+    result = run(client, '/t/alice/api/execute', 'cat alice.txt')
+    assert result['output'].strip() == 'alice was here'
+    assert result['prompt'] == '/home/alice/Portfolio$ '
+
+
+def test_host_routes_to_tenant(client):
+    for host in ('bob', 'bob.portfolio.example:8000'):
+        result = run(client, '/api/execute', 'ls', headers={'Host': host})
+        assert 'bob.txt' in result['output']
+        assert result['prompt'] == '/home/bob/Portfolio$ '
+    result = run(client, '/api/execute', 'whoami', headers={'Host': 'nobody.example'})
+    assert result['prompt'] == f'{app.DEFAULT_TENANT.home}$ '
+
+
+def test_prefix_without_trailing_slash_redirects(client):
+    response = client.get('/t/alice?theme=dark')
+    assert response.status_code == 301
+    assert response.headers['Location'].endswith('/t/alice/?theme=dark')
+    assert client.get('/t/nobody').status_code != 301
+
+
+def test_tenants_are_isolated(client):
+    assert run(client, '/t/alice/api/execute', 'cat bob.txt')['type'] == 'error'
+    assert run(client, '/t/bob/api/execute', 'cat alice.txt')['type'] == 'error'
+    assert run(client, '/t/bob/api/execute', 'cat ../../alice/Portfolio/alice.txt')['type'] == 'error'
+
+    # The same session id names a different shell in each tenant
+    run(client, '/t/alice/api/execute', 'export SECRET=alice-only')
+    assert run(client, '/t/alice/api/execute', 'echo $SECRET')['output'] == 'alice-only'
+    assert run(client, '/t/bob/api/execute', 'echo $SECRET')['output'] == ''
+    assert 'alice-only' not in run(client, '/t/bob/api/execute', 'history')['output']
+    assert run(client, '/api/execute', 'echo $SECRET')['output'] == ''
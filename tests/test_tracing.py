@@ -0,0 +1,78 @@
+"""Traces keep the shape of commands, not their personal bits, and replay"""
+
+import os
+import sys
+import threading
+
+import pytest
+from werkzeug.serving import make_server
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'tools'))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app
+import replay
+from tracing import TraceWriter, read_trace
+
+
+@pytest.fixture
+def shell():
+    return app.PortfolioShell('tracing')
+
+
+@pytest.mark.parametrize('line, expected', [
+    ('echo jane.doe@example.com', 'echo xxxxxxxxxxxxxxxxxxxx'),
+    ('echo call 5550123456 or 12', 'echo xxxx xxxxxxxxxx xx 12'),
+    ('export API_KEY=hunter2', 'export API_KEY=xxxxxxx'),
+    ('echo "my secret plan" \'and more\'', 'echo "xx xxxxxx xxxx" \'xxx xxxx\''),
+    ('export NAME="Jane Doe" EDITOR=vim', 'export NAME="xxxx xxx" EDITOR=xxx'),
+    ('echo "say \\"cat\\" Bio.txt', 'echo "xxx xxxxxxx xxxxxxx'),
+    ('grep -i --count "jane" Bio.txt', 'grep -i --count "xxxx" Bio.txt'),
+    ('cat Projects/CustomShell.md | head -n 5', 'cat Projects/CustomShell.md | head -n 5'),
+    ('cd ~/Projects/Cus', 'cd ~/Projects/Cus'),
+    ('cat ../Bio.txt > /dev/null', 'cat ../Bio.txt > xxxxxxxxx'),
+    ('echo $HOME ${USER}', 'echo $HOME ${USER}'),
+])
+def test_anonymize_line(shell, line, expected):
+    anonymized = app.anonymize_line(shell, line)
+    assert anonymized == expected
+    assert len(anonymized) == len(line)
+
+
+@pytest.fixture
+def trace(tmp_path, monkeypatch):
+    path = str(tmp_path / 'trace.jsonl')
+    monkeypatch.setattr(app, 'tracer', TraceWriter(path, 1024 * 1024))
+    monkeypatch.setattr(app, 'rate_limiter', app.MemoryRateLimiter())
+    return path
+
+
+def test_trace_is_written_and_replays(trace):
+    client = app.app.test_client()
+    commands = ['ls', 'export TOKEN=s3cr3t-value', 'grep -i "jane@example.com" Bio.txt', 'cd Projects']
+    for command in commands:
+        response = client.post('/api/execute', json={'command': command, 'session_id': 'visitor-42'})
+        assert response.status_code == 200
+    client.post('/api/autocomplete', json={'line': 'cat Cus', 'session_id': 'visitor-42'})
+
+    records = read_trace(trace)
+    assert [r['r'] for r in records] == ['POST /api/execute'] * 4 + ['POST /api/autocomplete']
+    assert [r['c'] for r in records[:4]] == [
+        'ls', 'export TOKEN=xxxxxxxxxxxx', 'grep -i "xxxxxxxxxxxxxxxx" Bio.txt', 'cd Projects']
+    assert records[4]['l'] == 'cat Cus'  # completes against ~/Projects, where the session is
+    assert len({r['s'] for r in records}) == 1
+    with open(trace, encoding='utf-8') as f:
+        raw = f.read()
+    for secret in ('visitor-42', 's3cr3t', 'jane@'):
+        assert secret not in raw
+
+    server = make_server('127.0.0.1', 0, app.app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        replayer = replay.Replayer('127.0.0.1', server.server_port, records, speedup=0, concurrency=4)
+        replayer.run()
+    finally:
+        server.shutdown()
+    assert sum(len(v) for v in replayer.latencies.values()) == len(records)
+    assert not replayer.errors
+    assert not replayer.skipped
@@ -0,0 +1,409 @@
+"""
+Load-test benchmark for the HTTP API
+
+Starts the app under gunicorn (guestbook routes pointed at a local Supabase
+stand-in, see supabase_stub.py), then runs simulated users against it at
+each concurrency step. Each user opens a session and loops over a weighted
+mix of terminal commands, Tab completions, messages and guestbook calls.
+
+For every step it reports throughput and p50/p95/p99 latency per route,
+plus the workers' total RSS. Results can be saved as a baseline and later
+runs compared against it; a regression beyond --tolerance exits non-zero.
+
+    python tools/bench.py                               # 1, 8, 32 users, 10s each
+    python tools/bench.py --save-baseline               # record tools/bench_baseline.json
+    python tools/bench.py --compare                     # fail on regressions
+    python tools/bench.py --url http://host:8000 --steps 16 --duration 30
+    python tools/bench.py --worker-class gevent --upstream-latency-ms 300 --steps 64,256
+"""
+
+import argparse
+import base64
+import http.client
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from urllib.parse import urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import supabase_stub
+
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE = os.path.join(REPO, 'tools', 'bench_baseline.json')
+
+# The README's command table, weighted towards what visitors actually type
+COMMANDS = [
+    ('help', 4), ('ls', 10), ('ls -la', 4), ('dir', 1), ('pwd', 3), ('tree', 3),
+    ('cd Projects', 5), ('cd ..', 5), ('cat Bio.txt', 8), ('cat Contact.txt', 3),
+    ('whoami', 3), ('neofetch', 3), ('grep -i python Skills.doc', 3), ('find md', 2),
+    ('head Honors.txt', 2), ('tail Bio.txt', 2), ('wc Bio.txt', 2), ('date', 2),
+    ('history', 2), ('cat Bio.txt | grep -i e | head -3', 3), ('less Bio.txt', 1),
+    ('open Bio.txt', 2), ('echo $USER', 1), ('frobnicate', 1),
+]
+COMPLETIONS = ['c', 'ca', 'cat B', 'cd P', 'cat Projects/S', 'ls Pro', 'op', 'grep x Ski']
+
+# (route label, weight) of each step a simulated user can take
+MIX = [
+    ('POST /api/execute', 60),
+    ('POST /api/autocomplete', 15),
+    ('GET /api/session', 4),
+    ('GET /api/guestbook/photos', 12),
+    ('POST /api/send-message', 3),
+    ('POST /api/guestbook/upload', 4),
+    ('DELETE /api/guestbook/delete', 2),
+]
+
+# Simulated users click far faster than people; lift the per-client rate
+# limits so the limiter's cost is measured without it refusing the load
+SERVER_ENV = {
+    'RATE_LIMIT_EXECUTE': '100000/1',
+    'RATE_LIMIT_MESSAGE': '100000/1',
+    'RATE_LIMIT_UPLOAD': '100000/1',
+}
+
+# A 1x1 PNG: the guestbook only stores what it is given
+PIXEL = 'data:image/png;base64,' + base64.b64encode(bytes.fromhex(
+    '89504e470d0a1a0a0000000d4948445200000001000000010806000000'
+    '1f15c4890000000d49444154789c6360f8cfc0f01f0005000201c2e1e1'
+    '9d0000000049454e44ae426082')).decode()
+
+
+def _weighted(pairs):
+    items, weights = zip(*pairs)
+    return items, weights
+
+
+class User:
+    """One simulated visitor on a keep-alive connection"""
+
+    def __init__(self, host, port, rng):
+        self.conn = http.client.HTTPConnection(host, port, timeout=30)
+        self.rng = rng
+        self.session = None
+        self.visitor = str(uuid.uuid4())
+        self.commands = _weighted(COMMANDS)
+        # Each user looks like its own client to the rate limiter
+        self.address = f'10.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(1, 255)}'
+
+    def request(self, method, path, body=None):
+        headers = {'Connection': 'keep-alive', 'X-Forwarded-For': self.address}
+        if body is not None:
+            body = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+        try:
+            self.conn.request(method, path, body, headers)
+            response = self.conn.getresponse()
+            data = response.read()
+        except (OSError, http.client.HTTPException):
+            self.conn.close()
+            raise
+        return response.status, data
+
+    def step(self, route):
+        if route == 'GET /api/session' or self.session is None:
+            status, data = self.request('GET', '/api/session')
+            self.session = json.loads(data)
+            return status
+        if route == 'POST /api/execute':
+            command = self.rng.choices(*self.commands)[0]
+            status, data = self.request('POST', '/api/execute', {**self.session, 'command': command})
+            self._carry_state(data)
+            return status
+        if route == 'POST /api/autocomplete':
+            line = self.rng.choice(COMPLETIONS)
+            return self.request('POST', '/api/autocomplete', {**self.session, 'line': line, 'cursor': len(line)})[0]
+        if route == 'GET /api/guestbook/photos':
+            return self.request('GET', '/api/guestbook/photos?limit=20')[0]
+        if route == 'POST /api/send-message':
+            return self.request('POST', '/api/send-message', {'message': f'bench {self.rng.random()}'})[0]
+        if route == 'POST /api/guestbook/upload':
+            return self.request('POST', '/api/guestbook/upload',
+                                {'image': PIXEL, 'name': 'bench', 'visitor_id': self.visitor})[0]
+        if route == 'DELETE /api/guestbook/delete':
+            status, data = self.request('GET', '/api/guestbook/photos?limit=50')
+            mine = [p['id'] for p in json.loads(data).get('photos', []) if p.get('visitor_id') == self.visitor]
+            if not mine:
+                return status
+            return self.request('DELETE', f'/api/guestbook/delete/{mine[0]}', {'visitor_id': self.visitor})[0]
+        raise ValueError(route)
+
+    def _carry_state(self, data):
+        # Stateless servers hand back a new token with every response
+        if b'"state"' in data:
+            state = json.loads(data).get('state')
+            if state:
+                self.session['state'] = state
+
+
+def _client_process(host, port, users, duration, seed, out):
+    """Run `users` simulated users on threads; put {route: [ms], ...} on out"""
+    latencies, errors = {}, {}
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+    routes = _weighted(MIX)
+
+    def run(n):
+        rng = random.Random(seed * 1000 + n)
+        user = User(host, port, rng)
+        mine, failed = {}, {}
+        while time.monotonic() < deadline:
+            route = rng.choices(*routes)[0]
+            if user.session is None:
+                route = 'GET /api/session'
+            start = time.perf_counter()
+            try:
+                status = user.step(route)
+            except Exception:
+                status = 599
+            mine.setdefault(route, []).append((time.perf_counter() - start) * 1000)
+            if status >= 400:
+                failed[route] = failed.get(route, 0) + 1
+        with lock:
+            for route, values in mine.items():
+                latencies.setdefault(route, []).extend(values)
+            for route, count in failed.items():
+                errors[route] = errors.get(route, 0) + count
+
+    threads = [threading.Thread(target=run, args=(n,)) for n in range(users)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    out.put((latencies, errors))
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, max(0, round(p / 100 * (len(sorted_values) - 1))))
+    return sorted_values[k]
+
+
+def run_step(host, port, users, duration, processes, seed):
+    """Drive `users` concurrent users for `duration` seconds"""
+    processes = max(1, min(processes, users))
+    out = multiprocessing.Queue()
+    procs = []
+    for i in range(processes):
+        share = users // processes + (1 if i < users % processes else 0)
+        p = multiprocessing.Process(target=_client_process,
+                                    args=(host, port, share, duration, seed + i, out))
+        p.start()
+        procs.append(p)
+    latencies, errors = {}, {}
+    for _ in procs:
+        part, failed = out.get()
+        for route, values in part.items():
+            latencies.setdefault(route, []).extend(values)
+        for route, count in failed.items():
+            errors[route] = errors.get(route, 0) + count
+    for p in procs:
+        p.join()
+
+    routes = {}
+    for route, values in sorted(latencies.items()):
+        values.sort()
+        routes[route] = {
+            'requests': len(values),
+            'rps': round(len(values) / duration, 1),
+            'p50': round(percentile(values, 50), 2),
+            'p95': round(percentile(values, 95), 2),
+            'p99': round(percentile(values, 99), 2),
+            'errors': errors.get(route, 0),
+        }
+    everything = sorted(v for values in latencies.values() for v in values)
+    total = {
+        'requests': len(everything),
+        'rps': round(len(everything) / duration, 1),
+        'p50': round(percentile(everything, 50), 2),
+        'p95': round(percentile(everything, 95), 2),
+        'p99': round(percentile(everything, 99), 2),
+        'errors': sum(errors.values()),
+    }
+    return {'users': users, 'routes': routes, 'total': total}
+
+
+def _children(pid):
+    kids = []
+    for entry in os.listdir('/proc'):
+        if entry.isdigit():
+            try:
+                with open(f'/proc/{entry}/stat') as f:
+                    fields = f.read().rsplit(')', 1)[1].split()
+            except OSError:
+                continue
+            if int(fields[1]) == pid:
+                kids.append(int(entry))
+    return kids
+
+def workers_rss(master_pid):
+    """Total resident memory (bytes) of the gunicorn master's workers"""
+    total = 0
+    for pid in _children(master_pid) or [master_pid]:
+        try:
+            with open(f'/proc/{pid}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        total += int(line.split()[1]) * 1024
+        except OSError:
+            pass
+    return total
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def start_server(opts, supabase_url):
+    """Launch gunicorn from a scratch directory; returns (process, port, workdir)"""
+    port = _free_port()
+    workdir = tempfile.mkdtemp(prefix='portfolio-bench-')
+    env = {**os.environ, 'SUPABASE_URL': supabase_url, 'SUPABASE_KEY': 'bench',
+           'FORWARDED_PROXIES': '1', **SERVER_ENV}
+    for pair in opts.env:
+        key, _, value = pair.partition('=')
+        env[key] = value
+    cmd = [sys.executable, '-m', 'gunicorn', '-c', os.path.join(REPO, 'gunicorn.conf.py'),
+           '--chdir', workdir, '--pythonpath', REPO, '--workers', str(opts.workers),
+           '--worker-class', opts.worker_class, '--threads', str(opts.threads),
+           '--worker-connections', str(opts.worker_connections),
+           '--bind', f'127.0.0.1:{port}', '--log-level', 'warning', 'app:app']
+    proc = subprocess.Popen(cmd, env=env)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                break
+        except OSError:
+            if proc.poll() is not None:
+                raise SystemExit('gunicorn exited during startup')
+            time.sleep(0.1)
+    else:
+        proc.terminate()
+        raise SystemExit('gunicorn did not start listening')
+    time.sleep(0.5 * opts.workers)  # let every worker finish importing
+    return proc, port, workdir
+
+
+def compare(results, baseline, tolerance):
+    """Lines describing regressions against baseline (empty if none)"""
+    problems = []
+    old_steps = {step['users']: step for step in baseline.get('steps', [])}
+    for step in results['steps']:
+        old = old_steps.get(step['users'])
+        if old is None:
+            continue
+        for route, now in [('total', step['total'])] + list(step['routes'].items()):
+            before = old['total'] if route == 'total' else old['routes'].get(route)
+            if not before:
+                continue
+            if now['p95'] > before['p95'] * (1 + tolerance) and now['p95'] - before['p95'] > 1:
+                problems.append(f"{step['users']:>4} users  {route}: p95 {before['p95']} -> {now['p95']} ms")
+            if route == 'total' and now['rps'] < before['rps'] * (1 - tolerance):
+                problems.append(f"{step['users']:>4} users  throughput {before['rps']} -> {now['rps']} req/s")
+        if old.get('rss') and step.get('rss') and step['rss'] > old['rss'] * (1 + tolerance):
+            problems.append(f"{step['users']:>4} users  RSS {old['rss'] >> 20} -> {step['rss'] >> 20} MiB")
+    return problems
+
+
+def print_step(step):
+    print(f"\n{step['users']} users   {step['total']['rps']} req/s   "
+          f"RSS {step.get('rss', 0) / 2**20:.1f} MiB")
+    print(f"  {'route':<32} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for route, r in list(step['routes'].items()) + [('all', step['total'])]:
+        print(f"  {route:<32} {r['rps']:>8} {r['p50']:>8} {r['p95']:>8} {r['p99']:>8} {r['errors']:>7}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--steps', default='1,8,32', help='comma-separated concurrent users per step')
+    parser.add_argument('--duration', type=float, default=10, help='seconds per step')
+    parser.add_argument('--warmup', type=float, default=2, help='seconds of load before the first step')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--worker-class', default='gthread', help='gunicorn worker class, e.g. gevent')
+    parser.add_argument('--worker-connections', type=int, default=1000,
+                        help='concurrent requests per gevent worker')
+    parser.add_argument('--processes', type=int, default=os.cpu_count() or 2,
+                        help='load-generator processes')
+    parser.add_argument('--upstream-latency-ms', type=float, default=20,
+                        help='delay added by the Supabase stand-in')
+    parser.add_argument('--env', action='append', default=[], metavar='KEY=VALUE',
+                        help='extra environment for the server, e.g. SESSION_BACKEND=sqlite')
+    parser.add_argument('--url', help='benchmark an already running server instead')
+    parser.add_argument('--pid', type=int, help='gunicorn master pid for RSS, with --url')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--out', help='write the results as JSON here')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--compare', action='store_true', help='compare with the baseline')
+    parser.add_argument('--tolerance', type=float, default=0.15)
+    opts = parser.parse_args()
+
+    stub = proc = workdir = None
+    if opts.url:
+        parsed = urlparse(opts.url)
+        host, port, master = parsed.hostname, parsed.port or 80, opts.pid
+    else:
+        stub = supabase_stub.serve_in_thread(latency=opts.upstream_latency_ms / 1000, seed=50)
+        proc, port, workdir = start_server(opts, f'http://127.0.0.1:{stub.server_address[1]}')
+        host, master = '127.0.0.1', proc.pid
+
+    results = {
+        'host': socket.gethostname(),
+        'cpus': os.cpu_count(),
+        'python': sys.version.split()[0],
+        'workers': opts.workers,
+        'worker_class': opts.worker_class,
+        'threads': opts.threads,
+        'upstream_latency_ms': opts.upstream_latency_ms,
+        'duration': opts.duration,
+        'steps': [],
+    }
+    try:
+        if opts.warmup:
+            run_step(host, port, 2, opts.warmup, 1, opts.seed)
+        for users in (int(n) for n in opts.steps.split(',')):
+            step = run_step(host, port, users, opts.duration, opts.processes, opts.seed)
+            if master:
+                step['rss'] = workers_rss(master)
+            results['steps'].append(step)
+            print_step(step)
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+            shutil.rmtree(workdir, ignore_errors=True)
+        if stub is not None:
+            stub.shutdown()
+
+    if opts.out:
+        with open(opts.out, 'w') as f:
+            json.dump(results, f, indent=1)
+    if opts.save_baseline:
+        with open(opts.baseline, 'w') as f:
+            json.dump(results, f, indent=1)
+        print(f'\nSaved baseline to {opts.baseline}')
+    elif opts.compare:
+        with open(opts.baseline) as f:
+            problems = compare(results, json.load(f), opts.tolerance)
+        if problems:
+            print(f'\nRegressions beyond {opts.tolerance:.0%} of {opts.baseline}:')
+            print('\n'.join('  ' + p for p in problems))
+            sys.exit(1)
+        print(f'\nNo regressions beyond {opts.tolerance:.0%} of {opts.baseline}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,291 @@
+"""
+Replay a captured request trace against a server and report its latencies
+
+Reads a trace written with TRACE_FILE set (see tracing.py) and sends its
+requests again with their recorded spacing, divided by --speedup. Each
+anonymous session is replayed as its own session: its requests stay in
+order, and each waits for the previous one to finish, as the visitor's
+terminal did. Without --url a local server is started as bench.py does
+(gunicorn, with the guestbook on the Supabase stand-in and the per-client
+rate limits lifted).
+
+Terminal requests, GET / and the guestbook listing are replayed. Routes that
+write (messages, uploads, deletes) or that can't be rebuilt from a trace
+(assets, output pages) are only counted.
+
+    python tools/replay.py trace.jsonl                   # in real time
+    python tools/replay.py trace.jsonl --speedup 20      # 20x faster
+    python tools/replay.py trace.jsonl --speedup 0       # as fast as sessions allow
+    python tools/replay.py trace.jsonl --url http://127.0.0.1:5000 --out replay.json
+"""
+
+import argparse
+import heapq
+import http.client
+import json
+import os
+import shutil
+import socket
+import sys
+import threading
+import time
+from collections import Counter, deque
+from urllib.parse import urlencode, urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import supabase_stub
+from bench import percentile, start_server
+from tracing import read_trace
+
+
+def build_request(record, session, ignore_tenants=False):
+    """(method, path, JSON body or None) re-creating a record, or None if it can't be replayed"""
+    route = record['r']
+    prefix = f"/t/{record['tn']}" if record.get('tn') and not ignore_tenants else ''
+    ids = {'session_id': session['id'], 'state': session.get('state')} if session else {}
+    if route == 'POST /api/execute':
+        return 'POST', prefix + '/api/execute', {**ids, 'command': record.get('c', '')}
+    if route == 'POST /api/execute/batch':
+        return 'POST', prefix + '/api/execute/batch', {**ids, 'commands': record.get('cs', [])}
+    if route == 'POST /api/autocomplete':
+        if 'l' in record:
+            return 'POST', prefix + '/api/autocomplete', {**ids, 'line': record['l'], 'cursor': record.get('k')}
+        return 'POST', prefix + '/api/autocomplete', {**ids, 'partial': record.get('p', '')}
+    if route == 'POST /api/history/search':
+        return 'POST', prefix + '/api/history/search', {**ids, 'query': record.get('q', '')}
+    if route == 'GET /api/session':
+        query = urlencode({k: v for k, v in ids.items() if v}) if ids else ''
+        return 'GET', prefix + '/api/session' + ('?' + query if query else ''), None
+    if route == 'GET /':
+        return 'GET', prefix + '/', None
+    if route == 'GET /api/guestbook/photos':
+        return 'GET', '/api/guestbook/photos', None
+    return None
+
+
+class Replayer:
+    """Issues trace records on schedule from a pool of threads
+
+    Records of one session form a queue: its next request becomes due at
+    its scheduled time or when the previous one finishes, whichever is
+    later. Sessionless records are independent of each other.
+    """
+
+    def __init__(self, host, port, records, speedup, concurrency, ignore_tenants=False):
+        self.host, self.port = host, port
+        self.speedup = speedup
+        self.concurrency = concurrency
+        self.ignore_tenants = ignore_tenants
+        self.latencies = {}     # route -> [ms]
+        self.errors = Counter()
+        self.skipped = Counter()
+        self.lag = []           # ms each request started behind schedule
+        self._lock = threading.Lock()
+        self._ready = threading.Condition(self._lock)
+        self._due = []          # heap of (due, seq, lane key, record)
+        self._lanes = {}        # session -> deque of its later records
+        self._sessions = {}     # anonymous id -> {'id', 'state'}
+        self._local = threading.local()
+        self._pending = 0
+        self._seq = 0
+
+        self.origin = records[0]['t'] if records else 0.0
+        for record in records:
+            if build_request(record, None) is None:
+                self.skipped[record['r']] += 1
+                continue
+            key = record.get('s')
+            if key is None:
+                self._push(self._at(record), None, record)
+            elif key in self._lanes:
+                self._lanes[key].append(record)
+            else:
+                self._lanes[key] = deque()
+                self._push(self._at(record), key, record)
+            self._pending += 1
+
+    def _at(self, record):
+        return (record['t'] - self.origin) / self.speedup if self.speedup else 0.0
+
+    def _push(self, due, key, record):
+        self._seq += 1
+        heapq.heappush(self._due, (due, self._seq, key, record))
+
+    def run(self):
+        self.start = time.perf_counter()
+        threads = [threading.Thread(target=self._work, daemon=True) for _ in range(self.concurrency)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return time.perf_counter() - self.start
+
+    def _work(self):
+        while True:
+            with self._ready:
+                while True:
+                    if self._pending == 0:
+                        self._ready.notify_all()
+                        return
+                    if self._due:
+                        wait = self._due[0][0] - (time.perf_counter() - self.start)
+                        if wait <= 0:
+                            due, _, key, record = heapq.heappop(self._due)
+                            break
+                        self._ready.wait(wait)
+                    else:
+                        self._ready.wait()
+                session = self._sessions.setdefault(key, {'id': f'replay-{key}'}) if key else None
+            lag = (time.perf_counter() - self.start - due) * 1000
+            self._send(record, session)
+            with self._ready:
+                self.lag.append(lag)
+                self._pending -= 1
+                lane = self._lanes.get(key) if key else None
+                if lane:
+                    nxt = lane.popleft()
+                    self._push(max(self._at(nxt), time.perf_counter() - self.start), key, nxt)
+                self._ready.notify_all()
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+        return conn
+
+    def _send(self, record, session):
+        method, path, body = build_request(record, session, self.ignore_tenants)
+        headers = {'Connection': 'keep-alive'}
+        if body is not None:
+            body = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+        route = record['r']
+        start = time.perf_counter()
+        try:
+            conn = self._conn()
+            conn.request(method, path, body, headers)
+            response = conn.getresponse()
+            data = response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            self._local.conn.close()
+            self._local.conn = None
+            data, status = b'', 599
+        elapsed = (time.perf_counter() - start) * 1000
+        if session is not None and b'"state"' in data:
+            # Stateless servers hand back a new token with every response
+            try:
+                state = json.loads(data).get('state')
+            except ValueError:
+                state = None
+            if state:
+                session['state'] = state
+        with self._lock:
+            self.latencies.setdefault(route, []).append(elapsed)
+            if status >= 400:
+                self.errors[route] += 1
+
+
+def summarize(values, errors, seconds):
+    values = sorted(values)
+    return {
+        'requests': len(values),
+        'rps': round(len(values) / seconds, 1) if seconds else 0.0,
+        'p50': round(percentile(values, 50), 2),
+        'p90': round(percentile(values, 90), 2),
+        'p99': round(percentile(values, 99), 2),
+        'max': round(values[-1], 2) if values else 0.0,
+        'errors': errors,
+    }
+
+
+def report(replayer, records, seconds):
+    routes = {route: summarize(values, replayer.errors[route], seconds)
+              for route, values in sorted(replayer.latencies.items())}
+    everything = [v for values in replayer.latencies.values() for v in values]
+    span = records[-1]['t'] - records[0]['t'] if records else 0.0
+    return {
+        'records': len(records),
+        'sessions': len({r['s'] for r in records if 's' in r}),
+        'trace_seconds': round(span, 3),
+        'replay_seconds': round(seconds, 3),
+        'speedup': replayer.speedup,
+        'routes': routes,
+        'total': summarize(everything, sum(replayer.errors.values()), seconds),
+        'lag_p99': round(percentile(sorted(replayer.lag), 99), 2),
+        'skipped': dict(replayer.skipped),
+    }
+
+
+def print_report(results):
+    print(f"{results['records']} records, {results['sessions']} sessions: "
+          f"{results['trace_seconds']}s of traffic replayed in {results['replay_seconds']}s")
+    print(f"  {'route':<28} {'requests':>8} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8} {'errors':>7}")
+    for route, r in list(results['routes'].items()) + [('all', results['total'])]:
+        print(f"  {route:<28} {r['requests']:>8} {r['p50']:>8} {r['p90']:>8} {r['p99']:>8} "
+              f"{r['max']:>8} {r['errors']:>7}")
+    if results['speedup']:
+        print(f"  requests started up to {results['lag_p99']} ms behind schedule (p99)")
+    if results['skipped']:
+        print('  not replayed: ' + ', '.join(f'{route} x{n}' for route, n in sorted(results['skipped'].items())))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('trace', help='trace file written with TRACE_FILE')
+    parser.add_argument('--speedup', type=float, default=1.0,
+                        help='divide recorded gaps between requests by this; 0 sends each as soon as it may')
+    parser.add_argument('--concurrency', type=int, default=64, help='requests in flight at most')
+    parser.add_argument('--limit', type=int, help='replay only the first N records')
+    parser.add_argument('--ignore-tenants', action='store_true',
+                        help='send every request to the default portfolio instead of /t/<name>/')
+    parser.add_argument('--url', help='replay against an already running server')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--worker-class', default='gthread')
+    parser.add_argument('--worker-connections', type=int, default=1000)
+    parser.add_argument('--upstream-latency-ms', type=float, default=20)
+    parser.add_argument('--env', action='append', default=[], metavar='KEY=VALUE',
+                        help='extra environment for the server started here')
+    parser.add_argument('--out', help='write the results as JSON here')
+    opts = parser.parse_args()
+
+    records = read_trace(opts.trace)[:opts.limit]
+    if not records:
+        raise SystemExit(f'no requests in {opts.trace}')
+
+    stub = proc = workdir = None
+    if opts.url:
+        parsed = urlparse(opts.url)
+        host, port = parsed.hostname, parsed.port or 80
+    else:
+        stub = supabase_stub.serve_in_thread(latency=opts.upstream_latency_ms / 1000, seed=50)
+        proc, port, workdir = start_server(opts, f'http://127.0.0.1:{stub.server_address[1]}')
+        host = '127.0.0.1'
+    try:
+        replayer = Replayer(host, port, records, opts.speedup, opts.concurrency, opts.ignore_tenants)
+        seconds = replayer.run()
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+            shutil.rmtree(workdir, ignore_errors=True)
+        if stub is not None:
+            stub.shutdown()
+
+    results = {
+        'host': socket.gethostname(),
+        'cpus': os.cpu_count(),
+        'python': sys.version.split()[0],
+        'trace': os.path.basename(opts.trace),
+        **report(replayer, records, seconds),
+    }
+    print_report(results)
+    if opts.out:
+        with open(opts.out, 'w') as f:
+            json.dump(results, f, indent=1)
+
+
+if __name__ == '__main__':
+    main()
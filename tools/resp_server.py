@@ -0,0 +1,132 @@
+"""
+Local Redis stand-in for development and benchmarks
+
+Speaks enough of the Redis protocol (RESP2) for the session backend:
+PING, AUTH, SELECT, GET, SET [EX n], DEL, EXISTS, EXPIRE, TTL, DBSIZE, FLUSHDB.
+
+    python tools/resp_server.py --port 6390
+    SESSION_BACKEND=redis REDIS_URL=redis://127.0.0.1:6390/0 gunicorn app:app
+"""
+
+import argparse
+import socketserver
+import threading
+import time
+
+
+class Keyspace:
+    """Thread-safe dict of key -> (value, expires_at or None)"""
+
+    def __init__(self):
+        self.data = {}
+        self.lock = threading.Lock()
+
+    def _live(self, key):
+        entry = self.data.get(key)
+        if entry and entry[1] is not None and entry[1] <= time.monotonic():
+            del self.data[key]
+            return None
+        return entry
+
+
+class RespHandler(socketserver.StreamRequestHandler):
+
+    def read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        if not line.startswith(b'*'):
+            return line.split()  # inline command, e.g. from telnet
+        args = []
+        for _ in range(int(line[1:])):
+            size = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(size + 2)[:-2])
+        return args
+
+    def reply(self, value):
+        if value is None:
+            out = b'$-1\r\n'
+        elif isinstance(value, int):
+            out = b':%d\r\n' % value
+        elif isinstance(value, bytes):
+            out = b'$%d\r\n%s\r\n' % (len(value), value)
+        elif isinstance(value, Exception):
+            out = b'-ERR %s\r\n' % str(value).encode()
+        else:
+            out = b'+%s\r\n' % value.encode()
+        self.wfile.write(out)
+
+    def handle(self):
+        space = self.server.keyspace
+        while True:
+            args = self.read_command()
+            if args is None:
+                return
+            if not args:
+                continue
+            name = args[0].upper().decode()
+            try:
+                with space.lock:
+                    result = self.dispatch(space, name, args[1:])
+            except Exception as e:
+                result = e
+            self.reply(result)
+
+    def dispatch(self, space, name, args):
+        if name in ('PING', 'AUTH', 'SELECT'):
+            return 'PONG' if name == 'PING' else 'OK'
+        if name == 'GET':
+            entry = space._live(args[0])
+            return entry[0] if entry else None
+        if name == 'SET':
+            expires = None
+            if len(args) >= 4 and args[2].upper() == b'EX':
+                expires = time.monotonic() + int(args[3])
+            space.data[args[0]] = (args[1], expires)
+            return 'OK'
+        if name == 'DEL':
+            return sum(1 for key in args if space.data.pop(key, None) is not None)
+        if name == 'EXISTS':
+            return sum(1 for key in args if space._live(key))
+        if name == 'EXPIRE':
+            entry = space._live(args[0])
+            if not entry:
+                return 0
+            space.data[args[0]] = (entry[0], time.monotonic() + int(args[1]))
+            return 1
+        if name == 'TTL':
+            entry = space._live(args[0])
+            if not entry:
+                return -2
+            return -1 if entry[1] is None else int(entry[1] - time.monotonic())
+        if name == 'DBSIZE':
+            return len(space.data)
+        if name == 'FLUSHDB':
+            space.data.clear()
+            return 'OK'
+        raise ValueError(f"unknown command '{name}'")
+
+
+class RespServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, address):
+        super().__init__(address, RespHandler)
+        self.keyspace = Keyspace()
+
+
+def serve_in_thread(host='127.0.0.1', port=0):
+    """Start a stand-in on a background thread; returns the server"""
+    server = RespServer((host, port))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=6390)
+    opts = parser.parse_args()
+    print(f"RESP stand-in listening on {opts.host}:{opts.port}")
+    RespServer((opts.host, opts.port)).serve_forever()
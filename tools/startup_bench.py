@@ -0,0 +1,191 @@
+"""
+Cold-start benchmark: import time and time to first response
+
+Measures what the first visitor to a waking dyno waits for:
+
+    import          `import app` in a fresh interpreter
+    first /         gunicorn launched -> first 200 for GET /
+    first execute   then the first POST /api/execute answered
+
+The gunicorn figures are taken with preload_app on and off. Each is the
+median of --runs cold launches. As with bench.py, results can be saved as a
+baseline and later runs compared against it.
+
+    python tools/startup_bench.py                   # 5 runs of each
+    python tools/startup_bench.py --importtime      # also list the slowest imports
+    python tools/startup_bench.py --save-baseline   # record tools/startup_baseline.json
+    python tools/startup_bench.py --compare         # fail on regressions
+"""
+
+import argparse
+import http.client
+import json
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bench import REPO, _free_port
+
+
+DEFAULT_BASELINE = os.path.join(REPO, 'tools', 'startup_baseline.json')
+
+IMPORT_APP = 'import time; t = time.perf_counter(); import app; print(time.perf_counter() - t)'
+
+
+def _env(**extra):
+    env = {**os.environ, 'PYTHONPATH': REPO, **extra}
+    env.pop('METRICS_DIR', None)
+    return env
+
+
+def import_time(workdir):
+    """Seconds `import app` takes in a fresh interpreter"""
+    out = subprocess.run([sys.executable, '-c', IMPORT_APP], cwd=workdir, env=_env(),
+                         capture_output=True, text=True, check=True).stdout
+    return float(out.strip().splitlines()[-1])
+
+
+def slowest_imports(workdir, top=10):
+    """(module, ms) of app's direct imports, by cumulative -X importtime"""
+    err = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'], cwd=workdir,
+                         env=_env(), capture_output=True, text=True, check=True).stderr
+    # Children are listed before their parent, indented two more spaces
+    rows, pending = [], []
+    for line in err.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        name = name[1:]
+        if not name.startswith(' '):
+            if name == 'app':
+                rows = pending
+            pending = []
+        elif not name.startswith('   '):
+            pending.append((name.strip(), int(cumulative) / 1000))
+    return sorted(rows, key=lambda row: -row[1])[:top]
+
+
+def _request(port, method, path, body=None, timeout=30):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+    try:
+        headers = {'Content-Type': 'application/json'} if body is not None else {}
+        conn.request(method, path, json.dumps(body) if body is not None else None, headers)
+        response = conn.getresponse()
+        response.read()
+        return response.status
+    finally:
+        conn.close()
+
+
+def first_response(workdir, workers, preload, timeout=60):
+    """(seconds to the first GET / answer, then to the first command's) after launch"""
+    port = _free_port()
+    cmd = [sys.executable, '-m', 'gunicorn', '-c', os.path.join(REPO, 'gunicorn.conf.py'),
+           '--chdir', workdir, '--pythonpath', REPO, '--workers', str(workers),
+           '--bind', f'127.0.0.1:{port}', '--log-level', 'warning', 'app:app']
+    start = time.perf_counter()
+    proc = subprocess.Popen(cmd, env=_env(PRELOAD_APP='1' if preload else '0'))
+    try:
+        deadline = start + timeout
+        while True:
+            try:
+                status = _request(port, 'GET', '/')
+                break
+            except (ConnectionRefusedError, ConnectionResetError):
+                if proc.poll() is not None or time.perf_counter() > deadline:
+                    raise SystemExit('gunicorn did not start')
+                time.sleep(0.005)
+        index = time.perf_counter() - start
+        if status != 200:
+            raise SystemExit(f'GET / returned {status}')
+        _request(port, 'POST', '/api/execute', {'session_id': 'startup', 'command': 'ls'})
+        execute = time.perf_counter() - start
+    finally:
+        proc.terminate()
+        proc.wait()
+    return index, execute
+
+
+def _ms(values):
+    return round(statistics.median(values) * 1000, 1)
+
+
+def compare(results, baseline, tolerance):
+    problems = []
+    pairs = [('import', results['import_ms'], baseline.get('import_ms'))]
+    for mode, now in results['modes'].items():
+        before = baseline.get('modes', {}).get(mode, {})
+        for key, value in now.items():
+            pairs.append((f'{mode} {key}', value, before.get(key)))
+    for label, now, before in pairs:
+        if before and now > before * (1 + tolerance) and now - before > 5:
+            problems.append(f'{label}: {before} -> {now} ms')
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--importtime', action='store_true', help='list the slowest imports of app')
+    parser.add_argument('--out', help='write the results as JSON here')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--compare', action='store_true', help='compare with the baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    opts = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='portfolio-startup-')
+    try:
+        import_time(workdir)  # compile bytecode and build assets outside the timings
+        results = {
+            'host': socket.gethostname(),
+            'cpus': os.cpu_count(),
+            'python': sys.version.split()[0],
+            'workers': opts.workers,
+            'runs': opts.runs,
+            'import_ms': _ms([import_time(workdir) for _ in range(opts.runs)]),
+            'modes': {},
+        }
+        print(f"import app            {results['import_ms']:>8} ms")
+        for mode, preload in (('preload', True), ('no-preload', False)):
+            runs = [first_response(workdir, opts.workers, preload) for _ in range(opts.runs)]
+            results['modes'][mode] = {
+                'first_index_ms': _ms([index for index, _ in runs]),
+                'first_execute_ms': _ms([execute for _, execute in runs]),
+            }
+            row = results['modes'][mode]
+            print(f"{mode:<12} first / {row['first_index_ms']:>8} ms   "
+                  f"first execute {row['first_execute_ms']:>8} ms")
+        if opts.importtime:
+            print('\nslowest imports of app (cumulative):')
+            for name, ms in slowest_imports(workdir):
+                print(f'  {ms:8.1f} ms  {name}')
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if opts.out:
+        with open(opts.out, 'w') as f:
+            json.dump(results, f, indent=1)
+    if opts.save_baseline:
+        with open(opts.baseline, 'w') as f:
+            json.dump(results, f, indent=1)
+        print(f'\nSaved baseline to {opts.baseline}')
+    elif opts.compare:
+        with open(opts.baseline) as f:
+            problems = compare(results, json.load(f), opts.tolerance)
+        if problems:
+            print(f'\nRegressions beyond {opts.tolerance:.0%} of {opts.baseline}:')
+            print('\n'.join('  ' + p for p in problems))
+            sys.exit(1)
+        print(f'\nNo regressions beyond {opts.tolerance:.0%} of {opts.baseline}')
+
+
+if __name__ == '__main__':
+    main()
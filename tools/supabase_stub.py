@@ -0,0 +1,209 @@
+"""
+Local Supabase stand-in for development and benchmarks
+
+Implements the slice of the REST and Storage APIs the guestbook uses:
+
+    GET    /rest/v1/guestbook_photos?select=<columns>&order=<column>.<dir>[,...]
+           [&<column>=eq|gt|lt.<value>] [&or=(<condition>,and(...))] [&limit=<n>]
+    POST   /rest/v1/guestbook_photos
+    DELETE /rest/v1/guestbook_photos?id=eq.<id>
+    POST   /storage/v1/object/<bucket>/<name>
+    DELETE /storage/v1/object/<bucket>/<name>
+    GET    /storage/v1/object/public/<bucket>/<name>
+    GET    /storage/v1/render/image/public/<bucket>/<name>  (served unresized)
+
+--latency-ms adds a fixed delay to every response, to stand in for the
+round trip to a hosted project.
+
+    python tools/supabase_stub.py --port 54321 --seed 200
+    SUPABASE_URL=http://127.0.0.1:54321 SUPABASE_KEY=dev gunicorn app:app
+"""
+
+import argparse
+import json
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlparse
+
+
+class Store:
+    """Thread-safe photo rows and stored objects"""
+
+    def __init__(self):
+        self.rows = []
+        self.objects = {}
+        self.next_id = 1
+        self.lock = threading.Lock()
+
+    def insert(self, row):
+        with self.lock:
+            row = {'id': self.next_id, **row}
+            self.next_id += 1
+            self.rows.append(row)
+            return row
+
+    def seed(self, count):
+        start = datetime.utcnow() - timedelta(seconds=count)
+        for i in range(count):
+            name = f'seed-{i}.png'
+            self.insert({
+                'visitor_name': f'Visitor {i}',
+                'visitor_id': f'seed-{i % 17}',
+                'image_url': f'/storage/v1/object/public/guestbook-photos/{name}',
+                'filename': name,
+                'created_at': (start + timedelta(seconds=i)).isoformat(),
+            })
+
+    def select(self, filters):
+        """Rows matching every column=op.value filter (and `or`, if given)"""
+        with self.lock:
+            rows = list(self.rows)
+        conditions = [f'{column}.{condition}' for column, condition in filters.items() if column != 'or']
+        if 'or' in filters:
+            conditions.append('or' + filters['or'])
+        return [r for r in rows if all(_matches(r, c) for c in conditions)]
+
+
+def _split(text):
+    """Top-level comma-separated parts of a PostgREST logic expression"""
+    parts, depth, quoted, start = [], 0, False, 0
+    for i, ch in enumerate(text):
+        if ch == '"':
+            quoted = not quoted
+        elif not quoted and ch in '()':
+            depth += 1 if ch == '(' else -1
+        elif not quoted and ch == ',' and depth == 0:
+            parts.append(text[start:i])
+            start = i + 1
+    parts.append(text[start:])
+    return parts
+
+
+def _matches(row, condition):
+    """row satisfies `column.op.value`, `and(...)` or `or(...)`"""
+    logic = re.match(r'(and|or)\((.*)\)$', condition)
+    if logic:
+        results = (_matches(row, part) for part in _split(logic.group(2)))
+        return all(results) if logic.group(1) == 'and' else any(results)
+    column, op, value = condition.split('.', 2)
+    value = value[1:-1] if value.startswith('"') else value
+    actual = row.get(column)
+    if isinstance(actual, int):
+        value = int(value)
+    elif actual is None:
+        return False
+    else:
+        actual = str(actual)
+    if op == 'eq':
+        return actual == value
+    if op == 'gt':
+        return actual > value
+    if op == 'lt':
+        return actual < value
+    raise ValueError(op)
+
+
+class SupabaseHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out in separate writes; without TCP_NODELAY a
+    # reused keep-alive connection stalls each response on a delayed ACK
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body=b'', content_type='application/json'):
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _body(self):
+        return self.rfile.read(int(self.headers.get('Content-Length') or 0))
+
+    def _route(self):
+        url = urlparse(self.path)
+        params = dict(parse_qsl(url.query, keep_blank_values=True))
+        return url.path, params
+
+    def do_GET(self):
+        path, params = self._route()
+        store = self.server.store
+        if path == '/rest/v1/guestbook_photos':
+            limit = int(params.pop('limit', 0) or 0)
+            order = params.pop('order', '')
+            columns = params.pop('select', '*')
+            rows = store.select(params)
+            for term in reversed(order.split(',') if order else []):
+                column, _, direction = term.partition('.')
+                rows.sort(key=lambda r: r.get(column, ''), reverse=direction == 'desc')
+            if columns != '*':
+                rows = [{c: r.get(c) for c in columns.split(',')} for r in rows]
+            return self._send(200, rows[:limit] if limit else rows)
+        if path.startswith(('/storage/v1/object/public/', '/storage/v1/render/image/public/')):
+            name = path.rsplit('/', 1)[-1]
+            data = store.objects.get(name)
+            if data is None:
+                return self._send(404, {'error': 'not found'})
+            return self._send(200, data, 'image/png')
+        self._send(404, {'error': 'not found'})
+
+    def do_POST(self):
+        path, _ = self._route()
+        body = self._body()
+        if path == '/rest/v1/guestbook_photos':
+            return self._send(201, [self.server.store.insert(json.loads(body))])
+        if path.startswith('/storage/v1/object/'):
+            self.server.store.objects[path.rsplit('/', 1)[-1]] = body
+            return self._send(200, {'Key': path})
+        self._send(404, {'error': 'not found'})
+
+    def do_DELETE(self):
+        path, params = self._route()
+        self._body()
+        store = self.server.store
+        if path == '/rest/v1/guestbook_photos':
+            doomed = {id(r) for r in store.select(params)}
+            with store.lock:
+                store.rows = [r for r in store.rows if id(r) not in doomed]
+            return self._send(204)
+        if path.startswith('/storage/v1/object/'):
+            store.objects.pop(path.rsplit('/', 1)[-1], None)
+            return self._send(200, {'message': 'deleted'})
+        self._send(404, {'error': 'not found'})
+
+
+class SupabaseStub(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.0, seed=0):
+        super().__init__(address, SupabaseHandler)
+        self.latency = latency
+        self.store = Store()
+        self.store.seed(seed)
+
+
+def serve_in_thread(host='127.0.0.1', port=0, latency=0.0, seed=0):
+    """Start a stand-in on a background thread; returns the server"""
+    server = SupabaseStub((host, port), latency, seed)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=54321)
+    parser.add_argument('--latency-ms', type=float, default=0)
+    parser.add_argument('--seed', type=int, default=50, help='photos to start with')
+    opts = parser.parse_args()
+    print(f"Supabase stand-in listening on {opts.host}:{opts.port}")
+    SupabaseStub((opts.host, opts.port), opts.latency_ms / 1000, opts.seed).serve_forever()
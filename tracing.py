@@ -0,0 +1,106 @@
+"""
+Request trace capture - compact, append-only records of real traffic
+
+A sampled request becomes one line of JSON with short keys:
+
+    t    arrival time (seconds since the epoch, to the millisecond)
+    r    route, e.g. "POST /api/execute"
+    s    anonymous session id (a keyed hash of the real one)
+    in   request body bytes        out  response body bytes
+    st   status                    ms   time the app took to answer
+
+plus whatever the app adds to replay the request (for terminal requests the
+command line, with anything that might be personal blanked out). Sampling is
+per session, so a sampled session is captured whole. tools/replay.py plays a
+trace back against a server.
+
+Every worker appends to the same file with one write() per record; once it
+reaches max_bytes, capture stops.
+"""
+
+import hashlib
+import hmac
+import json
+import os
+import random
+import threading
+import time
+
+
+TRACE_VERSION = 1
+
+
+class TraceWriter:
+    """Appends trace records to one file, up to max_bytes"""
+
+    def __init__(self, path, max_bytes, sample=1.0, salt=None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.sample = sample
+        # Shared by workers forked from a preloaded master, so a session's
+        # anonymous id is the same whichever worker serves it
+        self.salt = salt or os.urandom(16)
+        self.full = False
+        self.written = 0
+        self._fd = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def session(self, session_id):
+        """Anonymous, stable stand-in for a session id"""
+        return hmac.new(self.salt, str(session_id).encode(), hashlib.sha256).hexdigest()[:12]
+
+    def sampled(self, session=None):
+        """Whether to capture a request; the same answer for every request of a session"""
+        if self.full:
+            return False
+        if session is None:
+            return random.random() < self.sample
+        return int(session, 16) / 16 ** len(session) < self.sample
+
+    def write(self, record):
+        """Append one record; False once the file is full"""
+        if self.full:
+            return False
+        line = (json.dumps(record, separators=(',', ':'), ensure_ascii=False) + '\n').encode()
+        with self._lock:
+            fd = self._open()
+            if fd is None:
+                return False
+            if os.fstat(fd).st_size + len(line) > self.max_bytes:
+                print(f"WARNING: trace file {self.path} reached {self.max_bytes} bytes; capture stopped")
+                self.full = True
+                return False
+            os.write(fd, line)
+            self.written += 1
+        return True
+
+    def _open(self):
+        # A descriptor must not cross a fork
+        if self._fd is None or self._pid != os.getpid():
+            try:
+                self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+            except OSError as e:
+                print(f"WARNING: can't open trace file {self.path}: {e}; capture stopped")
+                self.full = True
+                return None
+            self._pid = os.getpid()
+            if os.fstat(self._fd).st_size == 0:
+                header = {'trace': TRACE_VERSION, 'started': round(time.time(), 3)}
+                os.write(self._fd, (json.dumps(header, separators=(',', ':')) + '\n').encode())
+        return self._fd
+
+
+def read_trace(path):
+    """Request records of a trace file in arrival order (headers and torn lines skipped)"""
+    records = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # a line cut short when the writer was killed
+            if isinstance(record, dict) and 'r' in record and 't' in record:
+                records.append(record)
+    records.sort(key=lambda record: record['t'])
+    return records
@@ -0,0 +1,322 @@
+"""
+Virtual file system content - loading and compiled snapshots
+
+The terminal's file tree comes from CONTENT_DIR: plain files, plus a
+manifest.json holding the icon and GUI window for entries that have one.
+Its key order is the order entries are listed in (anything not in the
+manifest follows, sorted).
+
+For multi-worker deployments the tree can be compiled into one binary
+snapshot. Workers mmap it read-only, so file bodies and the search index
+live in the shared page cache rather than in each worker's heap:
+
+    python vfs.py build --out vfs.snapshot
+    VFS_SNAPSHOT=vfs.snapshot gunicorn app:app
+"""
+
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+
+
+CONTENT_DIR = os.environ.get(
+    'CONTENT_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'content')
+)
+CONTENT_MANIFEST = 'manifest.json'
+
+def load_content_tree(root=CONTENT_DIR, intern=None):
+    """Build the VFS tree from a content directory
+
+    File nodes only remember where their body lives ('source'); the text is
+    read on first access by VFSIndex.read(). With an Interner, names, icons
+    and windows equal to ones already loaded (from any tree) are shared.
+    """
+    if intern is None:
+        intern = _same
+    try:
+        with open(os.path.join(root, CONTENT_MANIFEST), encoding='utf-8') as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        manifest = {}
+
+    def build(dir_path, rel):
+        with os.scandir(dir_path) as it:
+            entries = {
+                entry.name: entry for entry in it
+                if not entry.name.startswith('.') and not (not rel and entry.name == CONTENT_MANIFEST)
+            }
+        listed = []
+        for key in manifest:
+            parent, _, name = key.rpartition('/')
+            if parent == rel and name in entries:
+                listed.append(name)
+        order = listed + sorted(set(entries) - set(listed))
+
+        contents = {}
+        for name in order:
+            entry = entries[name]
+            path = f'{rel}/{name}' if rel else name
+            meta = manifest.get(path, {})
+            node = {k: intern(meta[k]) for k in ('icon', 'window') if k in meta}
+            if entry.is_dir():
+                node['type'] = 'directory'
+                node['contents'] = build(entry.path, path)
+            else:
+                node['type'] = 'file'
+                node['source'] = entry.path
+            contents[intern(name)] = node
+        return contents
+
+    return {'type': 'directory', 'contents': build(root, '')}
+
+def _same(value):
+    return value
+
+
+class Interner:
+    """Canonical copies of equal immutable values (strings, tuples of them)
+
+    Trees loaded through the same Interner share one object per distinct
+    value, so portfolios built from a common template cost little more than
+    one. Values are held strongly; sweep() lets go of the ones nothing else
+    refers to any more.
+    """
+
+    def __init__(self):
+        self._table = {}
+
+    def __len__(self):
+        return len(self._table)
+
+    def __call__(self, value):
+        return self._table.setdefault(value, value)
+
+    def sweep(self):
+        """Drop values referenced only by the table; returns how many"""
+        table = self._table
+        # References: the table's key and value, the list, `value` and
+        # getrefcount's own argument
+        unused = [value for value in list(table) if sys.getrefcount(value) <= 5]
+        for value in unused:
+            del table[value]
+        return len(unused)
+
+
+def content_signature(root=CONTENT_DIR):
+    """Fingerprint of names, sizes and mtimes under root, for change detection"""
+    stats = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            st = os.stat(os.path.join(dirpath, name))
+            stats.append((dirpath, name, st.st_mtime_ns, st.st_size))
+    return hash(tuple(stats))
+
+def file_signature(path):
+    """Identity of a single file; changes when it is replaced or rewritten"""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+# ============================================================================
+# SNAPSHOT FORMAT
+# ============================================================================
+#
+#   header    magic, format version, build id and section offsets
+#   entries   one fixed-size record per node in tree order (root first):
+#             parent id, kind, and (offset, length) of name, icon, window
+#             and body
+#   strings   UTF-8 names/icons/windows, each distinct string stored once
+#   bodies    UTF-8 file contents
+#   trigrams  sorted (trigram, postings offset, count) records
+#   postings  u32 entry ids of the files containing each trigram
+#
+# All integers are little-endian. Readers refuse other format versions, so a
+# new layout can be rolled out by rebuilding the snapshot.
+
+MAGIC = b'PVFS'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<4sHHQ9I')
+ENTRY = struct.Struct('<iB3x8I')
+TRIGRAM = struct.Struct('<3I')
+POSTING = struct.Struct('<I')
+KIND_DIR, KIND_FILE = 0, 1
+
+def _trigrams(data):
+    """Distinct 3-byte windows of data, as big-endian ints"""
+    return {int.from_bytes(data[i:i + 3], 'big') for i in range(len(data) - 2)}
+
+def build_snapshot(out_path, root=CONTENT_DIR):
+    """Compile the content directory into a snapshot file; returns its build id
+
+    The file is written next to out_path and renamed over it, so a reader
+    opening out_path sees either the previous snapshot or the new one.
+    """
+    tree = load_content_tree(root)
+    records, strings, bodies = [], bytearray(), bytearray()
+    string_offsets = {}
+    postings = {}
+
+    def intern(text):
+        if text is None:
+            return 0, 0
+        if text not in string_offsets:
+            string_offsets[text] = len(strings)
+            strings.extend(text.encode('utf-8'))
+        return string_offsets[text], len(text.encode('utf-8'))
+
+    def walk(name, node, parent):
+        idx = len(records)
+        fields = [parent, KIND_DIR, *intern(name), *intern(node.get('icon')), *intern(node.get('window')), 0, 0]
+        records.append(fields)
+        if node.get('type') == 'directory':
+            for child_name, child in node.get('contents', {}).items():
+                walk(child_name, child, idx)
+        else:
+            with open(node['source'], encoding='utf-8', errors='replace', newline='') as f:
+                text = f.read()
+            body = text.encode('utf-8')
+            fields[1] = KIND_FILE
+            fields[8], fields[9] = len(bodies), len(body)
+            bodies.extend(body)
+            for tri in _trigrams(text.lower().encode('utf-8')):
+                postings.setdefault(tri, []).append(idx)
+
+    walk('', tree, -1)
+
+    entries_off = HEADER.size
+    strings_off = entries_off + ENTRY.size * len(records)
+    bodies_off = strings_off + len(strings)
+    tri_off = bodies_off + len(bodies)
+    postings_off = tri_off + TRIGRAM.size * len(postings)
+    build_id = time.time_ns()
+
+    tmp_path = f'{out_path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, 0, build_id, len(records), entries_off,
+                            strings_off, len(strings), bodies_off, len(bodies),
+                            len(postings), tri_off, postings_off))
+        for fields in records:
+            f.write(ENTRY.pack(*fields))
+        f.write(strings)
+        f.write(bodies)
+        position = 0
+        for tri in sorted(postings):
+            f.write(TRIGRAM.pack(tri, position, len(postings[tri])))
+            position += len(postings[tri])
+        for tri in sorted(postings):
+            f.write(b''.join(POSTING.pack(idx) for idx in postings[tri]))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, out_path)
+    return build_id
+
+
+class SnapshotBody:
+    """A file body inside a mapped snapshot
+
+    Decoded on every read instead of cached, so the text stays in the
+    shared page cache rather than being copied into each worker.
+    """
+
+    __slots__ = ('_mm', '_offset', '_length')
+
+    def __init__(self, mm, offset, length):
+        self._mm, self._offset, self._length = mm, offset, length
+
+    def read(self):
+        return self._mm[self._offset:self._offset + self._length].decode('utf-8', 'replace')
+
+
+class Snapshot:
+    """Read-only, memory-mapped view of a compiled snapshot"""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, _, self.build_id, self.entry_count, self._entries_off,
+         self._strings_off, _, self._bodies_off, _, self._tri_count,
+         self._tri_off, self._postings_off) = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f'{path}: not a version {FORMAT_VERSION} VFS snapshot')
+        self.path = path
+        self._nodes = []
+
+    def _string(self, offset, length):
+        if not length:
+            return None
+        start = self._strings_off + offset
+        return self._mm[start:start + length].decode('utf-8')
+
+    def tree(self):
+        """Rebuild the node tree; file bodies stay in the mapping"""
+        nodes = []
+        for idx in range(self.entry_count):
+            (parent, kind, name_off, name_len, icon_off, icon_len,
+             window_off, window_len, body_off, body_len) = ENTRY.unpack_from(
+                self._mm, self._entries_off + idx * ENTRY.size)
+            node = {}
+            icon = self._string(icon_off, icon_len)
+            window = self._string(window_off, window_len)
+            if icon is not None:
+                node['icon'] = icon
+            if window is not None:
+                node['window'] = window
+            if kind == KIND_DIR:
+                node['type'] = 'directory'
+                node['contents'] = {}
+            else:
+                node['type'] = 'file'
+                node['source'] = SnapshotBody(self._mm, self._bodies_off + body_off, body_len)
+            if parent >= 0:
+                nodes[parent]['contents'][self._string(name_off, name_len)] = node
+            nodes.append(node)
+        self._nodes = nodes
+        return nodes[0]
+
+    def _postings(self, tri):
+        lo, hi = 0, self._tri_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            key, offset, count = TRIGRAM.unpack_from(self._mm, self._tri_off + mid * TRIGRAM.size)
+            if key < tri:
+                lo = mid + 1
+            elif key > tri:
+                hi = mid
+            else:
+                start = self._postings_off + offset * POSTING.size
+                return {POSTING.unpack_from(self._mm, start + i * POSTING.size)[0] for i in range(count)}
+        return set()
+
+    def candidates(self, pattern):
+        """ids (id()) of file nodes that may contain pattern, case-insensitive
+
+        None means the pattern is too short to narrow anything down.
+        """
+        data = pattern.lower().encode('utf-8')
+        if len(data) < 3:
+            return None
+        matches = None
+        for tri in sorted(_trigrams(data)):
+            found = self._postings(tri)
+            matches = found if matches is None else matches & found
+            if not matches:
+                break
+        return {id(self._nodes[idx]) for idx in matches}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compile the content directory into a VFS snapshot')
+    parser.add_argument('command', choices=['build'])
+    parser.add_argument('--content', default=CONTENT_DIR)
+    parser.add_argument('--out', default=os.environ.get('VFS_SNAPSHOT') or 'vfs.snapshot')
+    opts = parser.parse_args()
+    build_id = build_snapshot(opts.out, opts.content)
+    print(f"Wrote {opts.out} ({os.path.getsize(opts.out)} bytes, build {build_id})")